@@ -0,0 +1,49 @@
+"""
+acquisition.py
+
+Search space and acquisition helpers shared by the samplers and optimizers.
+SEARCH_SPACE holds the bounds of the physical parameters; tracking_objective and the other objectives suggest
+from it, so the samplers' candidate sets and the objectives' suggest_float ranges cannot drift apart.
+
+Main components:
+- SEARCH_SPACE: Bounds of speed_factor and friction.
+- sobol_candidates: Scrambled Sobol candidate set in the unit cube.
+- expected_improvement: Expected improvement of Gaussian predictions over a best value.
+- trial_noise_var / normalized_noise: Per-trial noise variances for the GP diagonals. Trials run a varying number
+  of episodes (see sequential_stopping.py), so a trial measured with 3 episodes is a noisier observation than one
+  measured with 20.
+
+Dependencies: numpy, scipy.
+"""
+
+import numpy as np
+from scipy.stats import norm, qmc
+
+SEARCH_SPACE = {
+    'speed_factor': (1.0, 10.0),
+    'friction': (0.93, 0.9999),
+}
+
+
+def sobol_candidates(d, n, rng=None):
+    """At least n scrambled Sobol points in the d-dimensional unit cube (n rounded up to a power of two)."""
+    m = int(np.ceil(np.log2(max(n, 2))))
+    return qmc.Sobol(d=d, scramble=True, seed=rng).random_base2(m)
+
+
+def expected_improvement(mu, sigma, best):
+    """Expected improvement over best (maximization) of predictions with means mu and stds sigma."""
+    improvement = mu - best
+    Z = improvement / (sigma + 1e-9)
+    return improvement * norm.cdf(Z) + sigma * norm.pdf(Z)
+
+
+def trial_noise_var(trials):
+    """Noise variance of each trial's mean score (user attribute 'noise_var' of tracking_objective), 0 if unknown."""
+    return np.array([t.user_attrs.get('noise_var') or 0.0 for t in trials], dtype=float)
+
+
+def normalized_noise(noise_var, y):
+    """Noise variances on the scale of targets standardized as by GaussianProcessRegressor(normalize_y=True)."""
+    var = np.var(y)
+    return np.asarray(noise_var, dtype=float) / (var if var > 0 else 1.0)
@@ -0,0 +1,115 @@
+"""
+allocation.py
+
+Adaptive allocation of episodes (repeats) to candidate parameter sets under a session time budget.
+Rather than a fixed number of repeats per candidate, episodes go where they help most to identify the best
+candidate, following Optimal Computing Budget Allocation (OCBA, Chen et al.): candidates whose mean is close to
+the best one and whose episodes are noisy get more episodes, clear losers get few.
+
+Main components:
+- ocba_ratios: OCBA allocation fractions from candidate means and standard deviations.
+- EpisodeAllocator: Tracks per-candidate episode scores and the spent session time; picks the next candidate
+  to run and caps the episodes of new trials so the session fits in its budget.
+
+Dependencies: numpy.
+"""
+
+import numpy as np
+
+
+def ocba_ratios(means, stds, min_std=1e-3):
+    """OCBA fractions of the total episodes per candidate (higher mean is better)."""
+    means = np.asarray(means, dtype=float)
+    stds = np.maximum(np.asarray(stds, dtype=float), min_std)
+    k = len(means)
+    if k == 1:
+        return np.ones(1)
+
+    best = int(np.argmax(means))
+    gaps = np.maximum(means[best] - means, min_std)
+
+    ratios = np.zeros(k)
+    others = np.arange(k) != best
+    ratios[others] = (stds[others] / gaps[others]) ** 2
+    ratios[best] = stds[best] * np.sqrt(np.sum(ratios[others] ** 2 / stds[others] ** 2))
+    return ratios / ratios.sum()
+
+
+class EpisodeAllocator:
+    def __init__(self, session_budget_s=None, episode_cost_s=17.0, min_episodes=2, max_episodes=20,
+                 prior_noise_std=0.1, prior_weight=2.0):
+        """
+        Args:
+            session_budget_s (float): Total participant time for episodes; None for no limit.
+            episode_cost_s (float): Initial estimate of one episode's wall time, refined from record().
+            min_episodes (int): Episodes every candidate gets before OCBA takes over.
+            max_episodes (int): Cap per candidate.
+            prior_noise_std (float): Episode noise assumed before a candidate has its own episodes.
+            prior_weight (float): Pseudo-episodes behind prior_noise_std in each candidate's noise estimate.
+        """
+        self.session_budget_s = session_budget_s
+        self.episode_cost_s = episode_cost_s
+        self.min_episodes = min_episodes
+        self.max_episodes = max_episodes
+        self.prior_noise_std = prior_noise_std
+        self.prior_weight = prior_weight
+        self.scores = {}
+        self.spent_s = 0.0
+        self.n_recorded = 0
+
+    def spend(self, duration_s):
+        """Counts one episode's wall time against the budget and refines the per-episode estimate."""
+        self.spent_s += duration_s
+        self.n_recorded += 1
+        self.episode_cost_s = self.spent_s / self.n_recorded
+
+    def record(self, candidate, score, duration_s=None):
+        """Adds an episode score; duration_s is None for episodes whose time was already spent."""
+        self.scores.setdefault(candidate, []).append(float(score))
+        if duration_s is not None:
+            self.spend(duration_s)
+
+    def remaining_s(self):
+        if self.session_budget_s is None:
+            return np.inf
+        return self.session_budget_s - self.spent_s
+
+    def remaining_episodes(self):
+        return self.remaining_s() / self.episode_cost_s
+
+    def stats(self, candidate):
+        scores = self.scores.get(candidate, [])
+        if not scores:
+            return 0.0, self.prior_noise_std, 0
+        # Shrink towards prior_noise_std so that two close episodes do not starve a candidate
+        mean = float(np.mean(scores))
+        ss = float(np.sum((np.asarray(scores) - mean) ** 2))
+        std = np.sqrt((ss + self.prior_weight * self.prior_noise_std ** 2) / (len(scores) - 1 + self.prior_weight))
+        return mean, float(std), len(scores)
+
+    def next_candidate(self, candidates, total_episodes):
+        """
+        Candidate that should run the next episode, or None once total_episodes are spent
+        (or the session budget is exhausted).
+        """
+        counts = np.array([self.stats(c)[2] for c in candidates])
+        if counts.sum() >= total_episodes or self.remaining_episodes() < 1:
+            return None
+
+        below_min = np.where(counts < self.min_episodes)[0]
+        if len(below_min):
+            return candidates[below_min[np.argmin(counts[below_min])]]
+
+        means, stds, _ = zip(*(self.stats(c) for c in candidates))
+        target = ocba_ratios(means, stds) * (counts.sum() + 1)
+        deficit = np.where(counts < self.max_episodes, target - counts, -np.inf)
+        if np.all(np.isinf(deficit)):
+            return None
+        return candidates[int(np.argmax(deficit))]
+
+    def episode_cap(self, trials_left, default=20):
+        """Maximum episodes for the next trial so that the remaining trials fit in the session budget."""
+        if self.session_budget_s is None:
+            return min(default, self.max_episodes)
+        fair_share = int(self.remaining_episodes() // max(trials_left, 1))
+        return int(np.clip(fair_share, self.min_episodes, min(default, self.max_episodes)))
@@ -4,22 +4,83 @@ analysis.py
 NOTE: Not used in the main process
 
 This script analyzes and visualizes performance results from experiment trials.
-It loads result files, computes basic statistics, and generates violin plots to compare trial outcomes.
+It loads the episode scores of the sessions in the results store (see results_store.py), reading only the
+session and performance columns, as well as older results*.txt files, computes basic statistics, and generates
+violin plots to compare trial outcomes.
 The script is intended for post-experiment data analysis and visualization.
 
+Text files are parsed in a process pool, and the parsed scores and their statistics are cached in .analysis_cache,
+keyed by the file's path and checked against its modification time, size and content hash; the episode file of
+every results-store session is cached the same way. Re-running over a growing archive only parses new or changed
+files. Statistics are streamed (Welford): every file contributes a (count, mean, M2, min, max) summary, and the
+summaries are merged for the totals without concatenating the scores. Only the summaries are held in memory; the
+scores are read back from the cache one file at a time, and thinned to PLOT_POINTS quantiles, for the plot.
+
 Main components:
-- load_results: Loads and parses performance scores from result text files.
+- load_results: Loads and parses performance scores from older result text files.
+- load_cached_results: Statistics of many result text files, parsed in parallel and cached.
+- load_store_results: Statistics of the performance scores (warm-up excluded) of every session in the results
+  store, cached per session.
+- cached_values: Reads the scores of one file back from the cache, optionally thinned for plotting.
+- RunningStats: Welford mean/variance with min/max; summaries can be merged.
 - plot_violin: Creates and saves violin plots for visualizing score distributions.
 - main: Aggregates results, generates plots, and prints summary statistics.
 
-Dependencies: os, pandas, seaborn, matplotlib, numpy.
+Dependencies: os, hashlib, concurrent.futures, pandas, seaborn, matplotlib, numpy, custom modules (results_store).
 """
 
+import hashlib
 import os
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
 import seaborn as sns
 import matplotlib.pyplot as plt
 import numpy as np
+from results_store import ResultsStore
+
+CACHE_DIR = '.analysis_cache'
+# Values per violin in the plot; longer series are reduced to evenly spaced quantiles
+PLOT_POINTS = 2000
+
+class RunningStats:
+    def __init__(self, count=0, mean=0.0, m2=0.0, minimum=np.inf, maximum=-np.inf):
+        self.count = count
+        self.mean = mean
+        self.m2 = m2
+        self.minimum = minimum
+        self.maximum = maximum
+
+    def update(self, values):
+        """Adds a batch of values (Chan et al.'s merge of the batch into the running summary)."""
+        values = np.asarray(values, dtype=float)
+        if len(values):
+            batch_mean = values.mean()
+            self.merge(RunningStats(len(values), batch_mean, float(np.sum((values - batch_mean) ** 2)),
+                                    values.min(), values.max()))
+        return self
+
+    def merge(self, other):
+        count = self.count + other.count
+        if count:
+            delta = other.mean - self.mean
+            self.mean += delta * other.count / count
+            self.m2 += other.m2 + delta ** 2 * self.count * other.count / count
+            self.count = count
+            self.minimum = min(self.minimum, other.minimum)
+            self.maximum = max(self.maximum, other.maximum)
+        return self
+
+    @property
+    def std(self):
+        return np.sqrt(self.m2 / self.count) if self.count else np.nan
+
+    def to_array(self):
+        return np.array([self.count, self.mean, self.m2, self.minimum, self.maximum], dtype=float)
+
+    @classmethod
+    def from_array(cls, array):
+        count, mean, m2, minimum, maximum = array
+        return cls(int(count), float(mean), float(m2), float(minimum), float(maximum))
 
 def load_results(file_path):
     with open(file_path, 'r') as f:
@@ -27,6 +88,105 @@ def load_results(file_path):
         values = [float(line.split(': ')[1]) for line in lines]
     return values
 
+def _content_hash(file_path):
+    digest = hashlib.sha1()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _cache_path(path, cache_dir=CACHE_DIR):
+    return os.path.join(cache_dir, hashlib.sha1(os.path.abspath(path).encode()).hexdigest() + '.npz')
+
+def _parse(file_path):
+    values = np.array(load_results(file_path), dtype=float)
+    return values, RunningStats().update(values).to_array(), _content_hash(file_path)
+
+def _parse_store(directory, session):
+    store = ResultsStore(directory)
+    values = store.scores('performance', sessions=[session]).get(session, np.empty(0))
+    return values, RunningStats().update(values).to_array(), _content_hash(store._path('episodes', session))
+
+def _cached_stats(path, cache_path):
+    """
+    The RunningStats of a cache entry, or None when the entry is missing or the file has changed. Only the
+    summary is read from the entry; a file that was only touched is recognised by its content hash.
+    """
+    if not os.path.exists(cache_path):
+        return None
+    stat = os.stat(path)
+    with np.load(cache_path) as cached:
+        same_file = cached['mtime_ns'] == stat.st_mtime_ns and cached['size'] == stat.st_size
+        if not same_file and not (cached['size'] == stat.st_size and str(cached['sha1']) == _content_hash(path)):
+            return None
+        if not same_file:
+            np.savez(cache_path, values=cached['values'], stats=cached['stats'], sha1=cached['sha1'],
+                     mtime_ns=stat.st_mtime_ns, size=stat.st_size)
+        return RunningStats.from_array(cached['stats'])
+
+def _store_cache_entry(path, cache_path, values, stats, sha1):
+    stat = os.stat(path)
+    np.savez(cache_path, values=values, stats=stats, sha1=sha1, mtime_ns=stat.st_mtime_ns, size=stat.st_size)
+    return RunningStats.from_array(stats)
+
+def load_cached_results(file_paths, cache_dir=CACHE_DIR, workers=None):
+    """
+    {file_path: RunningStats} for text result files. Cached files whose modification time and size are unchanged
+    are not read at all. The scores themselves stay in the cache; see cached_values.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    results, misses = {}, []
+    for path in file_paths:
+        cache_path = _cache_path(path, cache_dir)
+        stats = _cached_stats(path, cache_path)
+        if stats is None:
+            misses.append((path, cache_path))
+        else:
+            results[path] = stats
+
+    if misses:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parsed = pool.map(_parse, [path for path, _ in misses], chunksize=8)
+            for (path, cache_path), (values, stats, sha1) in zip(misses, parsed):
+                results[path] = _store_cache_entry(path, cache_path, values, stats, sha1)
+    print(f"Parsed {len(misses)} of {len(file_paths)} result files, {len(file_paths) - len(misses)} from cache")
+    return {path: results[path] for path in file_paths}
+
+def load_store_results(directory='results_store', cache_dir=CACHE_DIR):
+    """
+    {episodes file: RunningStats} of the performance scores (warm-up excluded) of every session in the results
+    store, cached per session like the text files.
+    """
+    if not os.path.isdir(directory):
+        return {}
+    os.makedirs(cache_dir, exist_ok=True)
+    store = ResultsStore(directory)
+    results, parsed = {}, 0
+    for session in store.sessions():
+        path = store._path('episodes', session)
+        if not os.path.exists(path):
+            continue
+        cache_path = _cache_path(path, cache_dir)
+        stats = _cached_stats(path, cache_path)
+        if stats is None:
+            stats = _store_cache_entry(path, cache_path, *_parse_store(directory, session))
+            parsed += 1
+        results[path] = stats
+    print(f"Read {parsed} of {len(results)} results store sessions, {len(results) - parsed} from cache")
+    return results
+
+def cached_values(path, cache_dir=CACHE_DIR, max_points=None):
+    """
+    The scores of a file loaded by load_cached_results or load_store_results, read back from the cache.
+    With max_points, longer series are reduced to that many evenly spaced quantiles, which keeps the shape of
+    the distribution for plotting.
+    """
+    with np.load(_cache_path(path, cache_dir)) as cached:
+        values = cached['values']
+    if max_points is not None and len(values) > max_points:
+        values = np.quantile(values, np.linspace(0, 1, max_points))
+    return values
+
 def plot_violin(data_list, save_path=None):
     plt.figure(figsize=(10, 6))
 
@@ -44,25 +204,33 @@ def plot_violin(data_list, save_path=None):
         plt.show()
 
 def main():
-    results_files = [f for f in os.listdir('.') if f.startswith('results') and f.endswith('.txt')]
-    
-    if not results_files:
+    results_files = sorted(f for f in os.listdir('.') if f.startswith('results') and f.endswith('.txt'))
+    stored = load_store_results()
+
+    if not results_files and not stored:
         print("No result files found!")
         return
 
-    all_data = []
-    for file in results_files:
-        data = load_results(file)
-        all_data.append(data)
+    loaded = load_cached_results(results_files) if results_files else {}
+    loaded.update(stored)
+
+    # One series at a time is read back from the cache, and each violin is drawn from at most PLOT_POINTS values
+    plot_violin([cached_values(path, max_points=PLOT_POINTS) for path in loaded], 'violin_plot.png')
 
-    plot_violin(all_data, 'violin_plot.png')
+    total = RunningStats()
+    for name, stats in loaded.items():
+        total.merge(stats)
+        print(f"\nStatistics for file {name}:")
+        print(f"Mean: {stats.mean:.4f}")
+        print(f"Standard Deviation: {stats.std:.4f}")
+        print(f"Minimum: {stats.minimum:.4f}")
+        print(f"Maximum: {stats.maximum:.4f}")
 
-    for i, data in enumerate(all_data):
-        print(f"\nStatistics for file {results_files[i]}:")
-        print(f"Mean: {np.mean(data):.4f}")
-        print(f"Standard Deviation: {np.std(data):.4f}")
-        print(f"Minimum: {np.min(data):.4f}")
-        print(f"Maximum: {np.max(data):.4f}")
+    print(f"\nAll {len(loaded)} files, {total.count} scores:")
+    print(f"Mean: {total.mean:.4f}")
+    print(f"Standard Deviation: {total.std:.4f}")
+    print(f"Minimum: {total.minimum:.4f}")
+    print(f"Maximum: {total.maximum:.4f}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -9,14 +9,16 @@ This script:
 - Defines a physical parameter search space and an objective function (`physical_objective`)
   that evaluates each parameter set by running a tracking task optimization.
 - Applies rationality penalties to discourage unreasonable physical parameter combinations.
-- Interacts with the user to confirm physical parameter changes before each trial.
-- Runs a Bayesian optimization loop for a specified number of trials, tracking the best parameters and scores.
+- Interacts with the user to confirm physical parameter changes, only when the next trial needs a swap.
+- Plans the physical configurations in batches that need the fewest keycap/rocker swaps (switch_scheduler),
+  reporting the expected wall-time of each batch, and tracks the best parameters and scores.
 - Optionally saves all trial results and the best parameters to a timestamped results file.
 
 Modules used:
 - optuna: For Bayesian optimization.
 - tracking_op: For running tracking task optimization and evaluating parameter sets.
 - switch_ui: For user prompts regarding physical parameter changes.
+- switch_scheduler: For switching-cost-aware batches of physical configurations.
 - numpy: For numerical operations.
 - time: For timestamping result files.
 
@@ -28,6 +30,7 @@ import time
 import tracking_op
 from tracking_op import run_tracking_optimization
 import switch_ui as su
+from switch_scheduler import SwitchScheduler
 import numpy as np
 
 def physical_objective(trial):
@@ -70,33 +73,35 @@ def physical_objective(trial):
     
     return tracking_score
 
-def run_physical_optimization():
+def run_physical_optimization(batch_size=3, evaluation_s=1200.0):
     study = optuna.create_study(direction='maximize')
     n_trials = 10
+    scheduler = SwitchScheduler(study, cap_types=range(5), cap_param='keycap_type', evaluation_s=evaluation_s)
 
-    current_trial = study.ask()
-    keycap_type = current_trial.suggest_int('keycap_type', 0, 4)
-    rocker_length = current_trial.suggest_float('rocker_length', 5.0, 50.0)
-    cap_size = current_trial.suggest_float('cap_size', 6.0, 57.0)
+    current = None
+    i = 0
+    while i < n_trials:
+        schedule, wall_time = scheduler.plan(current, min(batch_size, n_trials - i))
+        scheduler.report(schedule, wall_time)
 
-    if not su.show_switch_prompt(keycap_type, rocker_length, cap_size):
-        print("Optimization cancelled by user")
-        return
-    
-    for i in range(n_trials):
-        print(f"\nStarting Physical Parameter Trial {i+1}/{n_trials}")
-
-        value = physical_objective(current_trial)
-        study.tell(current_trial, value)
-        if i < n_trials - 1:
+        for step in schedule:
+            print(f"\nStarting Physical Parameter Trial {i+1}/{n_trials}")
+            study.enqueue_trial(step['params'])
             current_trial = study.ask()
             keycap_type = current_trial.suggest_int('keycap_type', 0, 4)
             rocker_length = current_trial.suggest_float('rocker_length', 5.0, 50.0)
             cap_size = current_trial.suggest_float('cap_size', 6.0, 57.0)
-            
-            if not su.show_switch_prompt(keycap_type, rocker_length, cap_size):
+
+            if step['switch_s'] > 0 and not su.show_switch_prompt(keycap_type, rocker_length, cap_size):
                 print("Optimization cancelled by user")
+                study.tell(current_trial, state=optuna.trial.TrialState.FAIL)
+                i = n_trials
                 break
+
+            value = physical_objective(current_trial)
+            study.tell(current_trial, value)
+            current = step['params']
+            i += 1
     
     print("\n" + "="*50)
     print("Physical Parameter Optimization Complete!")
@@ -0,0 +1,201 @@
+"""
+batch_optimizer.py
+
+Batch (q-point) parameter proposals for running several joystick stations at once.
+run_tracking_optimization asks and tells strictly one trial at a time; BatchSuggester instead proposes
+q diverse parameter sets from the same Optuna study and accepts the results back in any order.
+Diversity comes from fantasized observations for the trials that are still running:
+    - kriging_believer: a pending point is believed to score the GP posterior mean there.
+    - constant_liar: a pending point is assumed to score a constant (min, mean or max of the observed values).
+    - local_penalization: EI is multiplied by a penalty around each pending point, based on a Lipschitz
+      estimate of the GP mean (no refit needed).
+
+Main components:
+- BatchSuggester: Proposes q parameter sets per call and records results by trial number.
+- main: Example with several simulated stations returning results out of order.
+
+Dependencies: numpy, scipy, scikit-learn, optuna, custom modules (acquisition).
+"""
+
+import numpy as np
+import optuna
+from scipy.stats import norm
+from sklearn.gaussian_process import GaussianProcessRegressor
+from sklearn.gaussian_process.kernels import ConstantKernel, Matern
+
+from acquisition import SEARCH_SPACE, expected_improvement, sobol_candidates
+
+
+class BatchSuggester:
+    STRATEGIES = ('kriging_believer', 'constant_liar', 'local_penalization')
+
+    def __init__(self, study, search_space, strategy='kriging_believer', liar='min',
+                 n_candidates=1024, n_startup_trials=3, seed=None):
+        """
+        Args:
+            study (optuna.Study): Study that owns all trials (direction 'maximize' or 'minimize').
+            search_space (dict): Parameter name -> (low, high), e.g. {'speed_factor': (1.0, 10.0)}.
+            strategy (str): One of STRATEGIES.
+            liar (str): Fantasy value for constant_liar: 'min', 'mean' or 'max' of the observed values.
+            n_candidates (int): Size of the Sobol candidate set scored per proposal.
+            n_startup_trials (int): Completed trials needed before the GP is used; before that, Sobol points.
+            seed (int): Seed for the candidate sets.
+        """
+        if strategy not in self.STRATEGIES:
+            raise ValueError(f"Unknown strategy: {strategy}")
+
+        self.study = study
+        self.search_space = dict(search_space)
+        self.names = list(self.search_space)
+        self.bounds = np.array([self.search_space[name] for name in self.names], dtype=float)
+        self.strategy = strategy
+        self.liar = liar
+        self.n_candidates = n_candidates
+        self.n_startup_trials = n_startup_trials
+        self.rng = np.random.default_rng(seed)
+        self.sign = 1.0 if study.direction == optuna.study.StudyDirection.MAXIMIZE else -1.0
+        self.pending = {}
+
+    def _to_unit(self, params):
+        values = np.array([params[name] for name in self.names], dtype=float)
+        return (values - self.bounds[:, 0]) / (self.bounds[:, 1] - self.bounds[:, 0])
+
+    def _from_unit(self, x):
+        values = self.bounds[:, 0] + x * (self.bounds[:, 1] - self.bounds[:, 0])
+        return {name: float(v) for name, v in zip(self.names, values)}
+
+    def _observations(self):
+        trials = self.study.get_trials(deepcopy=False, states=(optuna.trial.TrialState.COMPLETE,))
+        trials = [t for t in trials if all(name in t.params for name in self.names)]
+        X = np.array([self._to_unit(t.params) for t in trials]).reshape(-1, len(self.names))
+        y = self.sign * np.array([t.value for t in trials], dtype=float)
+        return X, y
+
+    def _pending_points(self):
+        running = self.study.get_trials(deepcopy=False, states=(optuna.trial.TrialState.RUNNING,))
+        return [self._to_unit(t.params) for t in running if all(name in t.params for name in self.names)]
+
+    def _candidates(self):
+        return sobol_candidates(len(self.names), self.n_candidates, self.rng)
+
+    def _fit(self, X, y, kernel=None):
+        if kernel is None:
+            kernel = ConstantKernel(1.0) * Matern(length_scale=np.full(len(self.names), 0.3), nu=2.5)
+            optimizer = 'fmin_l_bfgs_b'
+        else:
+            optimizer = None
+        gp = GaussianProcessRegressor(kernel=kernel, alpha=1e-4, normalize_y=True,
+                                      optimizer=optimizer, n_restarts_optimizer=2, random_state=42)
+        return gp.fit(X, y)
+
+    def _fantasy_value(self, gp, x, y):
+        if self.strategy == 'kriging_believer':
+            return float(gp.predict(x[None, :])[0])
+        if self.liar == 'max':
+            return float(np.max(y))
+        if self.liar == 'mean':
+            return float(np.mean(y))
+        return float(np.min(y))
+
+    def _local_penalty(self, gp, candidates, pending, best):
+        """Penalty in [0, 1] around each pending point, as in local penalization (Gonzalez et al.)."""
+        penalty = np.ones(len(candidates))
+        if not pending:
+            return penalty
+
+        mu_cand = gp.predict(candidates)
+        sample = self.rng.choice(len(candidates), size=min(256, len(candidates)), replace=False)
+        dists = np.linalg.norm(candidates[sample][:, None] - candidates[sample][None, :], axis=-1)
+        slopes = np.abs(mu_cand[sample][:, None] - mu_cand[sample][None, :]) / np.maximum(dists, 1e-9)
+        lipschitz = max(float(np.max(slopes)), 1e-7)
+
+        pending = np.array(pending)
+        mu_p, sigma_p = gp.predict(pending, return_std=True)
+        for xp, m, s in zip(pending, mu_p, sigma_p):
+            r = np.linalg.norm(candidates - xp, axis=1)
+            penalty *= norm.cdf((lipschitz * r - best + m) / (np.sqrt(2) * max(s, 1e-9)))
+        return penalty
+
+    def _propose(self, gp, X, y, pending):
+        candidates = self._candidates()
+        if gp is None:
+            if not pending:
+                return candidates[0]
+            # Space-filling: farthest candidate from everything observed or running
+            taken = np.vstack([X.reshape(-1, len(self.names)), np.array(pending)])
+            dists = np.min(np.linalg.norm(candidates[:, None] - taken[None, :], axis=-1), axis=1)
+            return candidates[np.argmax(dists)]
+
+        best = np.max(y)
+        if self.strategy == 'local_penalization':
+            mu, sigma = gp.predict(candidates, return_std=True)
+            acquisition = expected_improvement(mu, sigma, best) * self._local_penalty(gp, candidates, pending, best)
+            return candidates[np.argmax(acquisition)]
+
+        X_fantasy, y_fantasy = X, y
+        for xp in pending:
+            X_fantasy = np.vstack([X_fantasy, xp])
+            y_fantasy = np.append(y_fantasy, self._fantasy_value(gp, xp, y))
+        if pending:
+            # Fantasies only move the posterior; hyperparameters stay those fitted on real data
+            gp = self._fit(X_fantasy, y_fantasy, kernel=gp.kernel_)
+
+        mu, sigma = gp.predict(candidates, return_std=True)
+        return candidates[np.argmax(expected_improvement(mu, sigma, best))]
+
+    def suggest(self, q):
+        """
+        Returns q (trial, params) pairs. Each trial is already asked from the study and stays
+        RUNNING (and fantasized for later proposals) until tell() is called for its number.
+        """
+        X, y = self._observations()
+        pending = self._pending_points()
+        gp = self._fit(X, y) if len(y) >= self.n_startup_trials else None
+        proposals = []
+
+        for _ in range(q):
+            x = self._propose(gp, X, y, pending)
+            params = self._from_unit(np.clip(x, 0.0, 1.0))
+
+            self.study.enqueue_trial(params)
+            trial = self.study.ask()
+            for name, (low, high) in self.search_space.items():
+                trial.suggest_float(name, low, high)
+
+            self.pending[trial.number] = params
+            pending.append(self._to_unit(params))
+            proposals.append((trial, params))
+
+        return proposals
+
+    def tell(self, trial_number, value=None, state=None):
+        """Records a result for any pending trial, in any order."""
+        self.study.tell(trial_number, value, state=state)
+        self.pending.pop(trial_number, None)
+
+
+def main(n_stations=4, n_results=20, strategy='kriging_believer'):
+    def simulated_session(params):
+        return -((params['speed_factor'] - 6.5) / 9) ** 2 - ((params['friction'] - 0.99) / 0.07) ** 2
+
+    optuna.logging.set_verbosity(optuna.logging.WARNING)
+    study = optuna.create_study(direction='maximize')
+    suggester = BatchSuggester(study, SEARCH_SPACE,
+                               strategy=strategy, seed=0)
+
+    proposals = suggester.suggest(n_stations)
+    for _ in range(n_results):
+        # Stations finish in random order; the free station immediately gets a new proposal
+        trial, params = proposals.pop(np.random.randint(len(proposals)))
+        suggester.tell(trial.number, simulated_session(params))
+        proposals += suggester.suggest(1)
+
+    for trial, _ in proposals:
+        suggester.tell(trial.number, state=optuna.trial.TrialState.FAIL)
+
+    print(f"Best Params: {study.best_params}")
+    print(f"Best Score: {study.best_value:.4f}")
+
+
+if __name__ == "__main__":
+    main()
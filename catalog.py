@@ -0,0 +1,485 @@
+"""
+catalog.py
+
+Cross-session SQLite index over studies, trials and episodes.
+Results are spread over session directories (see session_store.py), the results store (see results_store.py)
+and older optimization_<timestamp>.txt and results_<task>_<time>.txt files. The catalog ingests all of them into
+one indexed SQLite file:
+    - studies: one row per session or legacy file, with its task type, participant, configuration and the
+      modification time and size of its source files, so that re-ingesting skips unchanged sources,
+    - trials: one row per trial with its phase, value, average scores, the noise variance of its mean score and
+      the reason its episodes stopped (see sequential_stopping.py), which marks pruned trials,
+    - params: trial parameters in long format (name, value), indexed on (name, value) for range queries,
+    - episodes: one row per episode with its scores and the location of its raw telemetry (distances, sampling
+      times): the byte offset of its line in session.jsonl, or its row in the results store Parquet file.
+A session found both in a session directory and in the results store is catalogued from the store, which holds
+the final preference scores and warm-up flags; the participant and configuration are kept from the sidecar.
+
+Main components:
+- Catalog: Ingests sources, answers range queries and feeds warm-starts and pooled models.
+- main: Command line entry point.
+
+Usage:
+    python catalog.py ingest sessions results_store optimization_*.txt
+    python catalog.py query --task-type aiming --range friction 0.98 - --range value 0.5 -
+
+Dependencies: argparse, json, os, re, sqlite3, numpy, optuna, pyarrow, custom modules (lambda_sweep, results_store,
+sequential_stopping, session_store, task_types).
+"""
+
+import argparse
+import json
+import os
+import re
+import sqlite3
+
+import numpy as np
+import optuna
+import pyarrow.parquet as pq
+
+from lambda_sweep import load_study_file
+from results_store import SCHEMAS, ResultsStore
+from sequential_stopping import PRUNED
+from session_store import SessionStore
+from task_types import TaskType
+
+CATALOG_PATH = 'catalog.sqlite'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS studies (
+    id INTEGER PRIMARY KEY,
+    session TEXT NOT NULL UNIQUE,
+    kind TEXT NOT NULL,
+    source TEXT NOT NULL,
+    signature TEXT NOT NULL,
+    task_type TEXT,
+    participant TEXT,
+    config TEXT
+);
+CREATE TABLE IF NOT EXISTS trials (
+    study_id INTEGER NOT NULL REFERENCES studies(id) ON DELETE CASCADE,
+    trial INTEGER NOT NULL,
+    phase TEXT,
+    value REAL,
+    avg_accuracy REAL,
+    avg_time REAL,
+    avg_performance REAL,
+    preference REAL,
+    n_episodes INTEGER,
+    noise_var REAL,
+    stop_reason TEXT,
+    PRIMARY KEY (study_id, trial)
+);
+CREATE TABLE IF NOT EXISTS params (
+    study_id INTEGER NOT NULL,
+    trial INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    value REAL NOT NULL,
+    PRIMARY KEY (study_id, trial, name),
+    FOREIGN KEY (study_id, trial) REFERENCES trials(study_id, trial) ON DELETE CASCADE
+);
+CREATE TABLE IF NOT EXISTS episodes (
+    study_id INTEGER NOT NULL,
+    trial INTEGER NOT NULL,
+    episode INTEGER NOT NULL,
+    warmup INTEGER NOT NULL DEFAULT 0,
+    accuracy REAL,
+    time REAL,
+    performance REAL,
+    error REAL,
+    moving_time REAL,
+    jitter REAL,
+    completion_time REAL,
+    raw_path TEXT,
+    raw_offset INTEGER,
+    PRIMARY KEY (study_id, trial, episode),
+    FOREIGN KEY (study_id, trial) REFERENCES trials(study_id, trial) ON DELETE CASCADE
+);
+CREATE INDEX IF NOT EXISTS studies_task_type ON studies(task_type, participant);
+CREATE INDEX IF NOT EXISTS params_name_value ON params(name, value, study_id, trial);
+CREATE INDEX IF NOT EXISTS trials_value ON trials(value);
+CREATE INDEX IF NOT EXISTS trials_avg_performance ON trials(avg_performance);
+CREATE INDEX IF NOT EXISTS episodes_performance ON episodes(performance);
+"""
+
+TRIAL_COLUMNS = ['phase', 'value', 'avg_accuracy', 'avg_time', 'avg_performance', 'preference', 'n_episodes',
+                 'noise_var', 'stop_reason']
+EPISODE_COLUMNS = ['accuracy', 'time', 'performance', 'error', 'moving_time', 'jitter', 'completion_time']
+STUDY_COLUMNS = ['session', 'kind', 'task_type', 'participant']
+PARAM_NAMES = ['speed_factor', 'friction']
+
+
+def _signature(paths):
+    """Modification times and sizes of a source's files; a source is re-ingested when this changes."""
+    parts = []
+    for path in paths:
+        if os.path.exists(path):
+            stat = os.stat(path)
+            parts.append(f"{stat.st_mtime_ns}:{stat.st_size}")
+        else:
+            parts.append("-")
+    return ",".join(parts)
+
+
+def _legacy_task_type(path):
+    """Task type from a results_<task>_<time>.txt file name, None if it has none."""
+    match = re.match(r'results_([a-z_]+?)_\d', os.path.basename(path))
+    if match and match.group(1) in {t.value for t in TaskType}:
+        return match.group(1)
+    return None
+
+
+class Catalog:
+    def __init__(self, path=CATALOG_PATH):
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA foreign_keys = ON")
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    # --- Ingest ---
+
+    def ingest(self, paths, task_type=None, participant=None):
+        """
+        Ingests session directories, results store directories and legacy text files; unchanged sources are
+        skipped.
+
+        Args:
+            paths (list): A directory of sessions, a single session directory, a results store directory,
+                optimization_*.txt or results*.txt files.
+            task_type (str): Task type for sources that do not record one (optimization_*.txt).
+            participant (str): Participant for sources that do not record one.
+
+        Returns:
+            tuple: (number of sources ingested, number skipped as unchanged).
+        """
+        sources = []
+        for path in paths:
+            if os.path.isdir(os.path.join(path, 'trials')) or os.path.isdir(os.path.join(path, 'episodes')):
+                store = ResultsStore(path)
+                sources += [(self._ingest_store_session, (store, session)) for session in store.sessions()]
+            elif os.path.isfile(os.path.join(path, 'session.jsonl')):
+                directory, name = os.path.split(os.path.normpath(path))
+                sources.append((self._ingest_session, (directory, name)))
+            elif os.path.isdir(path):
+                sources += [(self._ingest_session, (path, name)) for name in sorted(os.listdir(path))
+                            if os.path.isfile(os.path.join(path, name, 'session.jsonl'))]
+            elif os.path.basename(path).startswith('optimization'):
+                sources.append((self._ingest_optimization_file, (path,)))
+            elif os.path.basename(path).startswith('results'):
+                sources.append((self._ingest_results_file, (path,)))
+            else:
+                print(f"Skipping {path}: not a session, results store or result file")
+
+        ingested = 0
+        with self.db:
+            for ingest, args in sources:
+                ingested += ingest(*args, task_type=task_type, participant=participant)
+        print(f"Ingested {ingested} of {len(sources)} sources into {self.path}, "
+              f"{len(sources) - ingested} unchanged")
+        return ingested, len(sources) - ingested
+
+    def _study(self, session, kind, source, signature, task_type, participant, config):
+        """
+        Replaces the study of a session and returns its id, or None when it is already up to date or is held
+        by the results store.
+        """
+        row = self.db.execute("SELECT id, kind, signature, task_type, participant, config FROM studies "
+                              "WHERE session = ?", (session,)).fetchone()
+        if row is not None:
+            if row['kind'] == kind and row['signature'] == signature:
+                return None
+            if row['kind'] == 'store' and kind == 'session':
+                return None
+            # Whatever the new source lacks (the results store has no sidecar) is kept from the replaced row
+            task_type = task_type or row['task_type']
+            participant = participant or row['participant']
+            config = config or json.loads(row['config'] or 'null')
+            self.db.execute("DELETE FROM studies WHERE id = ?", (row['id'],))
+        cursor = self.db.execute(
+            "INSERT INTO studies (session, kind, source, signature, task_type, participant, config) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (session, kind, source, signature, task_type, participant, json.dumps(config) if config else None))
+        return cursor.lastrowid
+
+    def _insert_trial(self, study_id, trial, params, **scores):
+        self.db.execute(
+            f"INSERT INTO trials (study_id, trial, {', '.join(TRIAL_COLUMNS)}) "
+            f"VALUES (?, ?, {', '.join('?' * len(TRIAL_COLUMNS))})",
+            (study_id, trial, *[scores.get(name) for name in TRIAL_COLUMNS]))
+        self.db.executemany("INSERT INTO params (study_id, trial, name, value) VALUES (?, ?, ?, ?)",
+                            [(study_id, trial, name, float(value)) for name, value in params.items()
+                             if value is not None])
+
+    def _insert_episodes(self, study_id, rows):
+        """rows: (trial, episode, warmup, episode record, raw_path, raw_offset)."""
+        self.db.executemany(
+            f"INSERT INTO episodes (study_id, trial, episode, warmup, {', '.join(EPISODE_COLUMNS)}, raw_path, "
+            f"raw_offset) VALUES (?, ?, ?, ?, {', '.join('?' * len(EPISODE_COLUMNS))}, ?, ?)",
+            [(study_id, trial, episode, int(bool(warmup)), *[record.get(name) for name in EPISODE_COLUMNS],
+              raw_path, raw_offset) for trial, episode, warmup, record, raw_path, raw_offset in rows])
+
+    def _ingest_session(self, directory, name, task_type=None, participant=None):
+        store = SessionStore(name, directory)
+        signature = _signature([store.sidecar_path, os.path.join(store.directory, 'study.log')])
+        state = store.load()
+        config = state.config
+        study_id = self._study(name, 'session', store.directory, signature, config.get('task_type', task_type),
+                               config.get('participant', participant), config)
+        if study_id is None:
+            return 0
+
+        study = optuna.load_study(study_name=name, storage=store.storage)
+        trials = {t.number: t for t in study.get_trials(deepcopy=False, states=(optuna.trial.TrialState.COMPLETE,))}
+        for number, trial in trials.items():
+            scores = state.detailed_scores.get(number, {})
+            self._insert_trial(study_id, number, trial.params, phase=trial.user_attrs.get('phase', 'optimization'),
+                               value=trial.value, n_episodes=len(state.episodes.get(number, [])),
+                               stop_reason=trial.user_attrs.get('stop_reason'),
+                               **{k: scores.get(k) for k in ('avg_accuracy', 'avg_time', 'avg_performance',
+                                                             'noise_var')})
+
+        # Byte offsets of the episode records in the sidecar, so their telemetry can be read without a scan
+        rows, counts = [], {}
+        with open(store.sidecar_path, 'rb') as f:
+            offset = 0
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    record = {}
+                if record.get('kind') == 'episode' and record['trial_number'] in trials:
+                    number = record['trial_number']
+                    index = counts[number] = counts.get(number, -1) + 1
+                    phase = trials[number].user_attrs.get('phase', 'optimization')
+                    # Same warm-up cut as tracking_objective; initial samples are averaged without one
+                    n = len(state.episodes[number])
+                    warmup = index < min(10, n // 2) if phase == 'optimization' else False
+                    rows.append((number, index, warmup, record['episode'], store.sidecar_path, offset))
+                offset += len(line)
+        self._insert_episodes(study_id, rows)
+        return 1
+
+    def _ingest_store_session(self, store, session, task_type=None, participant=None):
+        paths = [store._path(table, session) for table in SCHEMAS]
+        trials = store.read('trials', sessions=[session]).to_pylist()
+        study_id = self._study(session, 'store', store.directory, _signature(paths),
+                               trials[0]['task_type'] if trials else task_type, participant, None)
+        if study_id is None:
+            return 0
+
+        for row in trials:
+            self._insert_trial(study_id, row['trial'], {name: row[name] for name in PARAM_NAMES},
+                               **{name: row[name] for name in TRIAL_COLUMNS})
+        # Telemetry stays in Parquet; rows are addressed by their index in the session's episodes file
+        columns = ['trial', 'episode', 'warmup'] + EPISODE_COLUMNS
+        path = store._path('episodes', session)
+        episodes = store.read('episodes', columns=columns, sessions=[session]).to_pylist()
+        self._insert_episodes(study_id, [(e['trial'], e['episode'], e['warmup'], e, path, i)
+                                         for i, e in enumerate(episodes)])
+        return 1
+
+    def _ingest_optimization_file(self, path, task_type=None, participant=None):
+        session = os.path.splitext(os.path.basename(path))[0]
+        study_id = self._study(session, 'optimization_txt', path, _signature([path]), task_type, participant, None)
+        if study_id is None:
+            return 0
+        for trial in load_study_file(path):
+            scores = trial['scores']
+            self._insert_trial(study_id, trial['number'], trial['params'], value=scores.get('Final Score'),
+                               avg_performance=scores.get('Performance Score'),
+                               preference=scores.get('Preference Score'))
+        return 1
+
+    def _ingest_results_file(self, path, task_type=None, participant=None):
+        session = os.path.splitext(os.path.basename(path))[0]
+        study_id = self._study(session, 'results_txt', path, _signature([path]), _legacy_task_type(path) or task_type,
+                               participant, None)
+        if study_id is None:
+            return 0
+        # One simulated trial; the files only kept the performance scores after the warm-up
+        with open(path, 'r') as f:
+            scores = [float(line.split(': ')[1]) for line in f if line.strip()]
+        self._insert_trial(study_id, 0, {}, phase='simulation', value=float(np.mean(scores)) if scores else None,
+                           avg_performance=float(np.mean(scores)) if scores else None, n_episodes=len(scores))
+        self._insert_episodes(study_id, [(0, i, False, {'performance': score}, path, None)
+                                         for i, score in enumerate(scores)])
+        return 1
+
+    # --- Queries ---
+
+    def _where(self, filters):
+        """
+        SQL conditions and arguments for filters on studies (exact values), trial scores and parameters
+        ((low, high) ranges with None for an open end, or exact values).
+        """
+        joins, join_args, conditions, args = [], [], [], []
+
+        def add(column, condition):
+            if isinstance(condition, (tuple, list)):
+                low, high = condition
+                if low is not None:
+                    conditions.append(f"{column} >= ?")
+                    args.append(low)
+                if high is not None:
+                    conditions.append(f"{column} <= ?")
+                    args.append(high)
+            else:
+                conditions.append(f"{column} = ?")
+                args.append(condition)
+
+        for name, condition in filters.items():
+            if condition is None:
+                continue
+            if name in STUDY_COLUMNS:
+                add(f"s.{name}", condition)
+            elif name in TRIAL_COLUMNS or name == 'trial':
+                add(f"t.{name}", condition)
+            else:
+                alias = f"p{len(joins)}"
+                joins.append(f"JOIN params {alias} ON {alias}.study_id = t.study_id AND {alias}.trial = t.trial "
+                             f"AND {alias}.name = ?")
+                join_args.append(name)
+                add(f"{alias}.value", condition)
+        return " ".join(joins), " AND ".join(conditions) or "1", join_args + args
+
+    def trials(self, **filters):
+        """
+        Trials matching all filters, e.g. trials(task_type='aiming', friction=(0.98, None), value=(0.5, None)).
+
+        Args:
+            **filters: session, kind, task_type and participant match exactly; phase, value, the average scores,
+                trial and any parameter name take a value or a (low, high) range.
+
+        Returns:
+            list: Dicts with the study and trial columns and a 'params' dict.
+        """
+        joins, where, args = self._where(filters)
+        rows = self.db.execute(
+            f"SELECT s.session, s.kind, s.task_type, s.participant, t.* FROM trials t "
+            f"JOIN studies s ON s.id = t.study_id {joins} WHERE {where} ORDER BY s.session, t.trial", args).fetchall()
+
+        params = {}
+        if rows:
+            study_ids = sorted({row['study_id'] for row in rows})
+            for p in self.db.execute(f"SELECT * FROM params WHERE study_id IN ({', '.join('?' * len(study_ids))})",
+                                     study_ids):
+                params.setdefault((p['study_id'], p['trial']), {})[p['name']] = p['value']
+        return [{**dict(row), 'params': params.get((row['study_id'], row['trial']), {})} for row in rows]
+
+    def episodes(self, include_warmup=False, **filters):
+        """Episodes of the trials matching the filters (see trials), with the location of their telemetry."""
+        joins, where, args = self._where(filters)
+        if not include_warmup:
+            where += " AND e.warmup = 0"
+        rows = self.db.execute(
+            f"SELECT s.session, s.task_type, s.participant, e.* FROM episodes e "
+            f"JOIN trials t ON t.study_id = e.study_id AND t.trial = e.trial "
+            f"JOIN studies s ON s.id = t.study_id {joins} WHERE {where} "
+            f"ORDER BY s.session, e.trial, e.episode", args).fetchall()
+        return [dict(row) for row in rows]
+
+    @staticmethod
+    def raw_episode(row):
+        """Full episode record (distances, sampling times, ...) of a row returned by episodes()."""
+        if row['raw_path'] is None or row['raw_offset'] is None:
+            return None
+        if row['raw_path'].endswith('.parquet'):
+            return pq.read_table(row['raw_path']).slice(row['raw_offset'], 1).to_pylist()[0]
+        with open(row['raw_path'], 'rb') as f:
+            f.seek(row['raw_offset'])
+            return json.loads(f.readline())['episode']
+
+    # --- Feeds ---
+
+    def warm_start_observations(self, exclude=(), **filters):
+        """
+        (task_type, params, value, noise_var) of completed, unpruned trials matching the filters, in the format of
+        multitask_sampler.observations_from_sessions, for MultiTaskGPSampler's source_observations.
+
+        Args:
+            exclude (iterable): Sessions to skip, e.g. the session being optimized.
+        """
+        observations = []
+        for row in self.trials(**filters):
+            # Pruned trials are told 0.0 and say little about the surface; a value of 0.0 is otherwise a score
+            if (row['session'] in exclude or row['value'] is None or row['stop_reason'] in PRUNED
+                    or row['task_type'] is None
+                    or not all(name in row['params'] for name in PARAM_NAMES)):
+                continue
+            observations.append((row['task_type'], {name: row['params'][name] for name in PARAM_NAMES},
+                                 row['value'], row['noise_var']))
+        return observations
+
+    def pooled_dataset(self, param_names=PARAM_NAMES, target='value', **filters):
+        """
+        Trials pooled over sessions as arrays, for fitting one model over all participants and sessions.
+
+        Args:
+            param_names (list): Parameters forming the columns of X.
+            target (str): Trial column used as the target, e.g. 'value' or 'avg_performance'.
+
+        Returns:
+            tuple: (X, tasks, y) with X of shape (n, len(param_names)), tasks the TaskType indices (as in
+                MultiTaskGP.fit) and y the targets; trials missing a parameter or the target are left out.
+        """
+        task_types = [t.value for t in TaskType]
+        rows = [row for row in self.trials(**filters)
+                if row[target] is not None and row['task_type'] in task_types
+                and all(name in row['params'] for name in param_names)]
+        X = np.array([[row['params'][name] for name in param_names] for row in rows], dtype=float)
+        tasks = np.array([task_types.index(row['task_type']) for row in rows], dtype=int)
+        y = np.array([row[target] for row in rows], dtype=float)
+        return X.reshape(len(rows), len(param_names)), tasks, y
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cross-session SQLite index over studies, trials and episodes.")
+    parser.add_argument('--catalog', default=CATALOG_PATH, help="path of the catalog database")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    ingest = commands.add_parser('ingest', help="index sessions, results stores and legacy result files")
+    ingest.add_argument('paths', nargs='*', default=['sessions', 'results_store'])
+    ingest.add_argument('--task-type', choices=[t.value for t in TaskType],
+                        help="task type for sources that do not record one")
+    ingest.add_argument('--participant', help="participant for sources that do not record one")
+
+    query = commands.add_parser('query', help="list trials matching the filters")
+    query.add_argument('--task-type', choices=[t.value for t in TaskType])
+    query.add_argument('--participant')
+    query.add_argument('--session')
+    query.add_argument('--phase')
+    query.add_argument('--range', nargs=3, action='append', default=[], metavar=('NAME', 'LOW', 'HIGH'),
+                       help="parameter or score range, '-' for an open end; may be repeated")
+    query.add_argument('--episodes', action='store_true', help="list the matching episodes instead")
+    args = parser.parse_args()
+
+    catalog = Catalog(args.catalog)
+    if args.command == 'ingest':
+        catalog.ingest(args.paths, task_type=args.task_type, participant=args.participant)
+    else:
+        filters = {'task_type': args.task_type, 'participant': args.participant, 'session': args.session,
+                   'phase': args.phase}
+        for name, low, high in args.range:
+            filters[name] = (None if low == '-' else float(low), None if high == '-' else float(high))
+        if args.episodes:
+            rows = catalog.episodes(**filters)
+            for row in rows:
+                print(f"{row['session']} Trial #{row['trial']} episode {row['episode']}: "
+                      f"performance={row['performance']}, telemetry {row['raw_path']}@{row['raw_offset']}")
+            print(f"{len(rows)} episodes")
+        else:
+            rows = catalog.trials(**filters)
+            for row in rows:
+                params = ", ".join(f"{name}={value:.4f}" for name, value in row['params'].items())
+                value = "-" if row['value'] is None else f"{row['value']:.4f}"
+                print(f"{row['session']} ({row['task_type']}) Trial #{row['trial']}: {params}, value={value}")
+            print(f"{len(rows)} trials")
+    catalog.close()
+
+
+if __name__ == "__main__":
+    main()
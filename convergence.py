@@ -0,0 +1,139 @@
+"""
+convergence.py
+
+Study-level convergence detection for tracking_op.py.
+After every trial a GP is fitted to the completed trials and three criteria are computed:
+    - max_ei: the largest expected improvement over the incumbent anywhere in the search space,
+    - regret_bound: an upper bound on the simple regret of the incumbent, max UCB(x) - LCB(incumbent),
+    - incumbent stability: for how many consecutive updates the incumbent (the completed trial with the
+      highest posterior mean, so a lucky single score does not count) has stayed the same trial, or been
+      replaced by one whose posterior mean differs by less than ei_threshold.
+The study has converged once it has min_trials trials, the incumbent has been stable for `patience` updates
+and either max_ei or regret_bound is below its threshold; further trials are then unlikely to be worth the
+participant's time. The GP is fitted to the trials' objective scores: in pair mode the told values mix in
+Plackett-Luce utilities, which are rescaled at every refit of the preference model and would move the criteria
+without any new measurement. The GP adds each trial's noise variance (see acquisition.trial_noise_var) to its diagonal, so
+trials stopped after a few episodes count less than those that ran to the maximum.
+
+Main components:
+- ConvergenceMonitor: Updates the criteria from a study and keeps their trajectory.
+
+Dependencies: numpy, scikit-learn, optuna, custom modules (acquisition).
+"""
+
+import numpy as np
+import optuna
+from sklearn.gaussian_process import GaussianProcessRegressor
+from sklearn.gaussian_process.kernels import ConstantKernel, Matern, WhiteKernel
+
+from acquisition import SEARCH_SPACE, expected_improvement, normalized_noise, sobol_candidates, trial_noise_var
+
+
+def _objective_score(trial):
+    """The trial's objective score without the preference term, or None for trials told 0.0 without one."""
+    if 'objective_score' in trial.user_attrs:
+        return trial.user_attrs['objective_score']
+    # Optimization trials of tracking_objective without a score were pruned or had no joystick. Initial samples
+    # of sessions stored before their objective score was recorded, and other studies, are told the score itself.
+    if trial.user_attrs.get('phase') == 'optimization':
+        return None
+    return trial.value
+
+
+class ConvergenceMonitor:
+    def __init__(self, search_space=None, ei_threshold=0.01, regret_threshold=0.05, patience=2, min_trials=6,
+                 beta=2.0, n_candidates=1024, seed=None, history=None):
+        """
+        Args:
+            search_space (dict): Parameter name -> (low, high); defaults to speed_factor and friction.
+            ei_threshold (float): Converged once the maximum expected improvement is below this.
+            regret_threshold (float): Or once the simple-regret upper bound is below this.
+            patience (int): Consecutive updates the incumbent must have stayed the same.
+            min_trials (int): Completed trials needed before the study can converge.
+            beta (float): Width of the confidence bounds of the regret bound, in posterior stds.
+            n_candidates (int): Size of the Sobol set over which EI and UCB are maximized.
+            seed (int): Seed for the candidate sets.
+            history (list): Criteria of earlier updates, e.g. from a resumed session.
+        """
+        self.search_space = dict(search_space or SEARCH_SPACE)
+        self.names = list(self.search_space)
+        self.bounds = np.array([self.search_space[name] for name in self.names], dtype=float)
+        self.ei_threshold = ei_threshold
+        self.regret_threshold = regret_threshold
+        self.patience = patience
+        self.min_trials = min_trials
+        self.beta = beta
+        self.n_candidates = n_candidates
+        self.rng = np.random.default_rng(seed)
+        self.history = list(history or [])
+
+    @property
+    def converged(self):
+        return bool(self.history) and self.history[-1]['converged']
+
+    def _to_unit(self, params):
+        values = np.array([params[name] for name in self.names], dtype=float)
+        return (values - self.bounds[:, 0]) / (self.bounds[:, 1] - self.bounds[:, 0])
+
+    def update(self, study):
+        """Computes the criteria from the completed trials of study, appends them to history and returns them."""
+        # Trials told 0.0 without a score (no joystick, pruned) say nothing about the surface
+        trials = [t for t in study.get_trials(deepcopy=False, states=(optuna.trial.TrialState.COMPLETE,))
+                  if _objective_score(t) is not None and all(name in t.params for name in self.names)]
+        record = {'n_trials': len(trials), 'max_ei': None, 'regret_bound': None, 'incumbent': None,
+                  'incumbent_mean': None, 'stable_updates': 0, 'converged': False}
+        if len(trials) < 2:
+            self.history.append(record)
+            return record
+
+        X = np.array([self._to_unit(t.params) for t in trials])
+        y = np.array([_objective_score(t) for t in trials], dtype=float)
+        # Trials with few episodes are noisier observations
+        noise = normalized_noise(trial_noise_var(trials), y)
+        kernel = (ConstantKernel(1.0) * Matern(length_scale=np.full(len(self.names), 0.3), nu=2.5)
+                  + WhiteKernel(1e-3, noise_level_bounds=(1e-6, 1e-1)))
+        gp = GaussianProcessRegressor(kernel=kernel, alpha=1e-10 + noise, normalize_y=True, n_restarts_optimizer=2,
+                                      random_state=42)
+        gp.fit(X, y)
+        # Refit without the white kernel so that predicted stds are those of the latent function, not of a score
+        gp = GaussianProcessRegressor(kernel=gp.kernel_.k1, alpha=gp.kernel_.k2.noise_level + noise, normalize_y=True,
+                                      optimizer=None).fit(X, y)
+
+        mu_obs, sigma_obs = gp.predict(X, return_std=True)
+        best = int(np.argmax(mu_obs))
+        candidates = sobol_candidates(len(self.names), self.n_candidates, self.rng)
+        mu, sigma = gp.predict(candidates, return_std=True)
+
+        ei = expected_improvement(mu, sigma, mu_obs[best])
+        ucb = max(np.max(mu + self.beta * sigma), np.max(mu_obs + self.beta * sigma_obs))
+        regret_bound = ucb - (mu_obs[best] - self.beta * sigma_obs[best])
+
+        incumbent = trials[best].number
+        previous = self.history[-1] if self.history else None
+        stable = 0
+        if previous and previous['incumbent'] is not None and (
+                previous['incumbent'] == incumbent
+                or abs(previous['incumbent_mean'] - mu_obs[best]) < self.ei_threshold):
+            stable = previous['stable_updates'] + 1
+
+        record.update({
+            'max_ei': float(np.max(ei)),
+            'regret_bound': float(regret_bound),
+            'incumbent': incumbent,
+            'incumbent_mean': float(mu_obs[best]),
+            'stable_updates': stable,
+        })
+        record['converged'] = bool(
+            len(trials) >= self.min_trials and stable >= self.patience
+            and (record['max_ei'] < self.ei_threshold or record['regret_bound'] < self.regret_threshold))
+        self.history.append(record)
+        return record
+
+    @staticmethod
+    def report(record):
+        if record['max_ei'] is None:
+            print(f"Convergence: {record['n_trials']} trials, not enough to judge")
+            return
+        print(f"Convergence: max EI {record['max_ei']:.4f}, regret bound {record['regret_bound']:.4f}, "
+              f"incumbent #{record['incumbent']} stable for {record['stable_updates']} updates"
+              f"{' -> converged' if record['converged'] else ''}")
@@ -0,0 +1,353 @@
+"""
+coordinator.py
+
+Local ask/tell coordination server so several experiment stations (machines with a joystick) can work on one
+shared optimization concurrently.
+The coordinator process owns the Optuna study, the batch suggester (see batch_optimizer.py) and the preference
+model; stations talk to it over HTTP with JSON bodies. Every handed-out parameter set is a lease: the station has to
+report episodes or heartbeats before the lease times out, otherwise the trial is failed and its parameters are
+handed to the next station that asks.
+
+Endpoints (all POST except /status):
+    /ask        {station}                       -> {lease_id, trial_number, params, lease_timeout}
+    /heartbeat  {lease_id}                      -> renews the lease
+    /episode    {lease_id, episode}             -> appends one episode record, renews the lease
+    /tell       {lease_id[, value]}             -> completes the trial; without value it is scored from the episodes
+                                                   and combined with its preference utility, as in tracking_objective
+    /preference {winner, loser}                 -> adds a pairwise comparison between trial numbers and refits
+    /status     (GET)                           -> trial counts, open leases, best value
+
+Main components:
+- Coordinator: Study, leases, episode records and preference model behind a lock.
+- serve: Runs the coordinator behind a ThreadingHTTPServer.
+- StationClient: Minimal client for the endpoints above.
+- run_station: Station loop that runs tasks with TaskSwitcher and streams results to the coordinator.
+
+Usage:
+    python coordinator.py serve --port 8765
+    python coordinator.py station --url http://localhost:8765 --station lab-pc-2
+
+Dependencies: http.server, json, threading, urllib, optuna, custom modules (acquisition, objective, batch_optimizer,
+task_switcher for stations only).
+"""
+
+import argparse
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import optuna
+
+from acquisition import SEARCH_SPACE
+from batch_optimizer import BatchSuggester
+from objective import PreferenceModel, PerformanceModel, score_episode, stability_score
+
+
+class Coordinator:
+    def __init__(self, study=None, search_space=None, max_trials=50, lease_timeout=120.0, strategy='kriging_believer',
+                 lambda_weight=0.7):
+        """
+        Args:
+            study (optuna.Study): Shared study; a new maximizing study by default.
+            search_space (dict): Parameter name -> (low, high).
+            max_trials (int): Initial size of the preference model; it grows when trial numbers exceed it,
+                e.g. because expired leases used up trial numbers.
+            lease_timeout (float): Seconds without episodes or heartbeats before a lease expires.
+            strategy (str): Batch strategy of the suggester (see BatchSuggester.STRATEGIES).
+            lambda_weight (float): Weight of the objective score against the preference utility in told values.
+        """
+        self.study = study or optuna.create_study(direction='maximize')
+        self.suggester = BatchSuggester(self.study, search_space or SEARCH_SPACE, strategy=strategy)
+        self.pref_model = PreferenceModel(max_trials, pair=True)
+        self.lambda_weight = lambda_weight
+        self.lease_timeout = lease_timeout
+        self.leases = {}
+        self.requeued = []
+        self.episodes = {}
+        self.lock = threading.Lock()
+
+    def ask(self, station):
+        with self.lock:
+            self._expire_leases()
+            if self.requeued:
+                params = self.requeued.pop(0)
+                self.study.enqueue_trial(params)
+                trial = self.study.ask()
+                for name, (low, high) in self.suggester.search_space.items():
+                    trial.suggest_float(name, low, high)
+                self.suggester.pending[trial.number] = params
+            else:
+                trial, params = self.suggester.suggest(1)[0]
+
+            lease_id = uuid.uuid4().hex
+            self.leases[lease_id] = {
+                'trial': trial,
+                'trial_number': trial.number,
+                'station': station,
+                'params': params,
+                'expires': time.time() + self.lease_timeout,
+            }
+            self.episodes[trial.number] = []
+            print(f"Trial #{trial.number} leased to {station}: {params}")
+            return {'lease_id': lease_id, 'trial_number': trial.number, 'params': params,
+                    'lease_timeout': self.lease_timeout}
+
+    def _lease(self, lease_id):
+        lease = self.leases.get(lease_id)
+        if lease is None:
+            raise KeyError(f"Unknown or expired lease: {lease_id}")
+        return lease
+
+    def heartbeat(self, lease_id):
+        with self.lock:
+            lease = self._lease(lease_id)
+            lease['expires'] = time.time() + self.lease_timeout
+            return {'expires': lease['expires']}
+
+    def add_episode(self, lease_id, episode):
+        with self.lock:
+            lease = self._lease(lease_id)
+            lease['expires'] = time.time() + self.lease_timeout
+            self.episodes[lease['trial_number']].append(episode)
+            return {'n_episodes': len(self.episodes[lease['trial_number']])}
+
+    def _grow_preference_model(self, number):
+        """Makes room for trial `number` in the preference model, keeping the comparisons so far."""
+        if number < self.pref_model.n_candidates:
+            return
+        history = self.pref_model.comparison_history
+        self.pref_model = PreferenceModel(max(2 * self.pref_model.n_candidates, number + 1), pair=True)
+        self.pref_model.comparison_history = history
+
+    def tell(self, lease_id, value=None):
+        with self.lock:
+            # The lease is only released once the trial is told, so a failed tell can be retried
+            lease = self._lease(lease_id)
+            trial_number = lease['trial_number']
+            if value is None:
+                scores = [e['performance'] for e in self.episodes[trial_number]]
+                if not scores:
+                    raise ValueError(f"No episodes recorded for Trial #{trial_number}")
+                value = stability_score(scores)
+                lease['trial'].set_user_attr('objective_score', value)
+                if self.pref_model.utilities is not None:
+                    if trial_number >= self.pref_model.n_candidates:
+                        # Trials without comparisons get the neutral utility of the refit model
+                        self._grow_preference_model(trial_number)
+                        self.pref_model.fit(self.pref_model.comparison_history)
+                    # Same combination as tracking_objective, so the suggester models what the participants prefer
+                    value = (self.lambda_weight * value
+                             + (1 - self.lambda_weight) * self.pref_model.utilities[trial_number])
+            self.suggester.tell(trial_number, float(value))
+            del self.leases[lease_id]
+            print(f"Trial #{trial_number} from {lease['station']}: {value:.4f}")
+            return {'trial_number': trial_number, 'value': float(value)}
+
+    def add_preference(self, winner, loser):
+        winner, loser = int(winner), int(loser)
+        with self.lock:
+            # Only trials handed out to a station can be compared
+            for number in (winner, loser):
+                if number not in self.episodes:
+                    raise ValueError(f"Unknown trial: {number}")
+            if winner == loser:
+                raise ValueError("A trial cannot be compared with itself")
+
+            self._grow_preference_model(max(winner, loser))
+            self.pref_model.add_preference(winner, loser)
+            self.pref_model.fit(self.pref_model.comparison_history)
+            return {'utilities': self.pref_model.utilities.tolist()}
+
+    def _expire_leases(self):
+        now = time.time()
+        for lease_id, lease in list(self.leases.items()):
+            if lease['expires'] < now:
+                print(f"Lease for Trial #{lease['trial_number']} ({lease['station']}) timed out, requeueing")
+                self.suggester.tell(lease['trial_number'], state=optuna.trial.TrialState.FAIL)
+                self.requeued.append(lease['params'])
+                del self.leases[lease_id]
+
+    def expire_leases(self):
+        with self.lock:
+            self._expire_leases()
+
+    def status(self):
+        with self.lock:
+            complete = [t for t in self.study.trials if t.state == optuna.trial.TrialState.COMPLETE]
+            best = max(complete, key=lambda t: t.value) if complete else None
+            return {
+                'n_complete': len(complete),
+                'n_running': len(self.leases),
+                'n_requeued': len(self.requeued),
+                'leases': {k: {'trial_number': v['trial_number'], 'station': v['station']}
+                           for k, v in self.leases.items()},
+                'best_value': best.value if best else None,
+                'best_params': best.params if best else None,
+            }
+
+
+def _make_handler(coordinator):
+    class Handler(BaseHTTPRequestHandler):
+        def _reply(self, code, body):
+            data = json.dumps(body).encode('utf-8')
+            self.send_response(code)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path == '/status':
+                self._reply(200, coordinator.status())
+            else:
+                self._reply(404, {'error': f"Unknown endpoint {self.path}"})
+
+        def do_POST(self):
+            def field(name):
+                if name not in body:
+                    raise ValueError(f"Missing field: {name}")
+                return body[name]
+
+            routes = {
+                '/ask': lambda: coordinator.ask(body.get('station', self.client_address[0])),
+                '/heartbeat': lambda: coordinator.heartbeat(field('lease_id')),
+                '/episode': lambda: coordinator.add_episode(field('lease_id'), field('episode')),
+                '/tell': lambda: coordinator.tell(field('lease_id'), body.get('value')),
+                '/preference': lambda: coordinator.add_preference(field('winner'), field('loser')),
+            }
+            if self.path not in routes:
+                self._reply(404, {'error': f"Unknown endpoint {self.path}"})
+                return
+            try:
+                length = int(self.headers.get('Content-Length', 0))
+                body = json.loads(self.rfile.read(length) or b'{}')
+                if not isinstance(body, dict):
+                    raise ValueError("Body must be a JSON object")
+                self._reply(200, routes[self.path]())
+            except KeyError as e:
+                self._reply(410, {'error': str(e)})
+            except (ValueError, TypeError) as e:
+                self._reply(400, {'error': str(e)})
+            except Exception as e:
+                self._reply(500, {'error': f"{type(e).__name__}: {e}"})
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def serve(coordinator, host='localhost', port=8765, reap_interval=5.0):
+    server = ThreadingHTTPServer((host, port), _make_handler(coordinator))
+
+    def reap():
+        while True:
+            time.sleep(reap_interval)
+            coordinator.expire_leases()
+
+    threading.Thread(target=reap, daemon=True).start()
+    print(f"Coordinator listening on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+class StationClient:
+    def __init__(self, url='http://localhost:8765', station='station', timeout=10.0):
+        self.url = url.rstrip('/')
+        self.station = station
+        self.timeout = timeout
+
+    def _post(self, path, body):
+        request = urllib.request.Request(
+            self.url + path,
+            data=json.dumps(body).encode('utf-8'),
+            headers={'Content-Type': 'application/json'},
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            return json.loads(response.read())
+
+    def ask(self):
+        return self._post('/ask', {'station': self.station})
+
+    def heartbeat(self, lease_id):
+        return self._post('/heartbeat', {'lease_id': lease_id})
+
+    def episode(self, lease_id, episode):
+        return self._post('/episode', {'lease_id': lease_id, 'episode': episode})
+
+    def tell(self, lease_id, value=None):
+        return self._post('/tell', {'lease_id': lease_id, 'value': value})
+
+    def prefer(self, winner, loser):
+        return self._post('/preference', {'winner': winner, 'loser': loser})
+
+    def status(self):
+        with urllib.request.urlopen(self.url + '/status', timeout=self.timeout) as response:
+            return json.loads(response.read())
+
+
+def run_station(url, station, n_trials=10, n_episodes=20, task_type=None):
+    # Stations need pygame/pyglet and a joystick, the coordinator does not
+    from task_switcher import TaskSwitcher, TaskType
+
+    task_type = task_type or TaskType.AIMING
+    client = StationClient(url, station)
+    switcher = TaskSwitcher()
+
+    perf_model = PerformanceModel()
+
+    for _ in range(n_trials):
+        lease = client.ask()
+        print(f"\nTrial #{lease['trial_number']}: {lease['params']}")
+
+        try:
+            for i in range(n_episodes):
+                print(f"\nSample {i+1}/{n_episodes}")
+                params = {"duration": 15, "sampling_rate": 20, **lease['params']}
+                start = time.time()
+                results = switcher.run_task(task_type, params)
+
+                episode = score_episode(results, perf_model)
+                episode['wall_time'] = time.time() - start
+                client.episode(lease['lease_id'], episode)
+                print(f"Sample Score: {episode['performance']:.4f}")
+
+            print(client.tell(lease['lease_id']))
+        except urllib.error.HTTPError as e:
+            if e.code != 410:
+                raise
+            # The lease expired, e.g. during a long break; the coordinator has requeued its parameters
+            print(f"Lease for Trial #{lease['trial_number']} expired, asking for a new trial")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shared optimization across experiment stations.")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    serve_parser = sub.add_parser('serve')
+    serve_parser.add_argument('--host', default='localhost')
+    serve_parser.add_argument('--port', type=int, default=8765)
+    serve_parser.add_argument('--lease-timeout', type=float, default=120.0)
+    serve_parser.add_argument('--max-trials', type=int, default=50)
+
+    station_parser = sub.add_parser('station')
+    station_parser.add_argument('--url', default='http://localhost:8765')
+    station_parser.add_argument('--station', default='station')
+    station_parser.add_argument('--trials', type=int, default=10)
+    station_parser.add_argument('--episodes', type=int, default=20)
+
+    args = parser.parse_args()
+    if args.command == 'serve':
+        serve(Coordinator(max_trials=args.max_trials, lease_timeout=args.lease_timeout), args.host, args.port)
+    else:
+        run_station(args.url, args.station, args.trials, args.episodes)
+
+
+if __name__ == "__main__":
+    main()
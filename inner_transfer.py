@@ -0,0 +1,164 @@
+"""
+inner_transfer.py
+
+Warm starts for the inner (virtual-parameter) studies of joint_optimizer.py.
+Neighbouring physical configurations have similar inner optima, so instead of starting every inner study from
+scratch, each outer trial reuses the inner results of the earlier outer trials, weighted by how similar their
+physical parameters are:
+    - warm_start_configs: the best inner configurations of the most similar earlier outer trials, to be enqueued
+      as the first inner trials.
+    - TransferSampler: Optuna sampler whose surrogate is a GP fitted to all earlier inner results (less similar
+      physical configurations count as noisier observations) plus a residual GP on the current inner study.
+
+Main components:
+- INNER_SPACE / PHYSICAL_SPACE: Search spaces of the inner and outer studies.
+- physical_similarity: Similarity in [0, 1] between two physical configurations.
+- transferred_observations: Earlier inner results with their similarity weights.
+- warm_start_configs: Inner configurations to enqueue.
+- TransferSampler: Sampler with the transferred surrogate.
+
+Dependencies: numpy, scikit-learn, optuna, custom modules (acquisition).
+"""
+
+import numpy as np
+import optuna
+from optuna.distributions import FloatDistribution
+from optuna.samplers import BaseSampler, RandomSampler
+from sklearn.gaussian_process import GaussianProcessRegressor
+from sklearn.gaussian_process.kernels import ConstantKernel, Matern
+
+from acquisition import SEARCH_SPACE, expected_improvement, sobol_candidates
+
+INNER_SPACE = {
+    'Damping': (0.0, 1.0),
+    'Deadzone': (0.0, 1.0),
+    **SEARCH_SPACE,
+}
+
+PHYSICAL_SPACE = {
+    'rocker_length': (5.0, 50.0),
+    'cap_size': (6.0, 57.0),
+}
+
+
+def physical_similarity(params_a, params_b, length_scale=0.25, cap_type_penalty=0.5):
+    """
+    Squared-exponential similarity over the normalized continuous physical parameters,
+    multiplied by cap_type_penalty when the cap types differ.
+    """
+    d2 = sum(((params_a[name] - params_b[name]) / (high - low)) ** 2
+             for name, (low, high) in PHYSICAL_SPACE.items())
+    similarity = np.exp(-0.5 * d2 / length_scale ** 2)
+    if params_a.get('cap_type') != params_b.get('cap_type'):
+        similarity *= cap_type_penalty
+    return float(similarity)
+
+
+def transferred_observations(outer_study, physical_params, exclude=None):
+    """
+    (inner params, value, weight) for every inner result stored on the completed outer trials
+    (user attribute 'inner_results'), weighted by the physical similarity of their outer trial.
+    """
+    observations = []
+    for outer in outer_study.get_trials(deepcopy=False, states=(optuna.trial.TrialState.COMPLETE,)):
+        if outer.number == exclude or 'inner_results' not in outer.user_attrs:
+            continue
+        weight = physical_similarity(physical_params, outer.params)
+        for result in outer.user_attrs['inner_results']:
+            observations.append((result['params'], result['value'], weight))
+    return observations
+
+
+def warm_start_configs(outer_study, physical_params, n_configs=3, min_similarity=0.3, exclude=None):
+    """Best inner configurations of the n_configs most similar earlier outer trials."""
+    candidates = []
+    for outer in outer_study.get_trials(deepcopy=False, states=(optuna.trial.TrialState.COMPLETE,)):
+        results = outer.user_attrs.get('inner_results')
+        if outer.number == exclude or not results:
+            continue
+        weight = physical_similarity(physical_params, outer.params)
+        if weight >= min_similarity:
+            best = max(results, key=lambda r: r['value'])
+            candidates.append((weight, best['params']))
+
+    candidates.sort(key=lambda c: c[0], reverse=True)
+    configs = []
+    for _, params in candidates:
+        if params not in configs:
+            configs.append(params)
+    return configs[:n_configs]
+
+
+class TransferSampler(BaseSampler):
+    def __init__(self, prior_observations=(), search_space=None, base_noise=1e-2, n_startup_trials=3,
+                 n_candidates=1024, seed=None):
+        """
+        Args:
+            prior_observations (list): (params, value, weight) from transferred_observations().
+            search_space (dict): Parameter name -> (low, high); defaults to INNER_SPACE.
+            base_noise (float): Noise of a transferred observation with weight 1; an observation with weight w
+                gets base_noise / w.
+            n_startup_trials (int): Own trials needed before proposing without any transferred observations.
+            n_candidates (int): Size of the Sobol candidate set scored per proposal.
+            seed (int): Seed for the candidate sets and the random fallback.
+        """
+        self.search_space = dict(search_space or INNER_SPACE)
+        self.names = list(self.search_space)
+        self.bounds = np.array([self.search_space[name] for name in self.names], dtype=float)
+        self.base_noise = base_noise
+        self.n_startup_trials = n_startup_trials
+        self.n_candidates = n_candidates
+        self.rng = np.random.default_rng(seed)
+        self._random_sampler = RandomSampler(seed=seed)
+
+        self.prior = None
+        usable = [(p, v, w) for p, v, w in prior_observations if w > 1e-3]
+        if usable:
+            X = np.array([self._to_unit(p) for p, _, _ in usable])
+            y = np.array([v for _, v, _ in usable], dtype=float)
+            alpha = self.base_noise / np.array([w for _, _, w in usable])
+            self.prior = self._gp(alpha).fit(X, y)
+
+    def _gp(self, alpha):
+        kernel = ConstantKernel(1.0) * Matern(length_scale=np.full(len(self.names), 0.3), nu=2.5)
+        return GaussianProcessRegressor(kernel=kernel, alpha=alpha, normalize_y=True,
+                                        n_restarts_optimizer=2, random_state=42)
+
+    def _to_unit(self, params):
+        values = np.array([params[name] for name in self.names], dtype=float)
+        return (values - self.bounds[:, 0]) / (self.bounds[:, 1] - self.bounds[:, 0])
+
+    def _prior_mean(self, X):
+        return self.prior.predict(X) if self.prior is not None else np.zeros(len(X))
+
+    def predict(self, X, X_obs, y_obs):
+        """Posterior (mean, std): transferred prior mean plus a residual GP on the current study's results."""
+        if len(y_obs) >= 2:
+            residual = self._gp(1e-4).fit(X_obs, y_obs - self._prior_mean(X_obs))
+            mean, std = residual.predict(X, return_std=True)
+            return self._prior_mean(X) + mean, std
+        return self.prior.predict(X, return_std=True)
+
+    def infer_relative_search_space(self, study, trial):
+        return {name: FloatDistribution(low, high) for name, (low, high) in self.search_space.items()}
+
+    def sample_relative(self, study, trial, search_space):
+        trials = [t for t in study.get_trials(deepcopy=False, states=(optuna.trial.TrialState.COMPLETE,))
+                  if all(name in t.params for name in self.names)]
+        if self.prior is None and len(trials) < self.n_startup_trials:
+            return {}
+
+        X_obs = np.array([self._to_unit(t.params) for t in trials]).reshape(-1, len(self.names))
+        y_obs = np.array([t.value for t in trials], dtype=float)
+
+        candidates = sobol_candidates(len(self.names), self.n_candidates, self.rng)
+        mu, sigma = self.predict(candidates, X_obs, y_obs)
+        best = np.max(y_obs) if len(y_obs) else np.max(mu)
+
+        ei = expected_improvement(mu, sigma, best)
+        x = candidates[np.argmax(ei)]
+        values = self.bounds[:, 0] + x * (self.bounds[:, 1] - self.bounds[:, 0])
+        return {name: float(v) for name, v in zip(self.names, values) if name in search_space}
+
+    def sample_independent(self, study, trial, param_name, param_distribution):
+        return self._random_sampler.sample_independent(study, trial, param_name, param_distribution)
@@ -13,23 +13,33 @@ the code needs to be modified to accommodate the new multiple environments (see
 
 Main components:
 - tracking_objective: Objective function for performance and preference parameter optimization.
-- outer_optimization: Two-level optimization for physical and virtual parameters. ## NOTE: is never called?
+- outer_optimization: Two-level optimization for physical and virtual parameters; the inner study is warm-started
+  from the inner results of earlier outer trials with similar physical parameters (see inner_transfer.py), or
+  searched with a trust-region sampler that scales to more virtual parameters (see turbo_sampler.py).
 - inner_optimization: Optimization for virtual parameters only.
+- run_joint_optimization: Outer physical loop over outer_optimization, persisted and resumable when given a study_name;
+  optionally plans batches of physical configurations that need the fewest hardware swaps (see switch_scheduler.py).
 - run_tracking_optimization: Main entry point for running the optimization workflow.
 - run_verification_trial: Utility for preference verification between trials.
 
-Dependencies: optuna, pygame, numpy, pyglet, custom modules (objective, simple_tracking_task, selectUI, task_switcher).
+Dependencies: optuna, pygame, numpy, pyglet, custom modules (objective, simple_tracking_task, selectUI, task_switcher,
+session_store, inner_transfer, switch_scheduler, turbo_sampler, acquisition).
 """
 
 import optuna
 import pyglet
-from objective import PerformanceModel, error_calc, PreferenceModel
+from objective import PerformanceModel, error_calc, PreferenceModel, score_episode, summarize_episodes
 from simple_tracking_task import TrackingTask
 import time
 import pygame
 import numpy as np
 from selectUI import get_user_preference
 from task_switcher import TaskSwitcher, TaskType
+from session_store import SessionStore
+from inner_transfer import TransferSampler, transferred_observations, warm_start_configs
+from switch_scheduler import SwitchScheduler
+from turbo_sampler import TurboSampler
+from acquisition import SEARCH_SPACE
 
 pygame.init()
 pygame.joystick.init()
@@ -45,15 +55,15 @@ else:
     pygame.quit()
 
 
-def tracking_objective(trial, pref_model, trial_history, task_type=TaskType.AIMING):
-    global detailed_scores  
+def tracking_objective(trial, pref_model, trial_history, task_type=TaskType.AIMING,
+                       detailed_scores=detailed_scores):
 
     if not joystick:
         print("No Joystick Detected")
         return 0.0
 
-    speed_factor = trial.suggest_float('speed_factor', 1.0, 10.0)
-    friction = trial.suggest_float('friction', 0.93, 0.9999)
+    speed_factor = trial.suggest_float('speed_factor', *SEARCH_SPACE['speed_factor'])
+    friction = trial.suggest_float('friction', *SEARCH_SPACE['friction'])
 
     print("\n" + "="*50)
     print("Trial #{}:".format(trial.number))
@@ -61,8 +71,10 @@ def tracking_objective(trial, pref_model, trial_history, task_type=TaskType.AIMI
     print("Friction: {:.3f}".format(friction))
     print("="*50)
 
+    episodes = []
     scores = []
     switcher = TaskSwitcher()
+    perf_model = PerformanceModel()
 
     for i in range(20):
         print(f"\nSample {i+1}/20")
@@ -75,12 +87,9 @@ def tracking_objective(trial, pref_model, trial_history, task_type=TaskType.AIMI
 
         results = switcher.run_task(task_type, params)  # Use the task_type parameter here
 
-        error = error_calc(results["distances"])
-        moving_time = results['sampling_times'][-1]
-        jitter = results["jitter"]
-
-        perf_model = PerformanceModel()
-        score = perf_model.compute_performance(error, moving_time, jitter)
+        episode = score_episode(results, perf_model)
+        episodes.append(episode)
+        score = episode['performance']
         scores.append(score)
 
         print(f"Sample Score: {score:.4f}")
@@ -90,14 +99,7 @@ def tracking_objective(trial, pref_model, trial_history, task_type=TaskType.AIMI
             print(f"CurrentAvg: {current_avg}")
             if current_avg < 0.2:
                 print(f"\nEarly stopping: Current average ({current_avg:.4f}) is too low")
-                detailed_scores[trial.number] = {
-                    'accuracy_scores': [],
-                    'time_scores': [],
-                    'performance_scores': scores,
-                    'avg_accuracy': 0.0,
-                    'avg_time': 0.0,
-                    'avg_performance': 0.0
-                }
+                detailed_scores[trial.number] = summarize_episodes(episodes)
                 return 0.0
 
             previous_scores = [t.value for t in trial.study.trials if t.value is not None]
@@ -107,16 +109,11 @@ def tracking_objective(trial, pref_model, trial_history, task_type=TaskType.AIMI
 
                 if current_avg < (prev_mean - prev_std) or current_avg < 0.2:
                     print(f"\nEarly stopping: Current avg ({current_avg:.4f}) is significantly lower than historical performance (mean: {prev_mean:.4f}, std: {prev_std:.4f})")
-                    detailed_scores[trial.number] = {
-                        'accuracy_scores': [],
-                        'time_scores': [],
-                        'performance_scores': scores,
-                        'avg_accuracy': 0.0,
-                        'avg_time': 0.0,
-                        'avg_performance': 0.0
-                    }
+                    detailed_scores[trial.number] = summarize_episodes(episodes)
                     return 0.0
 
+    detailed_scores[trial.number] = summarize_episodes(episodes, warmup=10)
+
     final_scores = scores[10:]
     final_score = sum(final_scores) / 10
     std_dev = np.std(final_scores)
@@ -197,7 +194,8 @@ def run_verification_trial(params, task_type):
     return switcher.run_task(task_type, params)
 
 
-def outer_optimization(trial, inner_trial: int = 10, task_type=TaskType.AIMING):
+def outer_optimization(trial, inner_trial: int = 10, task_type=TaskType.AIMING, store=None,
+                       warm_inner_trial=None, n_warm_start=3, inner_sampler='transfer'):
     if not joystick:
         print("No Joystick Detected")
         exit()
@@ -214,8 +212,38 @@ def outer_optimization(trial, inner_trial: int = 10, task_type=TaskType.AIMING):
     print("Rocker Length: {:.2f}mm".format(rocker_length))
     print("Cap size: {:.2f}mm".format(cap_size))
 
-    inner_study = optuna.create_study(direction='maximize')
-    inner_study.optimize(lambda t: inner_optimization(t, task_type), n_trials=inner_trial)
+    # Inner results of earlier outer trials, weighted by physical similarity, seed and guide the inner study
+    physical_params = {'cap_type': cap_type, 'rocker_length': rocker_length, 'cap_size': cap_size}
+    if inner_sampler == 'turbo':
+        # Local GPs in a trust region scale to the full virtual parameter space; the seeds start its first run
+        sampler = TurboSampler()
+    else:
+        sampler = TransferSampler(transferred_observations(trial.study, physical_params, exclude=trial.number))
+    seeds = warm_start_configs(trial.study, physical_params, n_warm_start, exclude=trial.number)
+    if seeds and warm_inner_trial is not None:
+        inner_trial = warm_inner_trial
+        print(f"Warm start from {len(seeds)} similar physical configurations, {inner_trial} inner trials")
+
+    if store is not None:
+        # A resumed outer trial keeps the inner study (and finished inner trials) of its interrupted run
+        inner_name = trial.user_attrs.get('inner_study', f"{store.study_name}-inner-{trial.number}")
+        trial.set_user_attr('inner_study', inner_name)
+        inner_study = store.create_study(name=inner_name, sampler=sampler)
+        for stale in inner_study.get_trials(deepcopy=False, states=(optuna.trial.TrialState.RUNNING,)):
+            inner_study.tell(stale.number, state=optuna.trial.TrialState.FAIL)
+        n_done = len(inner_study.get_trials(deepcopy=False, states=(optuna.trial.TrialState.COMPLETE,)))
+    else:
+        inner_study = optuna.create_study(direction='maximize', sampler=sampler)
+        n_done = 0
+    if not inner_study.trials:
+        for params in seeds:
+            inner_study.enqueue_trial(params)
+    if n_done < inner_trial:
+        inner_study.optimize(lambda t: inner_optimization(t, task_type), n_trials=inner_trial - n_done)
+    trial.set_user_attr('inner_results', [
+        {'params': t.params, 'value': t.value}
+        for t in inner_study.get_trials(deepcopy=False, states=(optuna.trial.TrialState.COMPLETE,))
+    ])
     inner_para_list = inner_study.best_params.items()
     inner_para = dict(inner_para_list)
     damping = inner_para["Damping"]
@@ -259,8 +287,8 @@ def inner_optimization(trial, task_type=TaskType.AIMING):
         exit()
     damping = trial.suggest_float('Damping', 0.0, 1.0)
     deadzone = trial.suggest_float('Deadzone', 0.0, 1.0)
-    speed_factor = trial.suggest_float('speed_factor', 1.0, 10.0)
-    friction = trial.suggest_float('friction', 0.93, 0.9999)
+    speed_factor = trial.suggest_float('speed_factor', *SEARCH_SPACE['speed_factor'])
+    friction = trial.suggest_float('friction', *SEARCH_SPACE['friction'])
 
     print("\n" + "=" * 50)
     print("Trial #{}:".format(trial.number))
@@ -297,6 +325,66 @@ def inner_optimization(trial, task_type=TaskType.AIMING):
     return score
 
 
+def run_joint_optimization(n_trials=10, inner_trial=10, task_type=TaskType.AIMING, study_name=None, storage_dir='sessions',
+                           warm_inner_trial=None, batch_size=None, episode_s=20.0, inner_sampler='transfer'):
+    """
+    Outer physical-parameter loop; each outer trial runs a full inner virtual-parameter study.
+
+    Once an earlier outer trial has similar physical parameters, the inner study starts from the best inner
+    configurations found there and only runs warm_inner_trial trials (default: half of inner_trial, at least 3).
+
+    With a batch_size, physical configurations are planned batch_size at a time by expected improvement per
+    second of switch and evaluation time, run in the order with the fewest keycap/rocker swaps, and the
+    expected wall-time of each batch is printed; episode_s is the time one inner trial takes.
+
+    inner_sampler selects the sampler of the inner studies: 'transfer' (a GP carrying over the inner results of
+    similar physical configurations) or 'turbo' (trust-region BO, for 6-12 virtual parameters).
+
+    With a study_name, the outer study and every inner study are stored under storage_dir/study_name, so
+    calling this again with the same name resumes: finished outer and inner trials are kept, and an
+    interrupted outer trial continues with the same physical parameters and its inner study.
+    """
+    if study_name is not None:
+        store = SessionStore(study_name, storage_dir)
+        study = store.create_study()
+    else:
+        store = None
+        study = optuna.create_study(direction='maximize')
+
+    for stale in study.get_trials(deepcopy=False, states=(optuna.trial.TrialState.RUNNING,)):
+        print(f"Resuming interrupted outer Trial #{stale.number}")
+        study.enqueue_trial(stale.params, user_attrs=dict(stale.user_attrs))
+        study.tell(stale.number, state=optuna.trial.TrialState.FAIL)
+
+    if warm_inner_trial is None:
+        warm_inner_trial = max(3, inner_trial // 2)
+
+    scheduler = None
+    if batch_size:
+        scheduler = SwitchScheduler(study, evaluation_s=inner_trial * episode_s)
+
+    n_done = len(study.get_trials(deepcopy=False, states=(optuna.trial.TrialState.COMPLETE,)))
+    for i in range(n_trials - n_done):
+        waiting = study.get_trials(deepcopy=False, states=(optuna.trial.TrialState.WAITING,))
+        if scheduler is not None and not waiting:
+            finished = study.get_trials(deepcopy=False, states=(optuna.trial.TrialState.COMPLETE,))
+            current = finished[-1].params if finished else None
+            schedule, wall_time = scheduler.plan(current, min(batch_size, n_trials - n_done - i))
+            scheduler.report(schedule, wall_time)
+            for step in schedule:
+                study.enqueue_trial(step['params'])
+        trial = study.ask()
+        value = outer_optimization(trial, inner_trial, task_type, store, warm_inner_trial,
+                                   inner_sampler=inner_sampler)
+        study.tell(trial, value)
+
+    print("\n" + "=" * 50)
+    print(f"Best Physical Parameters: {study.best_params}")
+    print(f"Best Score: {study.best_value:.4f}")
+    print("=" * 50)
+    return study
+
+
 def run_tracking_optimization(pair_mode=False, similar_comparison=False, physical_comparison=False, task_type=TaskType.AIMING):
     n_trials = 10
     n_initial_samples = 5
@@ -310,8 +398,8 @@ def run_tracking_optimization(pair_mode=False, similar_comparison=False, physica
     print("\n=== Initializing ===")
     initial_params = []
     for _ in range(n_initial_samples):
-        speed_factor = np.random.uniform(1.0, 10.0)
-        friction = np.random.uniform(0.93, 0.9999)
+        speed_factor = np.random.uniform(*SEARCH_SPACE['speed_factor'])
+        friction = np.random.uniform(*SEARCH_SPACE['friction'])
         initial_params.append({
             'speed_factor': speed_factor,
             'friction': friction
@@ -328,11 +416,9 @@ def run_tracking_optimization(pair_mode=False, similar_comparison=False, physica
 
         trial_history.append(params)
 
-        sample_scores = []
-        accuracy_scores = []
-        time_scores = []
-        performance_scores = []
+        episodes = []
         switcher = TaskSwitcher()
+        perf_model = PerformanceModel()
         
         for j in range(n_repeats):
             print(f"\nRe:  #{j+1}/{n_repeats}")
@@ -345,35 +431,16 @@ def run_tracking_optimization(pair_mode=False, similar_comparison=False, physica
             
             results = switcher.run_task(task_type, task_params)
             
-            error = error_calc(results["distances"])
-            moving_time = results['sampling_times'][-1]
-            jitter = results["jitter"]
+            episode = score_episode(results, perf_model)
+            episodes.append(episode)
             
-            perf_model = PerformanceModel()
-            accuracy_score = perf_model.compute_accuracy(error)
-            time_score = perf_model.compute_time(moving_time)
-            performance_score = perf_model.compute_performance(error, moving_time, jitter)
-            
-            accuracy_scores.append(accuracy_score)
-            time_scores.append(time_score)
-            performance_scores.append(performance_score)
-            sample_scores.append(performance_score)
-            
-            print(f"Score{performance_score:.4f}")
+            print(f"Score{episode['performance']:.4f}")
 
-        avg_score = np.mean(sample_scores)
+        detailed_scores[trial.number] = summarize_episodes(episodes)
+        avg_score = detailed_scores[trial.number]['avg_performance']
         print(f"\nAVG SCORE: {avg_score:.4f}")
         study.tell(trial, avg_score)
 
-        detailed_scores[trial.number] = {
-            'accuracy_scores': accuracy_scores,
-            'time_scores': time_scores,
-            'performance_scores': performance_scores,
-            'avg_accuracy': np.mean(accuracy_scores),
-            'avg_time': np.mean(time_scores),
-            'avg_performance': avg_score
-        }
-
     print("\n=== INITIALIZING RESULTS ===")
     for i, trial in enumerate(study.trials[:n_initial_samples]):
         print(f"SAMPLE #{i+1}: speed_factor={trial.params['speed_factor']:.2f}, "
@@ -382,8 +449,8 @@ def run_tracking_optimization(pair_mode=False, similar_comparison=False, physica
     for i in range(n_trials - n_initial_samples):
         trial = study.ask()
         
-        speed_factor = trial.suggest_float('speed_factor', 1.0, 10.0)
-        friction = trial.suggest_float('friction', 0.93, 0.9999)
+        speed_factor = trial.suggest_float('speed_factor', *SEARCH_SPACE['speed_factor'])
+        friction = trial.suggest_float('friction', *SEARCH_SPACE['friction'])
         
         params = {
             'speed_factor': speed_factor,
@@ -391,41 +458,9 @@ def run_tracking_optimization(pair_mode=False, similar_comparison=False, physica
         }
         trial_history.append(params)
         
-        value = tracking_objective(trial, pref_model, trial_history, task_type)
+        value = tracking_objective(trial, pref_model, trial_history, task_type, detailed_scores=detailed_scores)
         study.tell(trial, value)
 
-        if value == 0.0:
-            continue
-
-        scores = []
-        accuracy_scores = []
-        time_scores = []
-        performance_scores = []
-        
-        for _ in range(20):
-            results = switcher.run_task(task_type, params)
-            error = error_calc(results["distances"])
-            moving_time = results['sampling_times'][-1]
-            jitter = results["jitter"]
-            
-            perf_model = PerformanceModel()
-            accuracy_score = perf_model.compute_accuracy(error)
-            time_score = perf_model.compute_time(moving_time)
-            performance_score = perf_model.compute_performance(error, moving_time, jitter)
-            
-            accuracy_scores.append(accuracy_score)
-            time_scores.append(time_score)
-            performance_scores.append(performance_score)
-        
-        detailed_scores[trial.number] = {
-            'accuracy_scores': accuracy_scores,
-            'time_scores': time_scores,
-            'performance_scores': performance_scores,
-            'avg_accuracy': np.mean(accuracy_scores),
-            'avg_time': np.mean(time_scores),
-            'avg_performance': np.mean(performance_scores[10:])
-        }
-
     best_params = study.best_params
     best_score = study.best_value
 
@@ -0,0 +1,142 @@
+"""
+lambda_sweep.py
+
+NOTE: Not used in the main process
+
+Sensitivity analysis of the performance/preference trade-off weight (lambda_weight) over saved studies.
+Sessions are read from the results store (see results_store.py), or older saved optimization_<timestamp>.txt
+files are parsed; one JointGPModel is fitted per study on
+(parameters -> performance score, preference score), and joint scores with their variances are computed
+for a whole array of lambda values in one broadcast (objective.joint_score_sweep), without refitting.
+For stored sessions the noise variance of every trial's mean score is passed to the JointGPModel.
+
+Main components:
+- load_study_file: Parses a saved optimization_<timestamp>.txt file into per-trial records.
+- load_study_store: The same records for a session in the results store.
+- sweep_study: Fits the joint surrogate for one study and sweeps lambda.
+- main: Command line entry point.
+
+Usage:
+    python lambda_sweep.py optimization_20250301-101500.txt --start 0 --stop 1 --num 11
+    python lambda_sweep.py --store results_store
+
+Dependencies: argparse, glob, os, numpy, optuna, custom modules (objective, results_store).
+"""
+
+import argparse
+import glob
+import os
+
+import numpy as np
+import optuna
+
+from objective import JointGPModel, joint_score_sweep
+from results_store import ResultsStore
+
+
+def load_study_file(file_path):
+    trials = []
+    current = None
+    section = None
+
+    with open(file_path, 'r') as f:
+        for raw_line in f:
+            line = raw_line.strip()
+            if line.startswith("Trial #"):
+                current = {'number': int(line[len("Trial #"):].rstrip(':')), 'params': {}, 'scores': {}}
+                trials.append(current)
+                section = None
+            elif line == "Parameters:":
+                section = 'params'
+            elif line == "Scores:":
+                section = 'scores'
+            elif line.startswith("Preference Data:"):
+                current = None
+            elif current is not None and section is not None and ': ' in line:
+                name, value = line.split(': ', 1)
+                try:
+                    current[section][name] = float(value)
+                except ValueError:
+                    continue
+    return trials
+
+
+def load_study_store(session, directory='results_store'):
+    """Per-trial records of a stored session, in the load_study_file format."""
+    table = ResultsStore(directory).read('trials', sessions=[session]).to_pylist()
+    trials = []
+    for row in table:
+        scores = {'Performance Score': row['avg_performance'], 'Preference Score': row['preference'],
+                  'Final Score': row['value']}
+        trials.append({
+            'number': row['trial'],
+            'params': {'speed_factor': row['speed_factor'], 'friction': row['friction']},
+            'scores': {name: value for name, value in scores.items() if value is not None},
+            'noise_var': row['noise_var'],
+        })
+    return trials
+
+
+def sweep_study(trials, lambda_weights, gp_trials=100):
+    """
+    Returns (trial_numbers, scores, variances) with scores/variances of shape (n_lambdas, n_trials),
+    or None if the study has no preference scores.
+    """
+    trials = [t for t in trials if 'Preference Score' in t['scores'] and 'Performance Score' in t['scores']]
+    if len(trials) < 2:
+        return None
+
+    param_names = sorted(trials[0]['params'])
+    X = np.array([[t['params'][name] for name in param_names] for t in trials])
+    perf = np.array([t['scores']['Performance Score'] for t in trials])
+    pref = np.array([t['scores']['Preference Score'] for t in trials])
+    # Stored sessions know how noisy each trial's mean score is; older text files do not
+    noise_var = [t.get('noise_var') for t in trials]
+    noise_var = None if None in noise_var else noise_var
+
+    gp_joint = JointGPModel(X, (perf, pref), noise_var=noise_var)
+    gp_joint.train(n_trials=gp_trials)
+    means, stds = gp_joint.predict(X)
+
+    scores, variances = joint_score_sweep((means[:, 0], stds[:, 0]), (means[:, 1], stds[:, 1]), lambda_weights)
+    return [t['number'] for t in trials], scores, variances
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-score saved studies over a range of lambda_weight values.")
+    parser.add_argument('files', nargs='*', help="Saved study files (default: optimization_*.txt in cwd)")
+    parser.add_argument('--store', default='results_store', help="Results store directory")
+    parser.add_argument('--start', type=float, default=0.0)
+    parser.add_argument('--stop', type=float, default=1.0)
+    parser.add_argument('--num', type=int, default=11)
+    parser.add_argument('--gp-trials', type=int, default=100, help="Hyperparameter search trials for the surrogate")
+    args = parser.parse_args()
+
+    optuna.logging.set_verbosity(optuna.logging.WARNING)
+    studies = [(path, lambda path=path: load_study_file(path))
+               for path in args.files or sorted(glob.glob('optimization_*.txt'))]
+    if not args.files and os.path.isdir(args.store):
+        studies += [(session, lambda session=session: load_study_store(session, args.store))
+                    for session in ResultsStore(args.store).sessions()]
+    if not studies:
+        print("No result files found!")
+        return
+
+    lambda_weights = np.linspace(args.start, args.stop, args.num)
+
+    for name, load in studies:
+        swept = sweep_study(load(), lambda_weights, args.gp_trials)
+        print(f"\n{name}")
+        if swept is None:
+            print("  No preference scores, skipped")
+            continue
+
+        trial_numbers, scores, variances = swept
+        best = np.argmax(scores, axis=1)
+        for row, (lam, idx) in enumerate(zip(lambda_weights, best)):
+            print(f"  lambda={lam:.2f}: best Trial #{trial_numbers[idx]} "
+                  f"score={scores[row, idx]:.4f} (std {np.sqrt(variances[row, idx]):.4f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+"""
+multifidelity.py
+
+Multi-fidelity optimization of the virtual parameters (speed_factor, friction), with the episode duration as the
+fidelity. Every trial climbs a ladder of rungs: a couple of short episodes first, then longer ones, and only at
+the last rung the full 15 s episodes that tracking_op.py uses for every candidate. After each rung the mean
+episode score is reported to Optuna at the participant-seconds spent on the trial so far, and a HyperbandPruner
+stops candidates that are behind the others at that rung, so most candidates cost only a few short episodes.
+
+Two ways to choose candidates:
+    - 'bohb': TPESampler + HyperbandPruner (BOHB); TPE also learns from pruned trials through their last rung.
+    - 'mfgp': FidelityGP, a GP over (speed_factor, friction, fidelity) fitted to the rung means of all trials,
+      proposes the candidate with the highest expected improvement at full fidelity.
+
+Main components:
+- RUNGS: (duration in seconds, episodes) per rung.
+- FidelityGP: Fidelity-aware surrogate that predicts full-duration scores from short-episode results.
+- run_rungs: Objective that runs the rungs of one trial with pruning.
+- run_multifidelity_optimization: Main entry point.
+
+Dependencies: numpy, scikit-learn, optuna, custom modules (acquisition, objective, task_switcher).
+"""
+
+import numpy as np
+import optuna
+from sklearn.gaussian_process import GaussianProcessRegressor
+from sklearn.gaussian_process.kernels import ConstantKernel, Matern, WhiteKernel
+
+from acquisition import SEARCH_SPACE, expected_improvement, sobol_candidates
+from objective import PerformanceModel, score_episode, stability_score
+from task_switcher import TaskSwitcher, TaskType
+
+RUNGS = [(5, 2), (10, 2), (15, 5)]
+
+
+def rung_steps(rungs=RUNGS):
+    """Cumulative participant-seconds at the end of each rung; these are the steps reported to the pruner."""
+    return [int(step) for step in np.cumsum([duration * n_episodes for duration, n_episodes in rungs])]
+
+
+class FidelityGP:
+    def __init__(self, search_space=None, rungs=RUNGS, n_candidates=1024, seed=None):
+        """
+        Args:
+            search_space (dict): Parameter name -> (low, high).
+            rungs (list): (duration, episodes) per rung; the last duration is full fidelity.
+            n_candidates (int): Size of the Sobol candidate set scored by propose().
+            seed (int): Seed for the candidate sets.
+        """
+        self.search_space = dict(search_space or SEARCH_SPACE)
+        self.names = list(self.search_space)
+        self.bounds = np.array([self.search_space[name] for name in self.names], dtype=float)
+        self.rungs = rungs
+        self.steps = rung_steps(rungs)
+        self.full_duration = rungs[-1][0]
+        self.n_candidates = n_candidates
+        self.rng = np.random.default_rng(seed)
+        self.gp = None
+        self.X = None
+
+    def _inputs(self, X, duration):
+        X = (np.atleast_2d(X) - self.bounds[:, 0]) / (self.bounds[:, 1] - self.bounds[:, 0])
+        fidelity = np.broadcast_to(np.asarray(duration, dtype=float) / self.full_duration, (len(X),))
+        return np.column_stack([X, fidelity])
+
+    def observations(self, study):
+        """(params, duration, rung mean) for every rung any trial finished, pruned trials included."""
+        X, durations, y = [], [], []
+        for trial in study.get_trials(deepcopy=False):
+            if not all(name in trial.params for name in self.names):
+                continue
+            for step, (duration, _) in zip(self.steps, self.rungs):
+                if step in trial.intermediate_values:
+                    X.append([trial.params[name] for name in self.names])
+                    durations.append(duration)
+                    y.append(trial.intermediate_values[step])
+        return np.array(X).reshape(-1, len(self.names)), np.array(durations), np.array(y)
+
+    def fit(self, X, durations, y):
+        kernel = (ConstantKernel(1.0) * Matern(length_scale=[0.3] * len(self.names) + [1.0], nu=2.5)
+                  + WhiteKernel(1e-3))
+        self.gp = GaussianProcessRegressor(kernel=kernel, normalize_y=True, n_restarts_optimizer=2, random_state=42)
+        self.gp.fit(self._inputs(X, durations), y)
+        self.X = np.asarray(X)
+        return self
+
+    def predict(self, X, duration=None):
+        """Posterior (mean, std) of the score at the given duration, full fidelity by default."""
+        if self.gp is None:
+            raise ValueError("No train data")
+        duration = self.full_duration if duration is None else duration
+        return self.gp.predict(self._inputs(X, duration), return_std=True)
+
+    def propose(self, study):
+        """Fits to the study's rung results and returns the params with the highest full-fidelity EI."""
+        self.fit(*self.observations(study))
+        best = np.max(self.predict(self.X)[0])
+
+        unit = sobol_candidates(len(self.names), self.n_candidates, self.rng)
+        candidates = self.bounds[:, 0] + unit * (self.bounds[:, 1] - self.bounds[:, 0])
+
+        mu, sigma = self.predict(candidates)
+        ei = expected_improvement(mu, sigma, best)
+        return {name: float(v) for name, v in zip(self.names, candidates[np.argmax(ei)])}
+
+
+def run_rungs(trial, task_type=TaskType.AIMING, switcher=None, rungs=RUNGS):
+    """
+    Objective for one trial: runs the rungs from short to full duration, reports each rung's mean score at
+    the participant-seconds spent so far and prunes when Hyperband says so.
+
+    Returns:
+        float: Stability-weighted score of the full-duration episodes.
+    """
+    speed_factor = trial.suggest_float('speed_factor', *SEARCH_SPACE['speed_factor'])
+    friction = trial.suggest_float('friction', *SEARCH_SPACE['friction'])
+    switcher = switcher or TaskSwitcher()
+    perf_model = PerformanceModel()
+
+    print("\n" + "="*50)
+    print("Trial #{}:".format(trial.number))
+    print("Speed Factor: {:.2f}".format(speed_factor))
+    print("Friction: {:.3f}".format(friction))
+    print("="*50)
+
+    spent = 0
+    for rung, ((duration, n_episodes), step) in enumerate(zip(rungs, rung_steps(rungs))):
+        scores = []
+        for i in range(n_episodes):
+            print(f"\nRung {rung+1}/{len(rungs)} ({duration} s), Sample {i+1}/{n_episodes}")
+            results = switcher.run_task(task_type, {
+                "duration": duration,
+                "sampling_rate": 20,
+                "friction": friction,
+                "speed_factor": speed_factor,
+            })
+            scores.append(score_episode(results, perf_model)['performance'])
+            spent += duration
+
+        trial.set_user_attr('participant_seconds', spent)
+        trial.report(float(np.mean(scores)), step=step)
+        print(f"Rung {rung+1} mean score: {np.mean(scores):.4f}")
+        if rung < len(rungs) - 1 and trial.should_prune():
+            print(f"Pruned after rung {rung+1} ({spent} s)")
+            raise optuna.TrialPruned()
+
+    return stability_score(scores)
+
+
+def run_multifidelity_optimization(n_trials=30, mode='bohb', task_type=TaskType.AIMING, rungs=RUNGS,
+                                   reduction_factor=3, n_startup_trials=5, seed=None):
+    """
+    Main entry point for the multi-fidelity optimization.
+
+    Args:
+        n_trials (int): Number of candidates; most of them only run the first rungs.
+        mode (str): 'bohb' or 'mfgp'.
+        task_type (TaskType): The type of task to optimize (default: AIMING).
+        rungs (list): (duration, episodes) per rung, short to full duration.
+        reduction_factor (int): Hyperband keeps about 1/reduction_factor of the candidates at each rung.
+        n_startup_trials (int): Random trials before TPE or the FidelityGP propose candidates.
+        seed (int): Seed for the sampler and the candidate sets.
+
+    Returns:
+        tuple: (best_score, best_params) over the candidates that reached full duration.
+    """
+    if mode not in ('bohb', 'mfgp'):
+        raise ValueError(f"Unknown mode: {mode}")
+
+    steps = rung_steps(rungs)
+    study = optuna.create_study(
+        direction='maximize',
+        sampler=optuna.samplers.TPESampler(seed=seed, n_startup_trials=n_startup_trials, multivariate=True),
+        pruner=optuna.pruners.HyperbandPruner(min_resource=steps[0], max_resource=steps[-1],
+                                              reduction_factor=reduction_factor),
+    )
+    surrogate = FidelityGP(rungs=rungs, seed=seed) if mode == 'mfgp' else None
+    switcher = TaskSwitcher()
+
+    for _ in range(n_trials):
+        if surrogate is not None and len(study.trials) >= n_startup_trials:
+            study.enqueue_trial(surrogate.propose(study))
+        study.optimize(lambda trial: run_rungs(trial, task_type, switcher, rungs), n_trials=1)
+
+    spent = sum(t.user_attrs.get('participant_seconds', 0) for t in study.trials)
+    n_full = len(study.get_trials(deepcopy=False, states=(optuna.trial.TrialState.COMPLETE,)))
+
+    print("\n" + "="*50)
+    print(f"  speed_factor: {study.best_params['speed_factor']:.2f}")
+    print(f"  friction: {study.best_params['friction']:.3f}")
+    print(f"Best Score: {study.best_value:.4f}")
+    print(f"{n_full}/{n_trials} candidates reached full duration")
+    print(f"Participant time: {spent / 60:.1f} min (all rungs for every candidate: {n_trials * steps[-1] / 60:.1f} min)")
+    print("="*50)
+
+    return study.best_value, study.best_params
+
+
+if __name__ == "__main__":
+    run_multifidelity_optimization(mode='bohb')
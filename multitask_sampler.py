@@ -0,0 +1,227 @@
+"""
+multitask_sampler.py
+
+Multi-task GP sampler that shares observations between task types.
+Tracking, aiming and path tracking are optimized by separate runs, but their optima cluster in similar
+speed_factor/friction regions (see results/plot.py). MultiTaskGP models all tasks jointly with an intrinsic
+coregionalization (ICM) kernel,
+    k((x, t), (x', t')) = B[t, t'] * k_x(x, x'),   B = W W^T + diag(v),
+where k_x is a Matern 5/2 kernel over the parameters and B is the learned task-correlation matrix. Observations
+from finished sessions of other tasks then inform the current task from its first trial, in proportion to how
+correlated the tasks turn out to be. Each observation's own noise variance (that of its trial's mean score, which
+depends on how many episodes the trial ran) is added to the learned noise level.
+
+Main components:
+- MultiTaskGP: ICM Gaussian process over (parameters, task) with per-task standardized targets.
+- MultiTaskGPSampler: Optuna sampler proposing the parameters with the highest expected improvement for its task.
+- observations_from_sessions: Collects (task, params, value, noise_var) from persisted sessions (see session_store.py).
+
+Dependencies: os, numpy, scipy, optuna, custom modules (acquisition, sequential_stopping, session_store,
+task_types).
+"""
+
+import os
+
+import numpy as np
+import optuna
+from optuna.distributions import FloatDistribution
+from optuna.samplers import BaseSampler, RandomSampler
+from scipy.linalg import cho_factor, cho_solve
+from scipy.optimize import minimize
+
+from acquisition import SEARCH_SPACE, expected_improvement, sobol_candidates
+from sequential_stopping import PRUNED
+from session_store import SessionStore
+from task_types import TaskType
+
+TASKS = list(TaskType)
+
+
+def _matern52(X1, X2, length_scales):
+    d = np.sqrt(np.sum(((X1[:, None, :] - X2[None, :, :]) / length_scales) ** 2, axis=-1))
+    return (1 + np.sqrt(5) * d + 5 / 3 * d ** 2) * np.exp(-np.sqrt(5) * d)
+
+
+class MultiTaskGP:
+    def __init__(self, n_tasks=len(TASKS), rank=1, prior_std=2.0):
+        """
+        Args:
+            n_tasks (int): Number of tasks in the coregionalization matrix.
+            rank (int): Rank of W in B = W W^T + diag(v).
+            prior_std (float): Std of the Gaussian prior on the log hyperparameters and W around their
+                initial values. The prior favours correlated tasks and keeps B well defined for tasks with
+                few or no observations.
+        """
+        self.n_tasks = n_tasks
+        self.rank = rank
+        self.prior_std = prior_std
+        self.theta = None
+
+    def _unpack(self, theta, d):
+        i = 0
+        length_scales = np.exp(theta[i:i + d]); i += d
+        W = theta[i:i + self.n_tasks * self.rank].reshape(self.n_tasks, self.rank); i += self.n_tasks * self.rank
+        v = np.exp(theta[i:i + self.n_tasks]); i += self.n_tasks
+        noise = np.exp(theta[i])
+        return length_scales, W @ W.T + np.diag(v), noise
+
+    def _kernel(self, X1, t1, X2, t2, length_scales, B):
+        return B[np.ix_(t1, t2)] * _matern52(X1, X2, length_scales)
+
+    def _neg_log_posterior(self, theta):
+        length_scales, B, noise = self._unpack(theta, self.X.shape[1])
+        K = self._kernel(self.X, self.t, self.X, self.t, length_scales, B) + np.diag(noise + 1e-8 + self.noise_var)
+        try:
+            L = cho_factor(K, lower=True)
+        except np.linalg.LinAlgError:
+            return 1e10
+        alpha = cho_solve(L, self.y)
+        nll = 0.5 * self.y @ alpha + np.sum(np.log(np.diag(L[0])))
+        return nll + 0.5 * np.sum((theta - self.theta0) ** 2) / self.prior_std ** 2
+
+    def fit(self, X, tasks, y, noise_var=None):
+        """
+        X: (n, d) inputs in the unit cube, tasks: (n,) task indices, y: (n,) targets.
+        noise_var: optional (n,) noise variances of the targets, added to the learned noise level, so that trials
+            measured with few episodes count less than trials measured with many.
+        """
+        self.X = np.asarray(X, dtype=float)
+        self.t = np.asarray(tasks, dtype=int)
+        y = np.asarray(y, dtype=float)
+
+        # Standardize per task, so tasks with different score scales can still be correlated
+        self.y_mean = np.zeros(self.n_tasks)
+        self.y_std = np.ones(self.n_tasks)
+        for task in np.unique(self.t):
+            values = y[self.t == task]
+            self.y_mean[task] = np.mean(values)
+            if len(values) > 1 and np.std(values) > 0:
+                self.y_std[task] = np.std(values)
+        self.y = (y - self.y_mean[self.t]) / self.y_std[self.t]
+        noise_var = np.zeros(len(y)) if noise_var is None else np.asarray(noise_var, dtype=float)
+        self.noise_var = noise_var / self.y_std[self.t] ** 2
+
+        d = self.X.shape[1]
+        self.theta0 = np.concatenate([np.log(np.full(d, 0.3)), np.full(self.n_tasks * self.rank, 1.0),
+                                      np.log(np.full(self.n_tasks, 0.1)), [np.log(0.1)]])
+        bounds = ([(np.log(0.01), np.log(5.0))] * d + [(-3.0, 3.0)] * (self.n_tasks * self.rank)
+                  + [(np.log(1e-4), np.log(10.0))] * self.n_tasks + [(np.log(1e-4), np.log(1.0))])
+        result = minimize(self._neg_log_posterior, self.theta0, method='L-BFGS-B', bounds=bounds)
+        self.theta = result.x
+
+        self.length_scales, self.B, self.noise = self._unpack(self.theta, d)
+        K = self._kernel(self.X, self.t, self.X, self.t, self.length_scales, self.B)
+        self.L = cho_factor(K + np.diag(self.noise + 1e-8 + self.noise_var), lower=True)
+        self.alpha = cho_solve(self.L, self.y)
+        return self
+
+    def predict(self, X, task):
+        """Posterior (mean, std) for one task index, in that task's original score units."""
+        if self.theta is None:
+            raise ValueError("No train data")
+        X = np.atleast_2d(X)
+        t = np.full(len(X), task)
+        K_s = self._kernel(X, t, self.X, self.t, self.length_scales, self.B)
+        mean = K_s @ self.alpha
+        var = self.B[task, task] - np.sum(K_s * cho_solve(self.L, K_s.T).T, axis=1)
+        std = np.sqrt(np.maximum(var, 1e-12))
+        return mean * self.y_std[task] + self.y_mean[task], std * self.y_std[task]
+
+    def task_correlation(self):
+        d = np.sqrt(np.diag(self.B))
+        return self.B / np.outer(d, d)
+
+
+class MultiTaskGPSampler(BaseSampler):
+    def __init__(self, task_type, source_observations=(), search_space=None, n_startup_trials=3,
+                 n_candidates=1024, seed=None):
+        """
+        Args:
+            task_type (TaskType): Task optimized by the study this sampler is attached to.
+            source_observations (list): (task_type, params, value) or (task_type, params, value, noise_var) from
+                other studies, e.g. from observations_from_sessions(); observations of task_type itself are used
+                as well.
+            search_space (dict): Parameter name -> (low, high).
+            n_startup_trials (int): Observations (source and own together) needed before the GP is used.
+            n_candidates (int): Size of the Sobol candidate set scored per proposal.
+            seed (int): Seed for the candidate sets and the random fallback.
+        """
+        self.task = TASKS.index(TaskType(task_type))
+        # Observations without a noise variance get only the learned noise level
+        self.source_observations = [(TASKS.index(TaskType(o[0])), o[1], o[2], (o[3] if len(o) > 3 else None) or 0.0)
+                                    for o in source_observations]
+        self.search_space = dict(search_space or SEARCH_SPACE)
+        self.names = list(self.search_space)
+        self.bounds = np.array([self.search_space[name] for name in self.names], dtype=float)
+        self.n_startup_trials = n_startup_trials
+        self.n_candidates = n_candidates
+        self.rng = np.random.default_rng(seed)
+        self._random_sampler = RandomSampler(seed=seed)
+        self.model = None
+
+    def _to_unit(self, params):
+        values = np.array([params[name] for name in self.names], dtype=float)
+        return (values - self.bounds[:, 0]) / (self.bounds[:, 1] - self.bounds[:, 0])
+
+    def _observations(self, study):
+        observations = list(self.source_observations)
+        for trial in study.get_trials(deepcopy=False, states=(optuna.trial.TrialState.COMPLETE,)):
+            # Pruned trials are told 0.0 in tracking_op; they say little about the surface
+            if trial.value and all(name in trial.params for name in self.names):
+                noise_var = trial.user_attrs.get('noise_var') or 0.0
+                observations.append((self.task, trial.params, trial.value, noise_var))
+        return observations
+
+    def infer_relative_search_space(self, study, trial):
+        return {name: FloatDistribution(low, high) for name, (low, high) in self.search_space.items()}
+
+    def sample_relative(self, study, trial, search_space):
+        observations = self._observations(study)
+        if len(observations) < self.n_startup_trials:
+            return {}
+
+        tasks, params, values, noise_var = zip(*observations)
+        X = np.array([self._to_unit(p) for p in params])
+        self.model = MultiTaskGP().fit(X, tasks, values, noise_var)
+
+        candidates = sobol_candidates(len(self.names), self.n_candidates, self.rng)
+        own = X[np.array(tasks) == self.task]
+        best = np.max(self.model.predict(own if len(own) else X, self.task)[0])
+
+        mu, sigma = self.model.predict(candidates, self.task)
+        ei = expected_improvement(mu, sigma, best)
+        x = candidates[np.argmax(ei)]
+        values = self.bounds[:, 0] + x * (self.bounds[:, 1] - self.bounds[:, 0])
+        return {name: float(v) for name, v in zip(self.names, values) if name in search_space}
+
+    def sample_independent(self, study, trial, param_name, param_distribution):
+        return self._random_sampler.sample_independent(study, trial, param_name, param_distribution)
+
+
+def observations_from_sessions(storage_dir='sessions', exclude=()):
+    """
+    (task_type, params, value, noise_var) of every completed, unpruned trial in the persisted sessions under
+    storage_dir; noise_var is the noise variance of the trial's mean score, None for trials that did not record it.
+
+    Args:
+        storage_dir (str): Directory holding persisted sessions.
+        exclude (iterable): Session names to skip, e.g. the session being optimized.
+    """
+    observations = []
+    if not os.path.isdir(storage_dir):
+        return observations
+
+    for name in sorted(os.listdir(storage_dir)):
+        if name in exclude or not os.path.isdir(os.path.join(storage_dir, name)):
+            continue
+        store = SessionStore(name, storage_dir)
+        config = store.load().config
+        if 'task_type' not in config:
+            continue
+        study = optuna.load_study(study_name=name, storage=store.storage)
+        for trial in study.get_trials(deepcopy=False, states=(optuna.trial.TrialState.COMPLETE,)):
+            if (trial.user_attrs.get('stop_reason') not in PRUNED
+                    and all(param in trial.params for param in SEARCH_SPACE)):
+                observations.append((config['task_type'], trial.params, trial.value,
+                                     trial.user_attrs.get('noise_var')))
+    return observations
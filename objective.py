@@ -7,19 +7,29 @@ Here performance and preference use two different classes and GPs, allowing you
 
 Main components:
 - PerformanceModel: Computes accuracy, speed, and overall performance metrics.
-- GPModel: Gaussian Process regression for modeling performance and preferences.
+- GPModel: Gaussian Process regression for modeling performance and preferences, optionally with a noise
+  variance per observation (e.g. from episode_noise_variance), so trials with few episodes weigh less.
+- NoiseModel: Learned per-episode noise level at parameters that have not been run yet.
+- episode_noise_variance: Variance of a trial's mean score from its episode scores.
+- JointGPModel: Multi-output GP sharing one kernel and factorization across performance and preference.
 - PlackettLuce: Probabilistic model for ranking-based preference data.
+- GPPreferenceModel: GP over parameter space fitted to pairwise preferences (probit likelihood, Laplace
+  approximation), so preference can be predicted at parameters that have not been run.
 - PreferenceModel: Handles pairwise and ranking-based user preferences.
+- score_episode / summarize_episodes: Structured per-episode records and their per-trial summary.
 - joint_score: Combines performance and preference models for joint optimization.
+- joint_score_sweep: Joint scores and variances for a whole array of lambda weights in one broadcast.
 
 Dependencies: numpy, scipy, scikit-learn, optuna.
 """
 
 import numpy as np
 from sklearn.gaussian_process import GaussianProcessRegressor
-from sklearn.gaussian_process.kernels import Matern
+from sklearn.gaussian_process.kernels import ConstantKernel, Matern, WhiteKernel
+from sklearn.model_selection import KFold
 import optuna
 from scipy.optimize import minimize
+import scipy.sparse as sparse
 import scipy.stats as stats
 
 
@@ -43,12 +53,71 @@ def f_perf(accuracy_val, speed_val, w1=0.6):
     return w1 * accuracy_val + w2 * speed_val
 
 
+def stability_score(scores, warmup=10, stability_weight=0.6):
+    """Mean episode score after the warm-up episodes, scaled down by their spread."""
+    final_scores = scores[warmup:] if len(scores) > warmup else scores
+    std_dev = np.std(final_scores)
+    stability_factor = (1 - stability_weight) + stability_weight * np.exp(-std_dev)
+    return float(np.mean(final_scores) * stability_factor)
+
+
+def episode_noise_variance(scores, prior_noise_std=0.1, prior_weight=2.0):
+    """
+    Variance of the mean of a trial's episode scores. The episode variance is pooled with prior_noise_std
+    (prior_weight pseudo-episodes) so that a few close scores do not claim an almost noise-free mean.
+    """
+    scores = np.asarray(scores, dtype=float)
+    n = len(scores)
+    ss = float(np.sum((scores - scores.mean()) ** 2)) if n else 0.0
+    episode_var = (ss + prior_weight * prior_noise_std ** 2) / (max(n - 1, 0) + prior_weight)
+    return episode_var / max(n, 1)
+
+
+class NoiseModel:
+    """GP on the log per-episode score variance, so the noise level can be predicted at unseen parameters."""
+
+    def __init__(self, prior_noise_std=0.1):
+        self.prior_noise_std = prior_noise_std
+        self.gp = None
+
+    def fit(self, X, episode_vars):
+        X = np.asarray(X, dtype=float)
+        length_scale = np.ptp(X, axis=0) + 1e-6
+        kernel = ConstantKernel(1.0) * Matern(length_scale=length_scale, nu=2.5) + WhiteKernel(0.1, noise_level_bounds=(1e-3, 1e1))
+        self.gp = GaussianProcessRegressor(kernel=kernel, normalize_y=True, random_state=42)
+        self.gp.fit(X, np.log(np.asarray(episode_vars, dtype=float)))
+        return self
+
+    def predict(self, X, n_episodes=1):
+        """Noise variance of the mean of n_episodes episodes at X."""
+        if self.gp is None:
+            return np.full(len(np.atleast_2d(X)), self.prior_noise_std ** 2) / n_episodes
+        return np.exp(self.gp.predict(np.atleast_2d(X))) / n_episodes
+
+    def episodes_for(self, X, target_std):
+        """Episodes needed at X for the mean score to reach target_std."""
+        return np.ceil(self.predict(X) / target_std ** 2).astype(int)
+
+
 class GPModel:
-    def __init__(self, X_train=None, y_train=None):
+    normalize_y = False
+
+    def __init__(self, X_train=None, y_train=None, noise_var=None):
+        """noise_var: optional noise variance of every training target, added to the fitted noise level."""
         self.X_train = X_train
         self.y_train = y_train
+        self.noise_var = None if noise_var is None else np.asarray(noise_var, dtype=float)
         self.gp = None
 
+    def _alpha(self, noise_level, idx=None):
+        if self.noise_var is None:
+            return noise_level
+        noise_var = self.noise_var if idx is None else self.noise_var[idx]
+        if self.normalize_y:
+            # sklearn adds alpha to the kernel of the standardized targets
+            noise_var = noise_var / np.mean(np.var(self.y_train, axis=0))
+        return noise_level + noise_var
+
     def objective(self, trial):
         nu = trial.suggest_categorical('nu', [0.5, 1.5, 2.5])
         length_scale = trial.suggest_float('length_scale', 0.1, 2.0)
@@ -58,7 +127,8 @@ class GPModel:
 
         gp = GaussianProcessRegressor(
             kernel=kernel,
-            alpha=noise_level,
+            alpha=self._alpha(noise_level),
+            normalize_y=self.normalize_y,
             n_restarts_optimizer=5,
             random_state=42
         )
@@ -69,6 +139,14 @@ class GPModel:
             gp.fit(self.X_train, self.y_train)
             y_pred = gp.predict(self.X_train)
             return -np.mean((self.y_train - y_pred) ** 2)
+        elif self.noise_var is not None:
+            # Per-observation alpha has to follow the fold split
+            errors = []
+            for train_idx, test_idx in KFold(n_splits=5).split(self.X_train):
+                gp.set_params(alpha=self._alpha(noise_level, train_idx))
+                gp.fit(self.X_train[train_idx], self.y_train[train_idx])
+                errors.append(np.mean((self.y_train[test_idx] - gp.predict(self.X_train[test_idx])) ** 2))
+            return -np.mean(errors)
         else:
             # For larger datasets, use cross-validation
             from sklearn.model_selection import cross_val_score
@@ -89,7 +167,8 @@ class GPModel:
 
         self.gp = GaussianProcessRegressor(
             kernel=kernel,
-            alpha=best_params['noise_level'],
+            alpha=self._alpha(best_params['noise_level']),
+            normalize_y=self.normalize_y,
             n_restarts_optimizer=5,
             random_state=42
         )
@@ -101,6 +180,27 @@ class GPModel:
         return self.gp.predict(X_test, return_std=True)
 
 
+class JointGPModel(GPModel):
+    """
+    Multi-output GP over several targets observed at the same inputs.
+
+    All targets share one Matern kernel, one hyperparameter search and one Cholesky
+    factorization of the kernel matrix; only the right-hand side of the solve differs
+    per target. Each target is standardized so that performance and preference scales
+    do not have to match.
+    """
+    normalize_y = True
+
+    def __init__(self, X_train=None, Y_train=None, noise_var=None):
+        super().__init__(X_train, None if Y_train is None else np.column_stack(Y_train), noise_var)
+
+    def predict(self, X_test):
+        """Returns (means, stds), each of shape (n_points, n_targets)."""
+        mean, std = super().predict(X_test)
+        n_targets = self.y_train.shape[1]
+        return mean.reshape(-1, n_targets), std.reshape(-1, n_targets)
+
+
 class PlackettLuce:
     def __init__(self, n_candidates):
         self.n_candidates = n_candidates
@@ -143,6 +243,94 @@ class PlackettLuce:
         )
         return np.exp(result.x) 
 
+class GPPreferenceModel:
+    """
+    Preference learning with a GP latent utility f(x) (Chu & Ghahramani, 2005): P(w preferred to l) =
+    Phi((f(x_w) - f(x_l)) / (sqrt(2) noise_std)). The posterior of f at the compared points is approximated
+    by a Gaussian at its mode (Laplace). The Hessian W of the negative log likelihood only has entries for
+    compared pairs, so it is assembled as a sparse matrix from one rank-one term per comparison.
+    """
+
+    def __init__(self, length_scales=(0.1, 0.2, 0.3, 0.5, 1.0), signal_var=1.0, noise_std=0.5, max_iter=50):
+        """
+        Args:
+            length_scales (tuple): Matern 5/2 length scales tried; the one with the highest Laplace
+                evidence is kept. Inputs are expected in the unit cube.
+            signal_var (float): Prior variance of the latent utility.
+            noise_std (float): Judgement noise of the participant on the utility scale.
+            max_iter (int): Newton iterations for the mode.
+        """
+        self.length_scales = length_scales
+        self.signal_var = signal_var
+        self.noise_std = noise_std
+        self.max_iter = max_iter
+        self.X = None
+
+    def _kernel(self, X1, X2, length_scale):
+        return self.signal_var * Matern(length_scale=length_scale, nu=2.5)(X1, X2)
+
+    def _derivatives(self, f):
+        """Log likelihood, its gradient and the sparse Hessian W of its negative at latent values f."""
+        s = np.sqrt(2) * self.noise_std
+        z = (f[self.winners] - f[self.losers]) / s
+        log_cdf = stats.norm.logcdf(z)
+        ratio = np.exp(stats.norm.logpdf(z) - log_cdf)  # d log Phi(z) / dz
+        grad = np.zeros(len(f))
+        np.add.at(grad, self.winners, ratio / s)
+        np.add.at(grad, self.losers, -ratio / s)
+
+        c = ratio * (z + ratio) / s ** 2  # -d2 log Phi(z) / dz2 / s2 >= 0
+        rows = np.concatenate([self.winners, self.losers, self.winners, self.losers])
+        cols = np.concatenate([self.winners, self.losers, self.losers, self.winners])
+        W = sparse.coo_matrix((np.concatenate([c, c, -c, -c]), (rows, cols)), shape=(len(f), len(f))).tocsr()
+        return np.sum(log_cdf), grad, W
+
+    def _laplace(self, K):
+        n = len(K)
+        f = np.zeros(n)
+        for _ in range(self.max_iter):
+            _, grad, W = self._derivatives(f)
+            # Newton step f = (K^-1 + W)^-1 (W f + grad) = K (I + W K)^-1 (W f + grad)
+            f_new = K @ np.linalg.solve(np.eye(n) + W @ K, W @ f + grad)
+            if np.max(np.abs(f_new - f)) < 1e-6:
+                f = f_new
+                break
+            f = f_new
+        log_lik, grad, W = self._derivatives(f)
+        A = np.eye(n) + W @ K
+        evidence = log_lik - 0.5 * f @ np.linalg.solve(K + 1e-8 * np.eye(n), f) - 0.5 * np.linalg.slogdet(A)[1]
+        return f, grad, W, A, evidence
+
+    def fit(self, X, comparisons):
+        """
+        Args:
+            X (array): (n, d) points in the unit cube.
+            comparisons (list): (winner, loser) row indices into X.
+        """
+        self.X = np.asarray(X, dtype=float)
+        comparisons = np.asarray(comparisons, dtype=int).reshape(-1, 2)
+        self.winners, self.losers = comparisons[:, 0], comparisons[:, 1]
+
+        best = None
+        for length_scale in self.length_scales:
+            K = self._kernel(self.X, self.X, length_scale) + 1e-6 * np.eye(len(self.X))
+            f, grad, W, A, evidence = self._laplace(K)
+            if best is None or evidence > best[-1]:
+                best = (length_scale, f, grad, W, A, evidence)
+        self.length_scale, self.f, self.grad, self.W, self.A, self.evidence = best
+        return self
+
+    def predict(self, X):
+        """Posterior (mean, std) of the latent utility at X."""
+        if self.X is None:
+            raise ValueError("No train data")
+        K_s = self._kernel(np.atleast_2d(X), self.X, self.length_scale)
+        # At the mode K^-1 f equals the log likelihood gradient
+        mean = K_s @ self.grad
+        var = self.signal_var - np.sum(K_s * np.linalg.solve(self.A, self.W @ K_s.T).T, axis=1)
+        return mean, np.sqrt(np.maximum(var, 1e-12))
+
+
 class PreferenceModel:
     def __init__(self, n_candidates, pair=False, similar_comparison=False, fatigue_weight=0.2, confidence_weight=0.1):
         self.pl_model = PlackettLuce(n_candidates)
@@ -173,6 +361,10 @@ class PreferenceModel:
                         
         return similar_pairs
         
+    def add_preference(self, winner, loser):
+        """Records the answer to a query between any two trials."""
+        self.comparison_history.append((winner, loser))
+
     def verify_similar_pair(self, pair1, pair2):
         return self.comparison_history.append((pair1, pair2))
 
@@ -248,12 +440,74 @@ class PerformanceModel:
         return perf_values
 
 
+def score_episode(results, perf_model=None):
+    """
+    Scores one task run and keeps its raw metrics, so the record can be reused for reporting
+    and re-scoring without running the episode again.
+    """
+    perf_model = perf_model or PerformanceModel()
+    error = error_calc(results["distances"])
+    moving_time = results['sampling_times'][-1]
+    jitter = results["jitter"]
+
+    return {
+        'accuracy': float(perf_model.compute_accuracy(error)),
+        'time': float(perf_model.compute_time(moving_time)),
+        'performance': float(perf_model.compute_performance(error, moving_time, jitter)),
+        'error': float(error),
+        'moving_time': float(moving_time),
+        'jitter': jitter,
+        'distances': [float(d) for d in results["distances"]],
+        'sampling_times': [float(t) for t in results['sampling_times']],
+        'completion_time': results.get('completion_time', results.get('first_entry_time')),
+    }
+
+
+def summarize_episodes(episodes, warmup=0):
+    """Per-trial summary in the detailed_scores format; avg_performance skips the warm-up episodes."""
+    accuracy_scores = [e['accuracy'] for e in episodes]
+    time_scores = [e['time'] for e in episodes]
+    performance_scores = [e['performance'] for e in episodes]
+    counted = performance_scores[warmup:] if len(performance_scores) > warmup else performance_scores
+
+    return {
+        'accuracy_scores': accuracy_scores,
+        'time_scores': time_scores,
+        'performance_scores': performance_scores,
+        'avg_accuracy': float(np.mean(accuracy_scores)) if episodes else 0.0,
+        'avg_time': float(np.mean(time_scores)) if episodes else 0.0,
+        'avg_performance': float(np.mean(counted)) if episodes else 0.0,
+        'noise_var': episode_noise_variance(counted),
+        'n_episodes': len(counted),
+    }
+
+
+def joint_score_sweep(perf_posterior, pref_posterior, lambda_weights):
+    """
+    Joint score lambda * perf + (1 - lambda) * pref for many lambda values at once.
+
+    perf_posterior, pref_posterior: (mean, std) arrays of shape (n_points,) from fitted models,
+        e.g. the two columns of JointGPModel.predict. The two posteriors are treated as independent.
+    lambda_weights: scalar or array of shape (n_lambdas,).
+
+    Returns (scores, variances), each of shape (n_lambdas, n_points); no model is refitted.
+    """
+    perf_mean, perf_std = (np.asarray(v, dtype=float) for v in perf_posterior)
+    pref_mean, pref_std = (np.asarray(v, dtype=float) for v in pref_posterior)
+    lam = np.atleast_1d(np.asarray(lambda_weights, dtype=float))[:, None]
+
+    scores = lam * perf_mean + (1 - lam) * pref_mean
+    variances = lam ** 2 * perf_std ** 2 + (1 - lam) ** 2 * pref_std ** 2
+    return scores, variances
+
+
 def joint_score(params, errors, moving_times, jitters, rankings=None, lambda_weight=0.5):
     """
     params:
         [categorical_params, continuous_params]
         categorical_params: [cap_type, material_surface]
         continuous_params: [rocker_length, cap_size, spring_stiffness, damping_factor]
+    lambda_weight: scalar, or an array of weights to get one row of joint scores per weight
     """
     perf_model = PerformanceModel()
     perf_values = perf_model.evaluate_batch(errors, moving_times, jitters)
@@ -264,9 +518,6 @@ def joint_score(params, errors, moving_times, jitters, rankings=None, lambda_wei
     pref_model = PreferenceModel(len(errors))
     pref_values = pref_model.fit(rankings)
 
-    gp_perf = GPModel()
-    gp_pref = GPModel()
-
     X = np.array([
         [
             *p[0],
@@ -275,19 +526,15 @@ def joint_score(params, errors, moving_times, jitters, rankings=None, lambda_wei
         for p in params
     ])
 
-    gp_perf.X_train = X
-    gp_perf.y_train = perf_values
-    gp_perf.train()
+    # One hyperparameter search and one kernel factorization serve both targets
+    gp_joint = JointGPModel(X, (perf_values, pref_values))
+    gp_joint.train()
 
-    gp_pref.X_train = X
-    gp_pref.y_train = pref_values
-    gp_pref.train()
+    means, stds = gp_joint.predict(X)
+    joint_values, _ = joint_score_sweep((means[:, 0], stds[:, 0]), (means[:, 1], stds[:, 1]), lambda_weight)
 
-    perf_pred, _ = gp_perf.predict(X)
-    pref_pred, _ = gp_pref.predict(X)
-
-    joint_values = lambda_weight * perf_pred + (1 - lambda_weight) * pref_pred
-    
+    if np.ndim(lambda_weight) == 0:
+        return joint_values[0]
     return joint_values
 
 
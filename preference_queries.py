@@ -0,0 +1,115 @@
+"""
+preference_queries.py
+
+Active selection of preference queries.
+Pair mode used to compare every trial with the previous one and to verify every similar pair with 3+3 episodes,
+whether or not the answer could change what the model believes about the best trial. The selector instead
+scores each candidate pair by the expected information its answer gives about which trial is best:
+    - the Plackett-Luce fit of PreferenceModel is turned into a Gaussian posterior over the log-utilities by a
+      Laplace approximation (MAP and inverse Hessian of the negative log posterior),
+    - posterior samples give a distribution over the best trial, and for every pair the mutual information
+      I(answer; best trial) = H[answer] - E_best[H[answer | best]], with P(i preferred to j) = sigmoid(u_i - u_j),
+    - the pair with the largest information is asked, unless it is below min_information or the session's cap
+      on queries is reached, in which case nothing is asked.
+
+Main components:
+- laplace_posterior: Mean and covariance of the log-utilities of a PreferenceModel.
+- PreferenceQuerySelector: Picks the next pair to ask about, if any.
+
+Dependencies: numpy, scipy.
+"""
+
+import itertools
+
+import numpy as np
+from scipy.special import expit, softmax
+
+
+def laplace_posterior(pref_model):
+    """
+    (mean, cov) of the log-utilities of all candidates of pref_model. The Hessian is the analytic one of
+    PlackettLuce.objective: a softmax covariance per ranking step plus exp(u) from the gamma(1, 1) prior.
+    """
+    n = pref_model.n_candidates
+    if pref_model.utilities is None:
+        mean = np.zeros(n)
+    else:
+        mean = np.log(np.maximum(np.asarray(pref_model.utilities, dtype=float), 1e-12))
+
+    rankings = pref_model._convert_pairwise_to_rankings(pref_model.comparison_history) if pref_model.pair \
+        else pref_model.comparison_history
+    hessian = np.diag(np.exp(mean))
+    for ranking in rankings:
+        remaining = np.ones(n, dtype=bool)
+        for rank in ranking:
+            idx = np.flatnonzero(remaining)
+            p = softmax(mean[idx])
+            hessian[np.ix_(idx, idx)] += np.diag(p) - np.outer(p, p)
+            remaining[rank] = False
+    return mean, np.linalg.inv(hessian)
+
+
+class PreferenceQuerySelector:
+    def __init__(self, max_queries=10, min_information=0.02, n_samples=2000, seed=None):
+        """
+        Args:
+            max_queries (int): Preference queries per session, verifications included.
+            min_information (float): Pairs whose answer carries fewer bits about the best trial are not asked.
+            n_samples (int): Posterior samples for the information estimate.
+            seed (int): Seed for the posterior samples.
+        """
+        self.max_queries = max_queries
+        self.min_information = min_information
+        self.n_samples = n_samples
+        self.rng = np.random.default_rng(seed)
+
+    def information_gain(self, pref_model, candidates, pairs):
+        """Expected information (bits) about the best of candidates from the answer to each of pairs."""
+        mean, cov = laplace_posterior(pref_model)
+        candidates = list(candidates)
+        samples = self.rng.multivariate_normal(mean[candidates], cov[np.ix_(candidates, candidates)],
+                                               size=self.n_samples, method='cholesky')
+        best = np.argmax(samples, axis=1)
+
+        position = {c: k for k, c in enumerate(candidates)}
+        i = np.array([position[a] for a, _ in pairs])
+        j = np.array([position[b] for _, b in pairs])
+        p = expit(samples[:, i] - samples[:, j])
+
+        def entropy(q):
+            q = np.clip(q, 1e-12, 1 - 1e-12)
+            return -(q * np.log2(q) + (1 - q) * np.log2(1 - q))
+
+        conditional = 0.0
+        for k in np.unique(best):
+            members = best == k
+            conditional = conditional + members.mean() * entropy(p[members].mean(axis=0))
+        return entropy(p.mean(axis=0)) - conditional
+
+    def select(self, pref_model, candidates, pairs=None, include=None):
+        """
+        The most informative pair (i, j) to ask about next, or None.
+
+        Args:
+            pref_model (PreferenceModel): Fitted (or not yet fitted) preference model.
+            candidates (list): Trial numbers that can be compared, e.g. all completed trials.
+            pairs (list): Pairs to choose from; defaults to all pairs of candidates.
+            include (int): Only consider pairs with this trial, e.g. the one the participant just tried.
+        """
+        if len(pref_model.comparison_history) >= self.max_queries:
+            return None
+        candidates = sorted(set(candidates))
+        if pairs is None:
+            pairs = list(itertools.combinations(candidates, 2))
+        if include is not None:
+            pairs = [pair for pair in pairs if include in pair]
+        if not pairs or len(candidates) < 2:
+            return None
+
+        gains = self.information_gain(pref_model, candidates, pairs)
+        k = int(np.argmax(gains))
+        print(f"Most informative preference query: Trial {pairs[k][0]} vs Trial {pairs[k][1]} "
+              f"({gains[k]:.3f} bits)")
+        if gains[k] < self.min_information:
+            return None
+        return pairs[k]
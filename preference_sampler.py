@@ -0,0 +1,117 @@
+"""
+preference_sampler.py
+
+Optuna sampler whose acquisition uses the participant's preferences as well as the measured scores.
+PreferenceModel's Plackett-Luce utilities exist only for trials that have been run, so they cannot steer where
+the next trial goes. PreferenceGPSampler fits a GPPreferenceModel to the pairwise comparisons over the trials'
+parameters, which predicts the preference at any candidate, and combines it with a GP on the trial values:
+    joint(x) = lambda_weight * performance(x) + (1 - lambda_weight) * preference(x),
+with preference(x) = Phi(f(x)), the probability that x is preferred to an average configuration, so both terms
+are in [0, 1]. The next trial maximizes the expected improvement of the joint score; no extra queries are asked.
+The performance GP adds each trial's noise variance (see acquisition.trial_noise_var) to its diagonal.
+
+Main components:
+- PreferenceGPSampler: Sampler combining a performance GP and a GP preference model.
+
+Dependencies: numpy, scipy, scikit-learn, optuna, custom modules (acquisition, objective).
+"""
+
+import numpy as np
+import optuna
+from optuna.distributions import FloatDistribution
+from optuna.samplers import BaseSampler, RandomSampler
+from scipy.special import owens_t
+from scipy.stats import norm
+from sklearn.gaussian_process import GaussianProcessRegressor
+from sklearn.gaussian_process.kernels import ConstantKernel, Matern, WhiteKernel
+
+from acquisition import SEARCH_SPACE, expected_improvement, normalized_noise, sobol_candidates, trial_noise_var
+from objective import GPPreferenceModel, joint_score_sweep
+
+
+class PreferenceGPSampler(BaseSampler):
+    def __init__(self, pref_model, lambda_weight=0.7, search_space=None, n_startup_trials=3, n_candidates=1024,
+                 seed=None):
+        """
+        Args:
+            pref_model (PreferenceModel): Preference model of the session; its comparison_history holds
+                (winner, loser) trial numbers and is read at every proposal.
+            lambda_weight (float): Weight of performance against preference, as in tracking_objective.
+            search_space (dict): Parameter name -> (low, high).
+            n_startup_trials (int): Completed trials needed before the GPs are used.
+            n_candidates (int): Size of the Sobol candidate set scored per proposal.
+            seed (int): Seed for the candidate sets and the random fallback.
+        """
+        self.pref_model = pref_model
+        self.lambda_weight = lambda_weight
+        self.search_space = dict(search_space or SEARCH_SPACE)
+        self.names = list(self.search_space)
+        self.bounds = np.array([self.search_space[name] for name in self.names], dtype=float)
+        self.n_startup_trials = n_startup_trials
+        self.n_candidates = n_candidates
+        self.rng = np.random.default_rng(seed)
+        self._random_sampler = RandomSampler(seed=seed)
+
+    def _to_unit(self, params):
+        values = np.array([params[name] for name in self.names], dtype=float)
+        return (values - self.bounds[:, 0]) / (self.bounds[:, 1] - self.bounds[:, 0])
+
+    def _preference(self, study, X):
+        """(mean, std) of Phi(f) at X, or None while there are no usable comparisons."""
+        trials = {t.number: t for t in study.get_trials(deepcopy=False)
+                  if all(name in t.params for name in self.names)}
+        comparisons = [(w, l) for w, l in self.pref_model.comparison_history if w in trials and l in trials]
+        if not comparisons:
+            return None
+
+        numbers = sorted({n for pair in comparisons for n in pair})
+        row = {n: i for i, n in enumerate(numbers)}
+        model = GPPreferenceModel().fit([self._to_unit(trials[n].params) for n in numbers],
+                                        [(row[w], row[l]) for w, l in comparisons])
+        mean, std = model.predict(X)
+        # Phi of a Gaussian, exact: E[Phi(f)] = Phi(a) and E[Phi(f)^2] = Phi(a) - 2 T(a, 1 / sqrt(1 + 2 std^2)),
+        # with a = mean / sqrt(1 + std^2) and Owen's T function
+        a = mean / np.sqrt(1 + std ** 2)
+        expected = norm.cdf(a)
+        variance = expected * (1 - expected) - 2 * owens_t(a, 1 / np.sqrt(1 + 2 * std ** 2))
+        return expected, np.sqrt(np.maximum(variance, 0.0))
+
+    def infer_relative_search_space(self, study, trial):
+        return {name: FloatDistribution(low, high) for name, (low, high) in self.search_space.items()}
+
+    def sample_relative(self, study, trial, search_space):
+        # Pruned trials are told 0.0 in tracking_op; they say little about the surface
+        trials = [t for t in study.get_trials(deepcopy=False, states=(optuna.trial.TrialState.COMPLETE,))
+                  if t.value and all(name in t.params for name in self.names)]
+        if len(trials) < self.n_startup_trials:
+            return {}
+
+        X = np.array([self._to_unit(t.params) for t in trials])
+        # The objective part only; trial values may already mix in the Plackett-Luce preference score
+        y = np.array([t.user_attrs.get('objective_score', t.value) for t in trials], dtype=float)
+        kernel = (ConstantKernel(1.0) * Matern(length_scale=np.full(len(self.names), 0.3), nu=2.5)
+                  + WhiteKernel(1e-3, noise_level_bounds=(1e-6, 1e-1)))
+        # Trials with few episodes are noisier observations
+        gp = GaussianProcessRegressor(kernel=kernel, alpha=1e-10 + normalized_noise(trial_noise_var(trials), y),
+                                      normalize_y=True, n_restarts_optimizer=2, random_state=42)
+        gp.fit(X, y)
+
+        candidates = sobol_candidates(len(self.names), self.n_candidates, self.rng)
+        points = np.vstack([X, candidates])
+        perf = gp.predict(points, return_std=True)
+        pref = self._preference(study, points)
+        if pref is None:
+            mu, sigma = perf
+        else:
+            scores, variances = joint_score_sweep(perf, pref, self.lambda_weight)
+            mu, sigma = scores[0], np.sqrt(variances[0])
+
+        best = np.max(mu[:len(X)])
+        mu, sigma = mu[len(X):], sigma[len(X):]
+        ei = expected_improvement(mu, sigma, best)
+        x = candidates[np.argmax(ei)]
+        values = self.bounds[:, 0] + x * (self.bounds[:, 1] - self.bounds[:, 0])
+        return {name: float(v) for name, v in zip(self.names, values) if name in search_space}
+
+    def sample_independent(self, study, trial, param_name, param_distribution):
+        return self._random_sampler.sample_independent(study, trial, param_name, param_distribution)
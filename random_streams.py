@@ -0,0 +1,40 @@
+"""
+random_streams.py
+
+Per-instance random number streams for the task environments.
+Every reticle owns a numpy Generator instead of sharing the global random/np.random state, so simulations are
+reproducible across processes and do not contend for one global generator. Generators are spawned from a session
+SeedSequence: trial_seed_sequence(entropy, trial_number) gives every trial its own child sequence, and
+TaskSwitcher spawns one Generator per episode from it.
+
+Main components:
+- JitterStream: Pre-draws Gaussian jitter in blocks instead of two scalar draws per frame.
+- trial_seed_sequence: Child SeedSequence of a session for one trial.
+
+Dependencies: numpy.
+"""
+
+import numpy as np
+
+
+class JitterStream:
+    def __init__(self, rng, block_size=1024):
+        self.rng = rng
+        self.block_size = block_size
+        self._block = None
+        self._pos = block_size
+
+    def next(self, scale):
+        """Next (jitter_x, jitter_y), each N(0, scale**2)."""
+        if self._pos >= self.block_size:
+            # Python floats: per-frame indexing of a list is cheaper than of a numpy array
+            self._block = self.rng.standard_normal(2 * self.block_size).tolist()
+            self._pos = 0
+        i = 2 * self._pos
+        self._pos += 1
+        return scale * self._block[i], scale * self._block[i + 1]
+
+
+def trial_seed_sequence(entropy, trial_number):
+    """SeedSequence of one trial; depends only on the session entropy and the trial number, so it survives resumes."""
+    return np.random.SeedSequence(entropy, spawn_key=(int(trial_number),))
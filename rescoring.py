@@ -0,0 +1,194 @@
+"""
+rescoring.py
+
+NOTE: Not used in the main process
+
+Re-scores stored episodes under other objective definitions without re-running participants.
+Every episode's raw metrics (distances, sampling times, jitter, completion time) are kept in the session
+sidecars (see session_store.py) and in the results store (see results_store.py). An episode enters
+the objective only through its mean distance, its moving time and its jitter count, so these are extracted once
+into an EpisodeTable, and a whole grid of objective variants is evaluated on it in one broadcast:
+    episode score:  f_perf(accuracy(scale * mean_distance, lam), res_speed(moving_time, jitter, alpha), w1)
+    trial score:    as the study scored the trial's phase in tracking_op:
+                    - optimization: stability_score(episode scores, min(warmup, n // 2), stability_weight),
+                    - initial: the plain mean of all episodes,
+                    - simulation (trackingtasksimulator.py): the mean after the warm-up cut.
+Only completed trials are re-scored; the preference part of combined trial values is not included.
+
+Main components:
+- DEFAULT_VARIANT: The objective as currently defined in objective.py and tracking_op.py.
+- variant_grid: All combinations of the given objective constants.
+- EpisodeTable: Raw episode metrics of many sessions as flat arrays.
+- rescore_episodes / rescore_trials: Episode and trial scores for every variant.
+- main: Command line entry point.
+
+Usage:
+    python rescoring.py sessions results_store --lam 0.5 1 2 --w1 0.5 0.6 0.8
+
+Dependencies: argparse, itertools, os, numpy, optuna, custom modules (session_store, results_store).
+"""
+
+import argparse
+import itertools
+import os
+
+import numpy as np
+import optuna
+
+from results_store import ResultsStore
+from session_store import SessionStore
+
+DEFAULT_VARIANT = {
+    'lam': 1.0,
+    'alpha': 0.5,
+    'w1': 0.6,
+    'stability_weight': 0.6,
+    'warmup': 10,
+    'scale': 0.02,
+}
+
+
+def variant_grid(**values):
+    """Every combination of the given constants (lists), the others at DEFAULT_VARIANT, as a dict of arrays."""
+    names = list(DEFAULT_VARIANT)
+    axes = [np.atleast_1d(values.get(name, DEFAULT_VARIANT[name])) for name in names]
+    combos = list(itertools.product(*axes))
+    return {name: np.array([c[i] for c in combos], dtype=float) for i, name in enumerate(names)}
+
+
+class EpisodeTable:
+    def __init__(self, records):
+        """
+        records: (source, trial_number, episode, phase) with episode in the objective.score_episode format and
+            phase the trial's 'phase' ('initial', 'optimization' or 'simulation').
+        """
+        records = [r for r in records if r[2].get('distances')]
+        self.source = np.array([r[0] for r in records], dtype=object)
+        self.trial = np.array([r[1] for r in records], dtype=int)
+        self.phase = np.array([r[3] for r in records], dtype=object)
+        self.mean_distance = np.array([np.mean(r[2]['distances']) for r in records], dtype=float)
+        self.moving_time = np.array([r[2]['sampling_times'][-1] for r in records], dtype=float)
+        self.jitter = np.array([r[2].get('jitter') or 0 for r in records], dtype=float)
+        self.original = np.array([r[2].get('performance', np.nan) for r in records], dtype=float)
+
+    def __len__(self):
+        return len(self.trial)
+
+    @classmethod
+    def from_sessions(cls, storage_dir='sessions'):
+        records = []
+        for name in sorted(os.listdir(storage_dir)):
+            if not os.path.isfile(os.path.join(storage_dir, name, 'session.jsonl')):
+                continue
+            store = SessionStore(name, storage_dir)
+            study = optuna.load_study(study_name=name, storage=store.storage)
+            # Failed (interrupted) trials were re-run under a new trial number
+            phases = {t.number: t.user_attrs.get('phase', 'optimization')
+                      for t in study.get_trials(deepcopy=False, states=(optuna.trial.TrialState.COMPLETE,))}
+            for trial_number, episodes in store.load().episodes.items():
+                if trial_number in phases:
+                    records.extend((name, trial_number, episode, phases[trial_number]) for episode in episodes)
+        return cls(records)
+
+    @classmethod
+    def from_results_store(cls, directory='results_store', sessions=None):
+        store = ResultsStore(directory)
+        phases = {(row['session'], row['trial']): row['phase']
+                  for row in store.read('trials', columns=['session', 'trial', 'phase'], sessions=sessions).to_pylist()}
+        columns = ['session', 'trial', 'distances', 'sampling_times', 'jitter', 'performance']
+        rows = store.read('episodes', columns=columns, sessions=sessions).to_pylist()
+        return cls([(row['session'], row['trial'], row, phases[(row['session'], row['trial'])]) for row in rows
+                    if (row['session'], row['trial']) in phases])
+
+    @classmethod
+    def concat(cls, tables):
+        table = cls([])
+        for name in ('source', 'trial', 'phase', 'mean_distance', 'moving_time', 'jitter', 'original'):
+            setattr(table, name, np.concatenate([getattr(t, name) for t in tables]))
+        return table
+
+
+def rescore_episodes(table, variants):
+    """(n_variants, n_episodes) episode scores."""
+    v = {name: values[:, None] for name, values in variants.items()}
+    error = v['scale'] * table.mean_distance[None, :]
+    acc = np.exp(-v['lam'] * error ** 2)
+    speed = 1 / (table.moving_time[None, :] + v['alpha'] * (table.jitter[None, :] - 1))
+    return v['w1'] * acc + (1 - v['w1']) * speed
+
+
+def rescore_trials(table, variants):
+    """
+    Trial scores for every variant.
+
+    Returns:
+        tuple: (keys, scores) with keys a list of (source, trial_number) and scores of shape
+            (n_variants, n_trials).
+    """
+    keys, index = np.unique(np.array([f"{s}\0{t}" for s, t in zip(table.source, table.trial)]),
+                            return_inverse=True)
+    episode_scores = rescore_episodes(table, variants)
+    n_trials = len(keys)
+
+    # Episode position within its trial, in stored order
+    position = np.zeros(len(table), dtype=int)
+    counts = np.zeros(n_trials, dtype=int)
+    for i, k in enumerate(index):
+        position[i] = counts[k]
+        counts[k] += 1
+
+    # Initial samples are told the plain mean of all their episodes, simulations the mean after the warm-up cut
+    phase = np.empty(n_trials, dtype=object)
+    phase[index] = table.phase
+    cut = phase != 'initial'
+    stable = ~np.isin(phase, ['initial', 'simulation'])
+
+    # Episodes counted after the warm-up cut of each variant, as in tracking_objective
+    warmup = np.minimum(variants['warmup'][:, None], counts[index][None, :] // 2) * cut[index][None, :]
+    mask = position[None, :] >= warmup
+
+    def per_trial(values):
+        out = np.zeros((len(episode_scores), n_trials))
+        for v in range(len(episode_scores)):
+            out[v] = np.bincount(index, weights=values[v], minlength=n_trials)
+        return out
+
+    n = per_trial(mask.astype(float))
+    mean = per_trial(episode_scores * mask) / n
+    var = per_trial((episode_scores - mean[:, index]) ** 2 * mask) / n
+    weight = variants['stability_weight'][:, None] * stable[None, :]
+    scores = mean * ((1 - weight) + weight * np.exp(-np.sqrt(var)))
+    return [(key.split("\0")[0], int(key.split("\0")[1])) for key in keys], scores
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-score stored episodes under other objective definitions.")
+    parser.add_argument('paths', nargs='*', default=['sessions'],
+                        help="session directories and/or results store directories")
+    for name, default in DEFAULT_VARIANT.items():
+        parser.add_argument(f"--{name.replace('_', '-')}", type=float, nargs='+', default=[default])
+    args = parser.parse_args()
+
+    tables = []
+    for path in args.paths:
+        if os.path.isdir(os.path.join(path, 'episodes')):
+            tables.append(EpisodeTable.from_results_store(path))
+        else:
+            tables.append(EpisodeTable.from_sessions(path))
+    table = EpisodeTable.concat(tables)
+    variants = variant_grid(**{name: getattr(args, name) for name in DEFAULT_VARIANT})
+    keys, scores = rescore_trials(table, variants)
+    print(f"{len(table)} episodes in {len(keys)} trials, {len(scores)} variants")
+
+    sources = sorted({source for source, _ in keys})
+    for v in range(len(scores)):
+        variant = ", ".join(f"{name}={variants[name][v]:g}" for name in DEFAULT_VARIANT)
+        print(f"\n{variant}")
+        for source in sources:
+            rows = [i for i, (s, _) in enumerate(keys) if s == source]
+            best = max(rows, key=lambda i: scores[v, i])
+            print(f"  {source}: best Trial #{keys[best][1]} ({scores[v, best]:.4f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+results_store.py
+
+Columnar store of finished sessions, replacing the optimization_<timestamp>.txt and results_<task>_<time>.txt
+text files. Each session is written as one Parquet file per table under the store directory:
+    - trials/<session>.parquet: one row per completed trial (TRIAL_SCHEMA),
+    - episodes/<session>.parquet: one row per episode with its raw metrics (EPISODE_SCHEMA),
+    - preferences/<session>.parquet: one row per answered preference query (PREFERENCE_SCHEMA).
+Readers select columns and sessions up front, so analysis reads only the columns it needs, even across
+hundreds of sessions.
+
+Main components:
+- TRIAL_SCHEMA / EPISODE_SCHEMA / PREFERENCE_SCHEMA: Arrow schemas of the three tables.
+- ResultsStore: Writes sessions and queries the tables.
+
+Usage:
+    store = ResultsStore()
+    episodes = store.read('episodes', columns=['session', 'performance'], filter=ds.field('warmup') == False)
+
+Dependencies: os, numpy, pyarrow.
+"""
+
+import os
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+TRIAL_SCHEMA = pa.schema([
+    ('session', pa.string()),
+    ('task_type', pa.string()),
+    ('trial', pa.int32()),
+    ('phase', pa.string()),
+    ('speed_factor', pa.float64()),
+    ('friction', pa.float64()),
+    ('value', pa.float64()),
+    ('avg_accuracy', pa.float64()),
+    ('avg_time', pa.float64()),
+    ('avg_performance', pa.float64()),
+    ('preference', pa.float64()),
+    ('n_episodes', pa.int32()),
+    ('noise_var', pa.float64()),
+    ('stop_reason', pa.string()),
+])
+
+EPISODE_SCHEMA = pa.schema([
+    ('session', pa.string()),
+    ('task_type', pa.string()),
+    ('trial', pa.int32()),
+    ('episode', pa.int32()),
+    ('warmup', pa.bool_()),
+    ('scenario_index', pa.int32()),
+    ('accuracy', pa.float64()),
+    ('time', pa.float64()),
+    ('performance', pa.float64()),
+    ('error', pa.float64()),
+    ('moving_time', pa.float64()),
+    ('jitter', pa.float64()),
+    ('completion_time', pa.float64()),
+    ('wall_time', pa.float64()),
+    ('distances', pa.list_(pa.float32())),
+    ('sampling_times', pa.list_(pa.float32())),
+])
+
+PREFERENCE_SCHEMA = pa.schema([
+    ('session', pa.string()),
+    ('query', pa.int32()),
+    ('winner', pa.int32()),
+    ('loser', pa.int32()),
+])
+
+SCHEMAS = {'trials': TRIAL_SCHEMA, 'episodes': EPISODE_SCHEMA, 'preferences': PREFERENCE_SCHEMA}
+
+
+class ResultsStore:
+    def __init__(self, directory='results_store'):
+        self.directory = directory
+
+    def _path(self, table, session):
+        return os.path.join(self.directory, table, f"{session}.parquet")
+
+    def write_session(self, session, trials=(), episodes=(), preferences=()):
+        """
+        Writes (or replaces) one session.
+
+        Args:
+            session (str): Session name, e.g. the study_name.
+            trials (list): Dicts with the TRIAL_SCHEMA columns; 'session' is filled in.
+            episodes (list): Episode records (objective.score_episode format) with 'trial', 'episode' and
+                'task_type' added; columns missing from a record are stored as null.
+            preferences (list): (winner, loser) trial numbers in the order they were answered.
+        """
+        rows = {
+            'trials': [{**t, 'session': session} for t in trials],
+            'episodes': [{'warmup': False, **e, 'session': session} for e in episodes],
+            'preferences': [{'session': session, 'query': i, 'winner': int(w), 'loser': int(l)}
+                            for i, (w, l) in enumerate(preferences)],
+        }
+        for table, records in rows.items():
+            schema = SCHEMAS[table]
+            columns = {name: [r.get(name) for r in records] for name in schema.names}
+            os.makedirs(os.path.join(self.directory, table), exist_ok=True)
+            pq.write_table(pa.table(columns, schema=schema), self._path(table, session))
+
+    def sessions(self):
+        names = set()
+        for table in SCHEMAS:
+            directory = os.path.join(self.directory, table)
+            if os.path.isdir(directory):
+                names.update(name[:-len('.parquet')] for name in os.listdir(directory) if name.endswith('.parquet'))
+        return sorted(names)
+
+    def read(self, table, columns=None, sessions=None, filter=None):
+        """
+        Reads a table as a pyarrow.Table.
+
+        Args:
+            table (str): 'trials', 'episodes' or 'preferences'.
+            columns (list): Columns to read; all by default. Only these are read from disk.
+            sessions (list): Sessions to read; all by default. Other files are not opened.
+            filter (pyarrow.compute.Expression): Row filter, e.g. ds.field('friction') > 0.98.
+        """
+        sessions = self.sessions() if sessions is None else sessions
+        paths = [self._path(table, s) for s in sessions if os.path.exists(self._path(table, s))]
+        if not paths:
+            schema = SCHEMAS[table]
+            return schema.empty_table().select(columns) if columns else schema.empty_table()
+        dataset = ds.dataset(paths, schema=SCHEMAS[table], format='parquet')
+        return dataset.to_table(columns=columns, filter=filter)
+
+    def scores(self, column='performance', sessions=None, include_warmup=False):
+        """{session: numpy array} of one episode column, in episode order."""
+        filter = None if include_warmup else ds.field('warmup') == False
+        data = self.read('episodes', columns=['session', column], sessions=sessions, filter=filter)
+        names = np.array(data.column('session').to_pylist(), dtype=object)
+        values = data.column(column).to_numpy(zero_copy_only=False).astype(float)
+        return {s: values[names == s] for s in dict.fromkeys(names)}
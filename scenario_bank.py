@@ -0,0 +1,95 @@
+"""
+scenario_bank.py
+
+Pre-generated task scenarios for common-random-number comparisons.
+Each episode normally draws a fresh start position, target, disturbance profile and jitter noise, so the
+difference between two parameter sets is easily swamped by the difference between their scenarios. A scenario
+bank fixes all of these per index; when episode i of every candidate uses scenario i, the candidates are compared
+on identical scenarios and fewer repeats are needed to separate them.
+
+A scenario holds:
+    - initial_angle: start angle of the cursor (tracking, aiming), radians.
+    - target_angle, target_distance: target position (aiming).
+    - bezier_time, bezier_speed: (2, 3) disturbance profile of the tracking task for x and y, as fractions of
+      the time windows and of the maximum speed, so they apply to any duration and speed.
+    - path_control: (2,) vertical offsets of the two path control points (path tracking), in [-1, 1].
+    - noise_seed: seed for the jitter noise of the episode.
+
+Main components:
+- ScenarioBank: Generates, saves (.npz) and loads scenarios; bank[i] returns scenario i as a dict.
+- bezier_points: The tracking task's disturbance points of a scenario for a given duration.
+- main: Command line generation of a bank file.
+
+Usage:
+    python scenario_bank.py --n 200 --seed 0 --out scenarios.npz
+
+Dependencies: argparse, numpy.
+"""
+
+import argparse
+
+import numpy as np
+
+
+class ScenarioBank:
+    FIELDS = ('initial_angle', 'target_angle', 'target_distance', 'bezier_time', 'bezier_speed',
+              'path_control', 'noise_seed')
+
+    def __init__(self, arrays):
+        self.arrays = {name: np.asarray(arrays[name]) for name in self.FIELDS}
+
+    @classmethod
+    def generate(cls, n=200, seed=0):
+        rng = np.random.default_rng(seed)
+        return cls({
+            'initial_angle': rng.uniform(0, 2 * np.pi, n),
+            'target_angle': rng.uniform(0, 2 * np.pi, n),
+            'target_distance': rng.uniform(100, 300, n),
+            'bezier_time': rng.uniform(0, 1, (n, 2, 3)),
+            'bezier_speed': rng.uniform(-1, 1, (n, 2, 3)),
+            'path_control': rng.uniform(-1, 1, (n, 2)),
+            'noise_seed': rng.integers(0, 2 ** 63, n, dtype=np.uint64),
+        })
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls({name: data[name] for name in cls.FIELDS})
+
+    def save(self, path):
+        np.savez_compressed(path, **self.arrays)
+
+    def __len__(self):
+        return len(self.arrays['initial_angle'])
+
+    def __getitem__(self, index):
+        """Scenario index (wrapping around the bank) as a dict of Python values and small arrays."""
+        i = int(index) % len(self)
+        scenario = {name: values[i] for name, values in self.arrays.items()}
+        scenario['index'] = i
+        scenario['noise_seed'] = int(scenario['noise_seed'])
+        return scenario
+
+
+def bezier_points(scenario, axis, duration, speed=4):
+    """The tracking task's disturbance points [(t1, v1), (t2, v2), (t3, v3)] for axis 0 (x) or 1 (y)."""
+    windows = [(0, int(duration / 3)),
+               (int(duration / 3) + 1, int(2 * duration / 3)),
+               (int(2 * duration / 3) + 1, duration)]
+    return [(float(low + u * (high - low)), float(v * speed))
+            for (low, high), u, v in zip(windows, scenario['bezier_time'][axis], scenario['bezier_speed'][axis])]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a scenario bank for common-random-number comparisons.")
+    parser.add_argument('--n', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', default='scenarios.npz')
+    args = parser.parse_args()
+
+    ScenarioBank.generate(args.n, args.seed).save(args.out)
+    print(f"Saved {args.n} scenarios to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+sequential_stopping.py
+
+Sequential early stopping for the episodes of one trial.
+Instead of a one-shot check after 5 episodes, the stopper is updated after every episode and stops the trial as
+soon as its mean episode score is confidently worse than the incumbent (or than an absolute floor), or confidently
+good enough, with configurable error rates. Every decision carries a stopping reason that is recorded on the trial.
+The posterior is taken over the episodes the trial would be scored on if it stopped now, i.e. after the same
+warm-up cut as tracking_objective, so that it is compared with an incumbent measured the same way and early
+learning effects do not count against the trial.
+
+Two tests are available:
+    - 'bayes': Student-t posterior on the trial's mean score (Jeffreys prior), with the within-trial noise pooled
+      with prior_noise_std from earlier trials so that the first few episodes are not over-trusted.
+      Stops as worse when P(mean < incumbent) >= 1 - alpha, as good enough when P(mean > good_enough) >= 1 - beta.
+    - 'sprt': Wald's sequential probability ratio test of mean = incumbent - delta (worse) against
+      mean = good_enough, with the noise level taken as prior_noise_std.
+
+Main components:
+- SequentialStopper: Per-trial stopping engine.
+- STOP_*, PRUNED: Stopping reasons, and those that prune the trial.
+
+Dependencies: numpy, scipy.
+"""
+
+import numpy as np
+from scipy import stats
+
+STOP_WORSE = 'worse_than_incumbent'
+STOP_FLOOR = 'below_floor'
+STOP_GOOD = 'good_enough'
+STOP_MAX = 'max_episodes'
+# Reasons of trials stopped because they are not worth finishing; they are told 0.0
+PRUNED = (STOP_WORSE, STOP_FLOOR)
+
+
+class SequentialStopper:
+    def __init__(self, incumbent=None, good_enough=None, floor=0.2, alpha=0.05, beta=0.1,
+                 min_episodes=3, max_episodes=20, prior_noise_std=0.1, prior_weight=2.0,
+                 method='bayes', delta=0.05, warmup=0, min_good_episodes=None):
+        """
+        Args:
+            incumbent (float): Mean score to beat, e.g. the best value so far; None disables the "worse" test.
+            good_enough (float): Mean score that needs no further episodes; defaults to the incumbent.
+            floor (float): Absolute score below which a trial is not worth finishing; None disables it.
+            alpha (float): Allowed probability of stopping a trial that is not actually worse.
+            beta (float): Allowed probability of accepting a trial that is not actually good enough.
+            min_episodes (int): Episodes before any decision.
+            min_good_episodes (int): Episodes before a trial can be accepted as good enough, so that its scored
+                window after the warm-up cut is not just one or two episodes; defaults to min_episodes.
+            max_episodes (int): Hard cap on episodes.
+            prior_noise_std (float): Episode noise level from earlier trials.
+            prior_weight (float): Pseudo-observations behind prior_noise_std in the pooled variance.
+            method (str): 'bayes' or 'sprt'.
+            delta (float): Indifference margin for 'sprt'.
+            warmup (int): Warm-up episodes left out of the posterior, at most half of the episodes so far (the cut
+                of the trial's score).
+        """
+        if method not in ('bayes', 'sprt'):
+            raise ValueError(f"Unknown method: {method}")
+        self.incumbent = incumbent
+        self.good_enough = incumbent if good_enough is None else good_enough
+        self.floor = floor
+        self.alpha = alpha
+        self.beta = beta
+        self.min_episodes = min_episodes
+        self.max_episodes = max_episodes
+        self.prior_noise_std = prior_noise_std
+        self.prior_weight = prior_weight
+        self.method = method
+        self.delta = delta
+        self.warmup = warmup
+        self.min_good_episodes = min_episodes if min_good_episodes is None else min_good_episodes
+
+        self.scores = []
+        self.reason = None
+        self.history = []
+
+    @property
+    def counted(self):
+        """The scores after the warm-up cut."""
+        return self.scores[min(self.warmup, len(self.scores) // 2):]
+
+    def posterior(self):
+        """Returns (mean, scale, dof) of the Student-t posterior on the trial's mean score."""
+        counted = self.counted
+        n = len(counted)
+        mean = float(np.mean(counted))
+        ss = float(np.sum((np.asarray(counted) - mean) ** 2))
+        dof = n - 1 + self.prior_weight
+        pooled_var = (ss + self.prior_weight * self.prior_noise_std ** 2) / dof
+        return mean, np.sqrt(pooled_var / n), dof
+
+    def prob_below(self, threshold):
+        mean, scale, dof = self.posterior()
+        return float(stats.t.cdf((threshold - mean) / scale, dof))
+
+    def _bayes_decision(self):
+        if self.floor is not None and self.prob_below(self.floor) >= 1 - self.alpha:
+            return STOP_FLOOR
+        if self.incumbent is not None and self.prob_below(self.incumbent) >= 1 - self.alpha:
+            return STOP_WORSE
+        if self.good_enough is not None and 1 - self.prob_below(self.good_enough) >= 1 - self.beta:
+            return STOP_GOOD
+        return None
+
+    def _sprt_decision(self):
+        if self.floor is not None and self.prob_below(self.floor) >= 1 - self.alpha:
+            return STOP_FLOOR
+        if self.incumbent is None:
+            return None
+        mu_good = self.good_enough
+        mu_worse = self.incumbent - self.delta
+        x = np.asarray(self.counted)
+        llr = np.sum((x - mu_worse) ** 2 - (x - mu_good) ** 2) / (2 * self.prior_noise_std ** 2)
+        if llr >= np.log((1 - self.beta) / self.alpha):
+            return STOP_GOOD
+        if llr <= np.log(self.beta / (1 - self.alpha)):
+            return STOP_WORSE
+        return None
+
+    def update(self, score):
+        """Adds one episode score; returns the stopping reason, or None to keep running episodes."""
+        self.scores.append(float(score))
+        n = len(self.scores)
+
+        reason = None
+        if n >= self.min_episodes:
+            reason = self._bayes_decision() if self.method == 'bayes' else self._sprt_decision()
+            if reason == STOP_GOOD and n < self.min_good_episodes:
+                reason = None
+        if reason is None and n >= self.max_episodes:
+            reason = STOP_MAX
+
+        mean, scale, _ = self.posterior()
+        self.history.append({'n': n, 'mean': mean, 'scale': scale, 'reason': reason})
+        self.reason = reason
+        return reason
+
+    @property
+    def pruned(self):
+        return self.reason in PRUNED
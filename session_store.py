@@ -0,0 +1,139 @@
+"""
+session_store.py
+
+Durable, resumable storage for optimization sessions.
+Each session lives in its own directory:
+    - study.log: Optuna journal storage for the study (or any Optuna RDB URL passed as storage_url).
+    - session.jsonl: Append-only sidecar for what Optuna does not hold: run configuration, trial parameters in
+      trial-number order, every episode record, detailed scores, preference-model state and the convergence
+      criteria after every trial.
+Every record is flushed and fsync'ed when written, so a crash or a participant break loses at most the episode
+that was running.
+
+Main components:
+- SessionStore: Opens/creates the study and appends/loads sidecar records.
+- SessionState: Everything rebuilt from a session directory by SessionStore.load().
+
+Dependencies: os, json, time, optuna, numpy.
+"""
+
+import json
+import os
+import time
+
+import numpy as np
+import optuna
+from optuna.storages import JournalStorage
+from optuna.storages.journal import JournalFileBackend
+
+
+def _to_json(value):
+    if isinstance(value, dict):
+        return {str(k): _to_json(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_to_json(v) for v in value]
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+class SessionState:
+    def __init__(self):
+        self.config = {}
+        self.trial_history = []
+        self.episodes = {}
+        self.detailed_scores = {}
+        self.comparison_history = []
+        self.similar_pairs = []
+        self.utilities = None
+        self.convergence = []
+
+
+class SessionStore:
+    def __init__(self, study_name, directory='sessions', storage_url=None):
+        self.study_name = study_name
+        self.directory = os.path.join(directory, study_name)
+        os.makedirs(self.directory, exist_ok=True)
+        self.sidecar_path = os.path.join(self.directory, 'session.jsonl')
+
+        if storage_url is None:
+            self.storage = JournalStorage(JournalFileBackend(os.path.join(self.directory, 'study.log')))
+        else:
+            self.storage = storage_url
+
+    def create_study(self, name=None, direction='maximize', sampler=None):
+        """Creates the study, or loads it with all finished trials if it already exists."""
+        return optuna.create_study(
+            study_name=name or self.study_name,
+            storage=self.storage,
+            direction=direction,
+            sampler=sampler,
+            load_if_exists=True,
+        )
+
+    def append(self, kind, **record):
+        record = {'kind': kind, 'time': time.time(), **_to_json(record)}
+        with open(self.sidecar_path, 'a') as f:
+            f.write(json.dumps(record) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def log_config(self, **config):
+        self.append('config', **config)
+
+    def log_trial_params(self, trial_number, params):
+        self.append('trial', trial_number=trial_number, params=params)
+
+    def log_episode(self, trial_number, episode):
+        self.append('episode', trial_number=trial_number, episode=episode)
+
+    def log_detailed_scores(self, trial_number, scores):
+        self.append('scores', trial_number=trial_number, scores=scores)
+
+    def log_preferences(self, pref_model):
+        self.append('preferences',
+                    comparison_history=pref_model.comparison_history,
+                    similar_pairs=pref_model.similar_pairs,
+                    utilities=pref_model.utilities)
+
+    def log_convergence(self, record):
+        self.append('convergence', **record)
+
+    def load(self):
+        state = SessionState()
+        if not os.path.exists(self.sidecar_path):
+            return state
+
+        params_by_trial = {}
+        with open(self.sidecar_path, 'r') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # A crash during the write of the final line leaves it truncated
+                    continue
+
+                kind = record['kind']
+                if kind == 'config':
+                    state.config.update({k: v for k, v in record.items() if k not in ('kind', 'time')})
+                elif kind == 'trial':
+                    params_by_trial[record['trial_number']] = record['params']
+                elif kind == 'episode':
+                    state.episodes.setdefault(record['trial_number'], []).append(record['episode'])
+                elif kind == 'scores':
+                    state.detailed_scores[record['trial_number']] = record['scores']
+                elif kind == 'preferences':
+                    state.comparison_history = [tuple(c) for c in record['comparison_history']]
+                    state.similar_pairs = [tuple(p) for p in record['similar_pairs']]
+                    state.utilities = record['utilities']
+                elif kind == 'convergence':
+                    state.convergence.append({k: v for k, v in record.items() if k not in ('kind', 'time')})
+
+        if params_by_trial:
+            state.trial_history = [params_by_trial.get(n) for n in range(max(params_by_trial) + 1)]
+        return state
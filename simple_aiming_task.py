@@ -9,7 +9,9 @@ After updating the screen scheduling, sometimes running the environments on a si
 will result in a splash screen bug, for which no valid code solution has been found. For this issue, it is recommended to use an external monitor as a display
 window for the game environment.
 
-All environments randomly change mission parameter settings (e.g., location, path, etc.) on reset.
+All environments randomly change mission parameter settings (e.g., location, path, etc.) on reset,
+unless they are given a scenario from a scenario bank (see scenario_bank.py), which fixes them per index.
+Each reticle draws from its own numpy Generator (rng), never from the global random state (see random_streams.py).
 Specifically, there is a Bessel-based external force effect in the tracking task, see near the tenth
 line of simple_tracking_task.py: enable_bezier
 This effect is off by default, and will be applied when passed a parameter of true.
@@ -21,7 +23,7 @@ Main components:
 - AimingTask: Manages the aiming task session, input handling, and performance metrics.
 - main: Example entry point to run the aiming task and print results.
 
-Dependencies: pyglet, pygame, numpy, math, random, time.
+Dependencies: pyglet, pygame, numpy, math, time, custom modules (random_streams).
 """
 
 import time
@@ -29,16 +31,20 @@ import numpy as np
 import pyglet
 from pyglet.window import key
 import math
-import random
 import pygame
+from random_streams import JitterStream
 
 class SimpleReticle:
-    def __init__(self, window_width, window_height, friction=0.94, speed_factor=7, duration=15):
+    def __init__(self, window_width, window_height, friction=0.94, speed_factor=7, duration=15, scenario=None, rng=None):
         self.window_width = window_width
         self.window_height = window_height
         self.center_x = window_width // 2
         self.center_y = window_height // 2
         self.duration = duration
+        if rng is None:
+            rng = np.random.default_rng(scenario['noise_seed'] if scenario is not None else None)
+        self.rng = rng
+        self.jitter = JitterStream(self.rng)
 
         self.target_radius = 20
         self.target_center_radius = 3
@@ -46,8 +52,12 @@ class SimpleReticle:
         self.cursor_x = 0
         self.cursor_y = 0
 
-        angle = random.uniform(0, 2 * math.pi)
-        distance = random.uniform(100, 300)
+        if scenario is not None:
+            angle = float(scenario['target_angle'])
+            distance = float(scenario['target_distance'])
+        else:
+            angle = self.rng.uniform(0, 2 * math.pi)
+            distance = self.rng.uniform(100, 300)
         self.target_x = distance * math.cos(angle)
         self.target_y = distance * math.sin(angle)
 
@@ -91,7 +101,10 @@ class SimpleReticle:
         self.friction = friction
         self.speed_factor = speed_factor
 
-        initial_angle = random.uniform(0, 2 * math.pi)
+        if scenario is not None:
+            initial_angle = float(scenario['initial_angle'])
+        else:
+            initial_angle = self.rng.uniform(0, 2 * math.pi)
         initial_x = 180 * math.cos(initial_angle)
         initial_y = 180 * math.sin(initial_angle)
         
@@ -103,8 +116,7 @@ class SimpleReticle:
 
     def update(self, dt, joystick_x=0, joystick_y=0, jitter_val=0.01):
         speed_factor = self.speed_factor
-        jitter_x = np.random.normal(0, jitter_val)
-        jitter_y = np.random.normal(0, jitter_val)
+        jitter_x, jitter_y = self.jitter.next(jitter_val)
 
         target_vx = joystick_x * speed_factor * 60
         target_vy = -joystick_y * speed_factor * 60
@@ -167,7 +179,7 @@ class SimpleReticle:
         self.batch.draw()
 
 class AimingTask:
-    def __init__(self, duration=15, sampling_rate=20, friction=0.94, speed_factor=9):
+    def __init__(self, duration=15, sampling_rate=20, friction=0.94, speed_factor=9, scenario=None, rng=None):
         self.duration = duration
         self.sampling_interval = 1.0 / sampling_rate
 
@@ -194,7 +206,7 @@ class AimingTask:
 
         self.reticle = SimpleReticle(
             self.window.width, self.window.height, 
-            friction, speed_factor, self.duration
+            friction, speed_factor, self.duration, scenario, rng
         )
 
         self.initial_distance = self.reticle.initial_distance
@@ -9,7 +9,9 @@ After updating the screen scheduling, sometimes running the environments on a si
 will result in a splash screen bug, for which no valid code solution has been found. For this issue, it is recommended to use an external monitor as a display
 window for the game environment.
 
-All environments randomly change mission parameter settings (e.g., location, path, etc.) on reset.
+All environments randomly change mission parameter settings (e.g., location, path, etc.) on reset,
+unless they are given a scenario from a scenario bank (see scenario_bank.py), which fixes them per index.
+Each reticle draws from its own numpy Generator (rng), never from the global random state (see random_streams.py).
 Specifically, there is a Bessel-based external force effect in the tracking task, see near the tenth
 line of simple_tracking_task.py: enable_bezier
 This effect is off by default, and will be applied when passed a parameter of true.
@@ -21,7 +23,7 @@ Main components:
 - PathTrackingTask: Manages the path tracking session, input handling, and performance metrics.
 - main: Example entry point to run the path tracking task and print results.
 
-Dependencies: pyglet, pygame, numpy, math, random, time.
+Dependencies: pyglet, pygame, numpy, math, time.
 """
 
 import time
@@ -29,16 +31,18 @@ import numpy as np
 import pyglet
 from pyglet.window import key
 import math
-import random
 import pygame
 
 class PathReticle:
-    def __init__(self, window_width, window_height, friction=0.94, speed_factor=7, duration=15):
+    def __init__(self, window_width, window_height, friction=0.94, speed_factor=7, duration=15, scenario=None, rng=None):
         self.window_width = window_width
         self.window_height = window_height
         self.center_x = window_width // 2
         self.center_y = window_height // 2
         self.duration = duration
+        if rng is None:
+            rng = np.random.default_rng(scenario['noise_seed'] if scenario is not None else None)
+        self.rng = rng
 
         self.path_width = 45
         self.cursor_x = 0
@@ -56,6 +60,7 @@ class PathReticle:
         self.target_color = (220, 220, 220)
         self.target_border_color = (255, 0, 0)
 
+        self.scenario = scenario
         self.control_points = self._generate_control_points()
         self.path_points = self._generate_path_points()
 
@@ -117,12 +122,17 @@ class PathReticle:
         start_y = center_y
         points.append((start_x, start_y))
 
+        if self.scenario is not None:
+            offset1, offset2 = (int(round(200 * u)) for u in self.scenario['path_control'])
+        else:
+            offset1, offset2 = (int(v) for v in self.rng.integers(-200, 201, 2))
+
         control1_x = center_x - 200
-        control1_y = random.randint(center_y - 200, center_y + 200)
+        control1_y = center_y + offset1
         points.append((control1_x, control1_y))
 
         control2_x = center_x + 200
-        control2_y = random.randint(center_y - 200, center_y + 200)
+        control2_y = center_y + offset2
         points.append((control2_x, control2_y))
 
         end_x = center_x + 400
@@ -244,7 +254,7 @@ class PathReticle:
         return distance <= self.target_radius
 
 class PathTrackingTask:
-    def __init__(self, duration=15, sampling_rate=20, friction=0.94, speed_factor=9):
+    def __init__(self, duration=15, sampling_rate=20, friction=0.94, speed_factor=9, scenario=None, rng=None):
         self.duration = duration
         self.sampling_interval = 1.0 / sampling_rate
         self.center_x = 0
@@ -275,7 +285,7 @@ class PathTrackingTask:
         self.center_y = self.window.height // 2
 
         self.reticle = PathReticle(self.window.width, self.window.height, 
-                                  friction, speed_factor, self.duration)
+                                  friction, speed_factor, self.duration, scenario, rng)
 
         self.distances = []
         self.sampling_times = []
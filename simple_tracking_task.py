@@ -9,7 +9,9 @@ After updating the screen scheduling, sometimes running the environments on a si
 will result in a splash screen bug, for which no valid code solution has been found. For this issue, it is recommended to use an external monitor as a display
 window for the game environment.
 
-All environments randomly change mission parameter settings (e.g., location, path, etc.) on reset.
+All environments randomly change mission parameter settings (e.g., location, path, etc.) on reset,
+unless they are given a scenario from a scenario bank (see scenario_bank.py), which fixes them per index.
+Each reticle draws from its own numpy Generator (rng), never from the global random state (see random_streams.py).
 Specifically, there is a Bessel-based external force effect in the tracking task, see near the tenth
 line of simple_tracking_task.py: enable_bezier
 This effect is off by default, and will be applied when passed a parameter of true.
@@ -21,7 +23,7 @@ Main components:
 - TrackingTask: Manages the tracking task session, input handling, and performance metrics.
 - main: Example entry point to run the tracking task and print results.
 
-Dependencies: pyglet, pygame, numpy, math, random, time.
+Dependencies: pyglet, pygame, numpy, math, time, custom modules (scenario_bank, random_streams).
 """
 
 import time
@@ -29,16 +31,22 @@ import numpy as np
 import pyglet
 from pyglet.window import key
 import math
-import random
 import pygame
+from scenario_bank import bezier_points
+from random_streams import JitterStream
 
 class SimpleReticle:
-    def __init__(self, window_width, window_height, friction=0.94, speed_factor=7, duration=15, enable_bezier=False):
+    def __init__(self, window_width, window_height, friction=0.94, speed_factor=7, duration=15, enable_bezier=False,
+                 scenario=None, rng=None):
         self.window_width = window_width
         self.window_height = window_height
         self.center_x = window_width // 2
         self.center_y = window_height // 2
         self.duration = duration
+        if rng is None:
+            rng = np.random.default_rng(scenario['noise_seed'] if scenario is not None else None)
+        self.rng = rng
+        self.jitter = JitterStream(self.rng)
 
         self.target_radius = 25
 
@@ -96,7 +104,10 @@ class SimpleReticle:
         self.friction = friction
         self.speed_factor = speed_factor
 
-        initial_angle = random.uniform(0, 2 * math.pi)
+        if scenario is not None:
+            initial_angle = float(scenario['initial_angle'])
+        else:
+            initial_angle = self.rng.uniform(0, 2 * math.pi)
         initial_x = 180 * math.cos(initial_angle)
         initial_y = 180 * math.sin(initial_angle)
         
@@ -105,18 +116,20 @@ class SimpleReticle:
         self.cursor_position = (initial_x, initial_y)
         self.update_cursor_position(*self.cursor_position)
         if self.enable_bezier:
-            self.bezier_points_x = self._generate_bezier_points()
-            self.bezier_points_y = self._generate_bezier_points()
+            if scenario is not None:
+                self.bezier_points_x = bezier_points(scenario, 0, self.duration)
+                self.bezier_points_y = bezier_points(scenario, 1, self.duration)
+            else:
+                self.bezier_points_x = self._generate_bezier_points()
+                self.bezier_points_y = self._generate_bezier_points()
         self.start_time = time.time()
 
     def _generate_bezier_points(self, speed=4):
-        t1 = random.uniform(0, int(self.duration/3))
-        t2 = random.uniform(int(self.duration/3)+1, int(2*self.duration/3))
-        t3 = random.uniform(int(2*self.duration/3)+1, self.duration)
+        t1 = self.rng.uniform(0, int(self.duration/3))
+        t2 = self.rng.uniform(int(self.duration/3)+1, int(2*self.duration/3))
+        t3 = self.rng.uniform(int(2*self.duration/3)+1, self.duration)
 
-        v1 = random.uniform(-speed, speed)
-        v2 = random.uniform(-speed, speed)
-        v3 = random.uniform(-speed, speed)
+        v1, v2, v3 = self.rng.uniform(-speed, speed, 3)
         
         return [(t1, v1), (t2, v2), (t3, v3)]
     
@@ -135,8 +148,7 @@ class SimpleReticle:
     def update(self, dt, joystick_x=0, joystick_y=0, jitter_val=0.01):
 
         speed_factor = self.speed_factor
-        jitter_x = np.random.normal(0, jitter_val)
-        jitter_y = np.random.normal(0, jitter_val)
+        jitter_x, jitter_y = self.jitter.next(jitter_val)
 
         target_vx = joystick_x * speed_factor * 60
         target_vy = -joystick_y * speed_factor * 60
@@ -201,7 +213,8 @@ class SimpleReticle:
         self.batch.draw()
 
 class TrackingTask:
-    def __init__(self, duration=15, sampling_rate=20, friction=0.94, speed_factor=9, enable_bezier=True):
+    def __init__(self, duration=15, sampling_rate=20, friction=0.94, speed_factor=9, enable_bezier=True, scenario=None,
+                 rng=None):
         self.duration = duration
         self.sampling_interval = 1.0 / sampling_rate
 
@@ -228,7 +241,8 @@ class TrackingTask:
             caption="Tracking Task"
         )
 
-        self.reticle = SimpleReticle(self.window.width, self.window.height, friction, speed_factor, self.duration, enable_bezier)
+        self.reticle = SimpleReticle(self.window.width, self.window.height, friction, speed_factor, self.duration, enable_bezier,
+                                     scenario, rng)
 
         self.first_target_entry_time = None
         self.distances = []
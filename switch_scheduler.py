@@ -0,0 +1,199 @@
+"""
+switch_scheduler.py
+
+Switching-cost-aware scheduling of physical joystick configurations.
+A virtual parameter change is free, but every keycap or rocker swap (see switch_ui.show_switch_prompt) costs the
+experimenter minutes. SwitchScheduler therefore
+    - scores candidate configurations by expected improvement per second, where the seconds are the hardware
+      switch from the previous configuration plus the evaluation itself (EI per unit cost),
+    - picks a batch of configurations at once (the GP believes its own mean at already picked ones), and
+    - orders the batch so that the number and cost of swaps is minimal,
+and reports the expected session wall-time of the batch next to its expected improvement.
+
+Main components:
+- SwitchCost: Seconds needed to go from one physical configuration to another.
+- SwitchScheduler: Plans ordered batches of physical configurations for an Optuna study.
+
+Dependencies: itertools, numpy, scikit-learn, optuna, custom modules (acquisition).
+"""
+
+import itertools
+
+import numpy as np
+import optuna
+from sklearn.gaussian_process import GaussianProcessRegressor
+from sklearn.gaussian_process.kernels import ConstantKernel, Matern
+
+from acquisition import expected_improvement, sobol_candidates
+
+
+class SwitchCost:
+    def __init__(self, cap_swap_s=60.0, rocker_swap_s=180.0, cap_param='cap_type', tolerance_mm=0.5):
+        """
+        Args:
+            cap_swap_s (float): Seconds to change the keycap (type or size).
+            rocker_swap_s (float): Seconds to change the rocker.
+            cap_param (str): Name of the keycap type parameter ('cap_type' or 'keycap_type').
+            tolerance_mm (float): Length changes below this are not worth a swap.
+        """
+        self.cap_swap_s = cap_swap_s
+        self.rocker_swap_s = rocker_swap_s
+        self.cap_param = cap_param
+        self.tolerance_mm = tolerance_mm
+
+    def __call__(self, current, target):
+        if current is None:
+            return self.cap_swap_s + self.rocker_swap_s
+        cost = 0.0
+        if (current[self.cap_param] != target[self.cap_param]
+                or abs(current['cap_size'] - target['cap_size']) > self.tolerance_mm):
+            cost += self.cap_swap_s
+        if abs(current['rocker_length'] - target['rocker_length']) > self.tolerance_mm:
+            cost += self.rocker_swap_s
+        return cost
+
+
+class SwitchScheduler:
+    def __init__(self, study, cap_types=(1, 2, 3, 4, 5), cap_param='cap_type', rocker_range=(5.0, 50.0),
+                 cap_size_range=(6.0, 57.0), evaluation_s=600.0, cost=None, n_candidates=256,
+                 n_startup_trials=3, seed=None):
+        """
+        Args:
+            study (optuna.Study): Outer study over the physical parameters (direction 'maximize').
+            cap_types (tuple): Allowed keycap types.
+            cap_param (str): Name of the keycap type parameter in the study.
+            rocker_range (tuple): (low, high) rocker length in mm.
+            cap_size_range (tuple): (low, high) cap size in mm.
+            evaluation_s (float): Seconds one configuration takes to evaluate (its inner optimization).
+            cost (SwitchCost): Switch cost model; defaults to SwitchCost(cap_param=cap_param).
+            n_candidates (int): Continuous candidates per keycap type.
+            n_startup_trials (int): Completed trials needed before the GP is used.
+            seed (int): Seed for the candidate sets.
+        """
+        self.study = study
+        self.cap_types = list(cap_types)
+        self.cap_param = cap_param
+        self.bounds = np.array([rocker_range, cap_size_range], dtype=float)
+        self.evaluation_s = evaluation_s
+        self.cost = cost or SwitchCost(cap_param=cap_param)
+        self.n_candidates = n_candidates
+        self.n_startup_trials = n_startup_trials
+        self.rng = np.random.default_rng(seed)
+
+    def _encode(self, configs):
+        """Unit-cube rocker length and cap size, plus a one-hot keycap type."""
+        rows = []
+        for c in configs:
+            lengths = (np.array([c['rocker_length'], c['cap_size']]) - self.bounds[:, 0]) / (self.bounds[:, 1] - self.bounds[:, 0])
+            one_hot = np.array([float(c[self.cap_param] == t) for t in self.cap_types])
+            rows.append(np.concatenate([lengths, one_hot]))
+        return np.array(rows).reshape(len(configs), 2 + len(self.cap_types))
+
+    def _candidates(self, current):
+        unit = sobol_candidates(2, self.n_candidates, self.rng)
+        values = self.bounds[:, 0] + unit * (self.bounds[:, 1] - self.bounds[:, 0])
+        configs = [{self.cap_param: t, 'rocker_length': float(r), 'cap_size': float(s)}
+                   for t in self.cap_types for r, s in values]
+        if current is not None:
+            # Configurations that keep the current keycap or the current rocker need only one swap
+            for r, s in values:
+                configs.append({**current, 'rocker_length': float(r)})
+                configs.append({**current, self.cap_param: self.cap_types[int(self.rng.integers(len(self.cap_types)))],
+                                'cap_size': float(s)})
+        return configs
+
+    def _fit(self, X, y, kernel=None):
+        if kernel is None:
+            kernel = ConstantKernel(1.0) * Matern(length_scale=np.full(X.shape[1], 0.5), nu=2.5)
+            optimizer = 'fmin_l_bfgs_b'
+        else:
+            optimizer = None
+        gp = GaussianProcessRegressor(kernel=kernel, alpha=1e-4, normalize_y=True,
+                                      optimizer=optimizer, n_restarts_optimizer=2, random_state=42)
+        return gp.fit(X, y)
+
+    def order(self, current, configs):
+        """Execution order of configs with the least total switch time, starting from current."""
+        def total(sequence):
+            path = [current] + list(sequence)
+            return sum(self.cost(a, b) for a, b in zip(path[:-1], path[1:]))
+
+        if len(configs) <= 7:
+            return list(min(itertools.permutations(configs), key=total))
+
+        # Nearest neighbour for larger batches
+        remaining = list(configs)
+        ordered = []
+        position = current
+        while remaining:
+            nearest = min(remaining, key=lambda c: self.cost(position, c))
+            remaining.remove(nearest)
+            ordered.append(nearest)
+            position = nearest
+        return ordered
+
+    def plan(self, current=None, q=3):
+        """
+        Plans the next q physical configurations.
+
+        Args:
+            current (dict): Configuration currently mounted, None if unknown.
+            q (int): Batch size.
+
+        Returns:
+            tuple: (schedule, expected_wall_time_s), where schedule lists
+                {'params', 'switch_s', 'expected_improvement'} in execution order.
+        """
+        trials = [t for t in self.study.get_trials(deepcopy=False, states=(optuna.trial.TrialState.COMPLETE,))
+                  if all(name in t.params for name in (self.cap_param, 'rocker_length', 'cap_size'))]
+        candidates = self._candidates(current)
+        X_cand = self._encode(candidates)
+
+        picked, eis = [], []
+        if len(trials) < self.n_startup_trials:
+            for i in self.rng.choice(len(candidates), size=q, replace=False):
+                picked.append(candidates[i])
+                eis.append(None)
+        else:
+            X = self._encode([t.params for t in trials])
+            y = np.array([t.value for t in trials], dtype=float)
+            gp = self._fit(X, y)
+            kernel = gp.kernel_
+            best = np.max(y)
+            position = current
+            for _ in range(q):
+                mu, sigma = gp.predict(X_cand, return_std=True)
+                ei = expected_improvement(mu, sigma, best)
+                seconds = self.evaluation_s + np.array([self.cost(position, c) for c in candidates])
+                i = int(np.argmax(ei / seconds))
+                picked.append(candidates[i])
+                eis.append(float(ei[i]))
+
+                # Kriging believer: the GP's own mean stands in for the pending result
+                X = np.vstack([X, X_cand[i]])
+                y = np.append(y, mu[i])
+                gp = self._fit(X, y, kernel=kernel)
+                position = candidates[i]
+
+        ei_by_config = {id(c): e for c, e in zip(picked, eis)}
+        schedule = []
+        position = current
+        for config in self.order(current, picked):
+            switch_s = self.cost(position, config)
+            schedule.append({'params': config, 'switch_s': switch_s,
+                             'expected_improvement': ei_by_config[id(config)]})
+            position = config
+        wall_time = sum(s['switch_s'] for s in schedule) + self.evaluation_s * len(schedule)
+        return schedule, wall_time
+
+    @staticmethod
+    def report(schedule, wall_time):
+        print("\n" + "=" * 50)
+        print("Planned physical configurations:")
+        for i, step in enumerate(schedule):
+            ei = step['expected_improvement']
+            print(f"  {i+1}. {step['params']} switch {step['switch_s'] / 60:.1f} min, "
+                  f"EI {'n/a' if ei is None else f'{ei:.4f}'}")
+        n_swaps = sum(1 for s in schedule if s['switch_s'] > 0)
+        print(f"Expected wall-time: {wall_time / 60:.1f} min ({n_swaps} swaps)")
+        print("=" * 50)
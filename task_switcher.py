@@ -4,31 +4,33 @@ task_switcher.py
 To enable better integration of all environments (tracking, aiming, path tracking) in the optimizer,
 TaskSwitcher (task_switcher.py) is introduced, which can be used to quickly switch between task environments
 by passing parameters.
+With a scenario bank (see scenario_bank.py), a "scenario_index" parameter selects the scenario the task runs,
+so that different parameter sets can be evaluated on identical scenarios.
+Without a scenario, every task gets its own numpy Generator spawned from the switcher's SeedSequence, so a run
+is reproducible from that sequence (see random_streams.py).
 
 Main components:
-- TaskType: Enum defining supported task types.
+- TaskType: Enum defining supported task types (defined in task_types.py).
 - TaskSwitcher: Class for running tasks with specified or default parameters.
 - main: Example usage for running all supported tasks.
 
-Dependencies: simple_tracking_task, simple_aiming_task, path_tracking, time, enum, typing.
+Dependencies: simple_tracking_task, simple_aiming_task, path_tracking, task_types, time, typing, numpy.
 """
 
 import time
-from enum import Enum
 from typing import Dict, Any, Optional, Tuple
 
+import numpy as np
+
 from simple_tracking_task import TrackingTask
 from simple_aiming_task import AimingTask
 from simple_path_tracking_task import PathTrackingTask
-
-class TaskType(Enum):
-    TRACKING = "tracking"
-    AIMING = "aiming"
-    PATH_TRACKING = "path_tracking"
-
+from task_types import TaskType
 
 class TaskSwitcher:
-    def __init__(self):
+    def __init__(self, scenario_bank=None, seed_sequence=None):
+        self.scenario_bank = scenario_bank
+        self.seed_sequence = seed_sequence if seed_sequence is not None else np.random.SeedSequence()
         self.default_params = {
             TaskType.TRACKING: {
                 "duration": 15,
@@ -67,10 +69,21 @@ class TaskSwitcher:
             merged_params.update(params)
             params = merged_params
 
+        scenario_index = params.pop("scenario_index", None)
+        if scenario_index is not None and self.scenario_bank is not None:
+            params["scenario"] = self.scenario_bank[scenario_index]
+        if "scenario" not in params and "rng" not in params:
+            params["rng"] = np.random.default_rng(self.seed_sequence.spawn(1)[0])
+
         print(f"\n{'='*50}")
         print(f"Starting {task_type.value} task with parameters:")
         for key, value in params.items():
-            print(f"{key}: {value}")
+            if key == "scenario":
+                print(f"scenario: #{value['index']}")
+            elif key == "rng":
+                continue
+            else:
+                print(f"{key}: {value}")
         print(f"{'='*50}\n")
 
         if task_type == TaskType.TRACKING:
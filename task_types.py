@@ -0,0 +1,19 @@
+"""
+task_types.py
+
+Task type enum, kept apart from task_switcher.py so that modules which only need the task names (the study
+catalog, the multi-task sampler) do not import the pygame/pyglet task environments.
+
+Main components:
+- TaskType: Enum defining supported task types.
+
+Dependencies: enum.
+"""
+
+from enum import Enum
+
+
+class TaskType(Enum):
+    TRACKING = "tracking"
+    AIMING = "aiming"
+    PATH_TRACKING = "path_tracking"
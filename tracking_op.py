@@ -9,31 +9,67 @@ In run_tracking_optimization(), you can configure the parameters:
     - n_trials: total number of sampling optimizations performed
     - n_initial_samples: in order to prevent local optimization, the number of the initial collection of random data.
     - n_repeats: the number of times the same set of parameters is repeated to validate the collection of data in order to
-    prevent chance values from interfering during the initial random sampling.
+    prevent chance values from interfering during the initial random sampling. This is the average: the episodes
+    of the initial samples are allocated adaptively (see allocation.py).
+    - session_budget_s: optional total episode time for the session; trials get fewer episodes as it runs out.
+    - transfer_dir: optional directory of finished sessions (any task type), or a catalog of them (see catalog.py),
+    that warm-start a multi-task GP sampler (see multitask_sampler.py), in which case fewer random initial samples
+    are used.
+    - scenario_bank: optional scenario bank file (see scenario_bank.py); episode i of every trial then runs
+    scenario i, so trials are compared on identical scenarios.
+    - preference_sampler: in pair mode, propose trials with a GP preference model over the parameters next to a
+    performance GP (see preference_sampler.py), so preferences steer the search before trials are run.
+    - convergence_threshold: the session ends before n_trials once the maximum expected improvement drops below
+    it and the best trial has stopped changing (see convergence.py); None always runs n_trials.
 
 Main components:
 - tracking_objective: Objective function for performance and preference parameter optimization.
 - run_tracking_optimization: Main entry point for running the optimization workflow.
+- resume_tracking_optimization: Continues a persisted session after a crash or a break.
 - run_verification_trial: Utility for preference verification between trials.
 
-Dependencies: optuna, pygame, numpy, pyglet, custom modules (objective, simple_tracking_task, selectUI, task_switcher).
+Sessions are checkpointed after every episode (see session_store.py), under their study_name or a timestamped
+name, and can be continued with resume_tracking_optimization(study_name) without re-running finished episodes.
+The raw metrics of every episode are kept there, so sessions can be re-scored later (see rescoring.py).
+
+Dependencies: optuna, pygame, numpy, pyglet, custom modules (objective, simple_tracking_task, selectUI, task_switcher,
+session_store, sequential_stopping, allocation, multitask_sampler, scenario_bank, random_streams, convergence,
+preference_queries, preference_sampler, results_store, catalog, acquisition).
 """
 
 import optuna
 import pyglet
-from objective import PerformanceModel, error_calc, PreferenceModel
+from objective import NoiseModel, PerformanceModel, PreferenceModel, score_episode, summarize_episodes, stability_score
+from sequential_stopping import SequentialStopper, STOP_MAX
+from allocation import EpisodeAllocator
+from catalog import Catalog
+from multitask_sampler import MultiTaskGPSampler, observations_from_sessions
+from scenario_bank import ScenarioBank
+from random_streams import trial_seed_sequence
+from convergence import ConvergenceMonitor
+from preference_queries import PreferenceQuerySelector
+from preference_sampler import PreferenceGPSampler
+from results_store import ResultsStore
 from simple_tracking_task import TrackingTask
+import os
 import time
 import pygame
 import numpy as np
 from selectUI import get_user_preference
 from task_switcher import TaskSwitcher, TaskType
+from session_store import SessionStore
+from acquisition import SEARCH_SPACE
 
 pygame.init()
 pygame.joystick.init()
 
 detailed_scores = {}
 
+# Episodes discarded as warm-up from an optimization trial's score (at most half of its episodes), and episodes
+# before a trial can be accepted as good enough, so that at least 5 episodes remain after the cut
+WARMUP_EPISODES = 10
+MIN_GOOD_EPISODES = 10
+
 if pygame.joystick.get_count() > 0:
     joystick = pygame.joystick.Joystick(0)
     joystick.init()
@@ -42,7 +78,10 @@ else:
     print("No Joystick Detected")
     pygame.quit()
 
-def tracking_objective(trial, pref_model, trial_history, task_type=TaskType.TRACKING):
+def tracking_objective(trial, pref_model, trial_history, task_type=TaskType.TRACKING, lambda_weight=0.7,
+                       store=None, resumed_episodes=None, detailed_scores=detailed_scores,
+                       stop_alpha=0.05, stop_beta=0.1, stop_method='bayes', max_episodes=20, allocator=None,
+                       scenario_bank=None, seed_sequence=None, query_selector=None):
     """
     Objective function for Optuna optimization.
 
@@ -50,24 +89,46 @@ def tracking_objective(trial, pref_model, trial_history, task_type=TaskType.TRAC
     computes performance scores, applies early stopping, and integrates user preferences
     if enabled. Returns the final score for the trial.
 
+    Early stopping is sequential (see sequential_stopping.py): after every episode the posterior on the
+    trial's mean score is compared with the incumbent, and the trial stops as soon as it is confidently
+    worse (value 0.0, as before) or confidently good enough. The reason and the number of episodes are
+    stored in the trial's user attributes 'stop_reason' and 'n_episodes'.
+
+    In pair mode the preference query is chosen by query_selector (see preference_queries.py): the current
+    trial is compared with whichever finished trial tells most about the best trial, or not at all when no
+    comparison is informative enough, and of the similar pairs only the most informative one is verified.
+
     Args:
         trial (optuna.trial.Trial): The current Optuna trial.
         pref_model (PreferenceModel): Model for handling user preferences.
         trial_history (list): List of parameter dicts for all trials so far.
         task_type (TaskType): The type of task to run (default: TRACKING).
+        lambda_weight (float): Weight of the objective score against the preference score.
+        store (SessionStore): If given, every episode is checkpointed to the session.
+        resumed_episodes (list): Episodes already recorded for these parameters before an interruption; they are
+            logged again under this trial's number.
+        detailed_scores (dict): Receives the per-trial summary of the episode records (see objective.summarize_episodes);
+            defaults to the module-level detailed_scores.
+        stop_alpha (float): Allowed rate of stopping a trial that is not actually worse than the incumbent.
+        stop_beta (float): Allowed rate of accepting a trial early that is not actually good enough.
+        stop_method (str): 'bayes' or 'sprt'.
+        max_episodes (int): Episode cap for this trial, e.g. from EpisodeAllocator.episode_cap.
+        allocator (EpisodeAllocator): If given, receives every episode score and its wall time.
+        scenario_bank (ScenarioBank): If given, episode i runs scenario i.
+        seed_sequence (numpy.random.SeedSequence): Source of the task generators of this trial.
+        query_selector (PreferenceQuerySelector): Picks the preference queries in pair mode; holds the cap on
+            queries per session.
 
     Returns:
         float: The objective or combined score for the trial.
     """
 
-    global detailed_scores  
-
     if not joystick:
         print("No Joystick Detected")
         return 0.0
 
-    speed_factor = trial.suggest_float('speed_factor', 1.0, 10.0)
-    friction = trial.suggest_float('friction', 0.93, 0.9999)
+    speed_factor = trial.suggest_float('speed_factor', *SEARCH_SPACE['speed_factor'])
+    friction = trial.suggest_float('friction', *SEARCH_SPACE['friction'])
 
     print("\n" + "="*50)
     print("Trial #{}:".format(trial.number))
@@ -75,77 +136,101 @@ def tracking_objective(trial, pref_model, trial_history, task_type=TaskType.TRAC
     print("Friction: {:.3f}".format(friction))
     print("="*50)
 
-    scores = []
-    switcher = TaskSwitcher()
-
-    for i in range(20):
-        print(f"\nSample {i+1}/20")
+    # Incumbent and episode noise level on the scale of mean episode scores, from the trials so far. avg_performance
+    # excludes the warm-up of optimization trials, and so does the stopper's posterior.
+    finished = [t for t in trial.study.get_trials(deepcopy=False, states=(optuna.trial.TrialState.COMPLETE,))
+                if t.value and t.number in detailed_scores]
+    incumbent = max((detailed_scores[t.number]['avg_performance'] for t in finished), default=None)
+    stopper = SequentialStopper(incumbent=incumbent, alpha=stop_alpha, beta=stop_beta, max_episodes=max_episodes,
+                                prior_noise_std=_episode_noise_std(speed_factor, friction, finished, detailed_scores),
+                                method=stop_method, warmup=WARMUP_EPISODES,
+                                min_good_episodes=MIN_GOOD_EPISODES)
+
+    episodes = list(resumed_episodes or [])
+    scores = [e['performance'] for e in episodes]
+    if store is not None:
+        # The interrupted trial was failed; its episodes now belong to this trial number
+        for episode in episodes:
+            store.log_episode(trial.number, episode)
+    reason = None
+    for score in scores:
+        reason = stopper.update(score)
+    switcher = TaskSwitcher(scenario_bank, seed_sequence)
+    perf_model = PerformanceModel()
+
+    for i in range(len(scores), max_episodes):
+        if reason is not None:
+            break
+        print(f"\nSample {i+1}/{max_episodes}")
         params = {
             "duration": 15,
             "sampling_rate": 20,
             "friction": friction,
             "speed_factor": speed_factor,
+            "scenario_index": i,
         }
 
+        start = time.time()
         results = switcher.run_task(task_type, params)  # Use the task_type parameter here
 
-        error = error_calc(results["distances"])
-        moving_time = results['sampling_times'][-1]
-        jitter = results["jitter"]
-
-        perf_model = PerformanceModel()
-        score = perf_model.compute_performance(error, moving_time, jitter)
+        episode = score_episode(results, perf_model)
+        episode['wall_time'] = time.time() - start
+        episode['scenario_index'] = i
+        episodes.append(episode)
+        score = episode['performance']
         scores.append(score)
+        if store is not None:
+            store.log_episode(trial.number, episode)
+        if allocator is not None:
+            allocator.record(trial.number, score, episode['wall_time'])
+
+        reason = stopper.update(score)
+        mean, scale, _ = stopper.posterior()
+        print(f"Sample Score: {score:.4f} (posterior mean {mean:.4f} +/- {scale:.4f})")
+
+    trial.set_user_attr('stop_reason', stopper.reason)
+    trial.set_user_attr('n_episodes', len(episodes))
+
+    if stopper.pruned:
+        mean, scale, _ = stopper.posterior()
+        print(f"\nEarly stopping after {len(episodes)} episodes ({stopper.reason}): "
+              f"posterior mean {mean:.4f} +/- {scale:.4f}, incumbent {incumbent}")
+        detailed_scores[trial.number] = summarize_episodes(episodes)
+        return 0.0
+
+    if stopper.reason != STOP_MAX:
+        print(f"\nStopping after {len(episodes)} episodes: {stopper.reason}")
 
-        print(f"Sample Score: {score:.4f}")
-
-        if i == 4:
-            current_avg = sum(scores) / 5
-            print(f"CurrentAvg: {current_avg}")
-            if current_avg < 0.2:
-                print(f"\nEarly stopping: Current average ({current_avg:.4f}) is too low")
-                detailed_scores[trial.number] = {
-                    'accuracy_scores': [],
-                    'time_scores': [],
-                    'performance_scores': scores,
-                    'avg_accuracy': 0.0,
-                    'avg_time': 0.0,
-                    'avg_performance': 0.0
-                }
-                return 0.0
-
-            previous_scores = [t.value for t in trial.study.trials if t.value is not None]
-            if previous_scores:
-                prev_mean = np.mean(previous_scores)
-                prev_std = np.std(previous_scores)
-
-                if current_avg < (prev_mean - prev_std) or current_avg < 0.2:
-                    print(f"\nEarly stopping: Current avg ({current_avg:.4f}) is significantly lower than historical performance (mean: {prev_mean:.4f}, std: {prev_std:.4f})")
-                    detailed_scores[trial.number] = {
-                        'accuracy_scores': [],
-                        'time_scores': [],
-                        'performance_scores': scores,
-                        'avg_accuracy': 0.0,
-                        'avg_time': 0.0,
-                        'avg_performance': 0.0
-                    }
-                    return 0.0
-
-    final_scores = scores[10:]
-    final_score = sum(final_scores) / 10
-    std_dev = np.std(final_scores)
-    stability_factor = (1-0.6) + 0.6 * np.exp(-std_dev)
-    objective_score = final_score * stability_factor
+    # Discard the first 10 episodes as warm-up, or the first half when the trial stopped early
+    warmup = min(WARMUP_EPISODES, len(scores) // 2)
+    detailed_scores[trial.number] = summarize_episodes(episodes, warmup=warmup)
+    objective_score = stability_score(scores, warmup=warmup)
+    trial.set_user_attr('objective_score', objective_score)
+    # Noise of the trial's mean score for the samplers' GPs; it shrinks with the number of scored episodes
+    trial.set_user_attr('noise_var', detailed_scores[trial.number]['noise_var'])
+
+    if query_selector is None:
+        query_selector = PreferenceQuerySelector()
+    # Trials the participant can be asked about: the finished ones and this one
+    candidates = [t.number for t in trial.study.get_trials(deepcopy=False, states=(optuna.trial.TrialState.COMPLETE,))
+                  if t.number < len(trial_history) and trial_history[t.number] is not None] + [trial.number]
+    candidates = [c for c in candidates if c < pref_model.n_candidates]
 
     if pref_model.pair:
-        if trial.number > 0:
-            print("\nCompare with previous trial:")
-            print(f"Previous parameters: speed_factor={trial_history[-1]['speed_factor']:.2f}, "
-                  f"friction={trial_history[-1]['friction']:.3f}")
-            print(f"Current parameters: speed_factor={speed_factor:.2f}, "
-                  f"friction={friction:.3f}")
-            is_better = get_user_preference(trial.number-1, trial.number, trial_history, task_type) == "1"
-            pref_model.add_comparison(trial.number, is_better)
+        pair = query_selector.select(pref_model, candidates, include=trial.number)
+        if pair is not None:
+            first, second = pair
+            print(f"\nCompare Trial {first} with Trial {second}:")
+            print(f"Trial {first} parameters: speed_factor={trial_history[first]['speed_factor']:.2f}, "
+                  f"friction={trial_history[first]['friction']:.3f}")
+            print(f"Trial {second} parameters: speed_factor={trial_history[second]['speed_factor']:.2f}, "
+                  f"friction={trial_history[second]['friction']:.3f}")
+            # The UI returns "1" when the first trial shown is chosen
+            if get_user_preference(first, second, trial_history, task_type) == "1":
+                pref_model.add_preference(first, second)
+            else:
+                pref_model.add_preference(second, first)
+            pref_model.fit(pref_model.comparison_history)
     else:
         if trial.number % 5 == 4:
             print("\nPlease rank the last 5 trials (space-separated indices, best to worst):")
@@ -160,8 +245,15 @@ def tracking_objective(trial, pref_model, trial_history, task_type=TaskType.TRAC
                 return objective_score
 
     if pref_model.pair and pref_model.similar_comparison:
-        similar_pairs = pref_model.find_similar_preferences()
-        for pair1, pair2 in similar_pairs:
+        similar_pairs = []
+        for pair in pref_model.find_similar_preferences():
+            if pair not in pref_model.similar_pairs and pair[::-1] not in similar_pairs:
+                similar_pairs.append(pair)
+        # Verification costs 3+3 episodes, so only the most informative similar pair is verified
+        pair = None
+        if similar_pairs:
+            pair = query_selector.select(pref_model, set(candidates).union(*similar_pairs), pairs=similar_pairs)
+        for pair1, pair2 in [pair] if pair is not None else []:
             if (pair1, pair2) not in pref_model.similar_pairs:
                 print(f"Similar preferences between Trial {pair1} and Trial {pair2}")
 
@@ -195,13 +287,29 @@ def tracking_objective(trial, pref_model, trial_history, task_type=TaskType.TRAC
 
     if pref_model.utilities is not None:
         pref_score = pref_model.utilities[trial.number]
-        lambda_weight = 0.7
         final_score = lambda_weight * objective_score + (1 - lambda_weight) * pref_score
         print(f"Combined score (objective: {objective_score:.4f}, preference: {pref_score:.4f}): {final_score:.4f}")
         return final_score
 
     return objective_score
 
+def _episode_noise_std(speed_factor, friction, finished, detailed_scores, min_trials=3):
+    """
+    Expected std of one episode score at (speed_factor, friction). The episode noise differs across the
+    parameter space (e.g. high speed factors are harder to control), so once enough trials have repeats it is
+    predicted by a NoiseModel fitted to their episode variances; before that the mean episode std is used.
+    """
+    repeated = [t for t in finished if len(detailed_scores[t.number]['performance_scores']) > 1]
+    if len(repeated) < min_trials:
+        noise = [np.std(detailed_scores[t.number]['performance_scores']) for t in repeated]
+        return float(np.mean(noise)) if noise else 0.1
+
+    X = [[t.params['speed_factor'], t.params['friction']] for t in repeated]
+    episode_vars = [np.var(detailed_scores[t.number]['performance_scores'], ddof=1) + 1e-6 for t in repeated]
+    noise_model = NoiseModel().fit(X, episode_vars)
+    return float(np.sqrt(noise_model.predict([[speed_factor, friction]])[0]))
+
+
 def run_verification_trial(params, task_type):
     """
     Runs a verification trial for a given set of parameters.
@@ -224,7 +332,19 @@ def run_verification_trial(params, task_type):
     })
     return switcher.run_task(task_type, params)
 
-def run_tracking_optimization(pair_mode=False, similar_comparison=False, physical_comparison=False, task_type=TaskType.AIMING):
+def _set_trial_params(trial_history, trial_number, params, store=None):
+    """Keeps trial_history indexed by trial number, also when earlier trials failed."""
+    while len(trial_history) <= trial_number:
+        trial_history.append(None)
+    trial_history[trial_number] = params
+    if store is not None:
+        store.log_trial_params(trial_number, params)
+
+
+def run_tracking_optimization(pair_mode=False, similar_comparison=False, physical_comparison=False, task_type=TaskType.AIMING,
+                              study_name=None, storage_dir='sessions', seed=None, session_budget_s=None,
+                              transfer_dir=None, scenario_bank=None, n_trials=10, convergence_threshold=0.01,
+                              preference_sampler=False, participant=None):
     """
     Main entry point for running the tracking parameter optimization workflow.
 
@@ -236,138 +356,292 @@ def run_tracking_optimization(pair_mode=False, similar_comparison=False, physica
         similar_comparison (bool): Enable verification of similar preference pairs.
         physical_comparison (bool): If True, returns best score and parameters directly.
         task_type (TaskType): The type of task to optimize (default: AIMING).
+        study_name (str): The session is checkpointed under storage_dir/study_name after every episode and can
+            be continued with resume_tracking_optimization; defaults to session-<timestamp>.
+        storage_dir (str): Directory holding persisted sessions.
+        seed (int): Seed for the initial samples and the sampler.
+        session_budget_s (float): Total episode time for the session in seconds; None for no limit.
+            Later trials get fewer episodes as the budget runs out, and the session ends when it is spent.
+        transfer_dir (str): Directory of persisted sessions, or a catalog file (see catalog.py), whose trials,
+            from any task type, warm-start a multi-task GP sampler for this task.
+        scenario_bank (str): Path of a scenario bank file (see scenario_bank.py); episode i of every trial runs
+            scenario i, so that trials are compared on identical scenarios.
+        n_trials (int): Maximum number of trials, initial samples included.
+        convergence_threshold (float): Expected-improvement threshold below which the session stops early once
+            the incumbent is stable; the regret-bound threshold is five times this. None disables early stopping.
+        preference_sampler (bool): In pair mode, propose trials by the expected improvement of the joint
+            performance/preference score, with the preference predicted by a GP preference model. It replaces the
+            study's sampler, so it cannot be combined with transfer_dir.
+        participant (str): Participant identifier, recorded with the session configuration.
+
+    Returns:
+        tuple or None: (best_score, best_params) if physical_comparison is True, else None.
+    """
+
+    if preference_sampler and transfer_dir:
+        raise ValueError("preference_sampler and transfer_dir both choose the study's sampler; use one of them")
+
+    config = {
+        'n_trials': n_trials,
+        'n_initial_samples': 2 if transfer_dir else 5,
+        'n_repeats': 5,
+        'pair_mode': pair_mode,
+        'similar_comparison': similar_comparison,
+        'task_type': task_type.value,
+        'seed': seed,
+        'session_budget_s': session_budget_s,
+        'transfer_dir': transfer_dir,
+        'scenario_bank': scenario_bank,
+        'convergence_threshold': convergence_threshold,
+        'preference_sampler': preference_sampler,
+        'participant': participant,
+        # Pair mode: preference queries (verifications included) per session
+        'max_preference_queries': n_trials,
+        # Every trial's task generators derive from this, so the session's simulated noise is reproducible
+        'noise_entropy': np.random.SeedSequence(seed).entropy,
+    }
+
+    if study_name is None:
+        # Every session is stored, so its raw episodes can be re-scored later
+        study_name = time.strftime("session-%Y%m%d-%H%M%S")
+        print(f"Session is stored as {study_name}")
+    store = SessionStore(study_name, storage_dir)
+    if store.load().config:
+        raise ValueError(f"Session '{study_name}' already exists, use resume_tracking_optimization")
+    store.log_config(**config)
+
+    return _run_session(config, store, physical_comparison=physical_comparison)
+
+
+def resume_tracking_optimization(study_name, storage_dir='sessions', physical_comparison=False):
+    """
+    Continues a persisted session from its last checkpoint.
+
+    Rebuilds the study, trial history, detailed scores and preference model from storage, reseeds the
+    sampler, and picks up an interrupted trial at the episode where it stopped.
+
+    Args:
+        study_name (str): Name the session was started with.
+        storage_dir (str): Directory holding persisted sessions.
+        physical_comparison (bool): If True, returns best score and parameters directly.
 
     Returns:
         tuple or None: (best_score, best_params) if physical_comparison is True, else None.
     """
 
-    n_trials = 10
-    n_initial_samples = 5
-    n_repeats = 5
+    store = SessionStore(study_name, storage_dir)
+    state = store.load()
+    if not state.config:
+        raise ValueError(f"No session named '{study_name}' in {storage_dir}")
+
+    print(f"\n=== Resuming session {study_name} ===")
+    return _run_session(state.config, store, state, physical_comparison)
 
-    study = optuna.create_study(direction='maximize')
-    pref_model = PreferenceModel(n_trials, pair=pair_mode, similar_comparison=similar_comparison)
-    trial_history = []
-    detailed_scores = {}
+
+def _update_convergence(monitor, study, store=None):
+    record = monitor.update(study)
+    monitor.report(record)
+    if store is not None:
+        store.log_convergence(record)
+
+
+def _run_session(config, store=None, state=None, physical_comparison=False):
+    n_trials = config['n_trials']
+    n_initial_samples = config['n_initial_samples']
+    n_repeats = config['n_repeats']
+    pair_mode = config['pair_mode']
+    task_type = TaskType(config['task_type'])
+    seed = config['seed']
+
+    if store is not None:
+        study = store.create_study()
+    else:
+        study = optuna.create_study(direction='maximize')
+    # Offset the seed by the trials already in storage so a resumed session does not replay earlier suggestions
+    sampler_seed = None if seed is None else seed + len(study.trials)
+    if config.get('transfer_dir'):
+        exclude = (store.study_name,) if store is not None else ()
+        if os.path.isfile(config['transfer_dir']):
+            catalog = Catalog(config['transfer_dir'])
+            source = catalog.warm_start_observations(exclude=exclude)
+            catalog.close()
+        else:
+            source = observations_from_sessions(config['transfer_dir'], exclude=exclude)
+        print(f"Warm-starting from {len(source)} trials in {config['transfer_dir']}")
+        study.sampler = MultiTaskGPSampler(task_type, source, seed=sampler_seed)
+    elif seed is not None:
+        study.sampler = optuna.samplers.TPESampler(seed=sampler_seed)
+    rng = np.random.default_rng(None if seed is None else seed + len(study.trials))
+
+    trial_history = state.trial_history if state else []
+    detailed_scores = state.detailed_scores if state else {}
+    scenario_bank = ScenarioBank.load(config['scenario_bank']) if config.get('scenario_bank') else None
+
+    allocator = EpisodeAllocator(config.get('session_budget_s'))
+    if state:
+        # Episodes of trials failed by an earlier resume were logged again under the trial that continued them
+        failed = {t.number for t in study.get_trials(deepcopy=False, states=(optuna.trial.TrialState.FAIL,))}
+        for number, episodes in state.episodes.items():
+            if number in failed:
+                continue
+            for episode in episodes:
+                allocator.spend(episode.get('wall_time', allocator.episode_cost_s))
+
+    # Trials that were running when the session stopped are failed; their recorded episodes are kept
+    # and the same parameters are continued first.
+    interrupted = []
+    for trial in study.get_trials(deepcopy=False, states=(optuna.trial.TrialState.RUNNING,)):
+        phase = trial.user_attrs.get('phase', 'optimization')
+        episodes = state.episodes.get(trial.number, []) if state else []
+        interrupted.append((phase, trial.params, episodes))
+        study.tell(trial.number, state=optuna.trial.TrialState.FAIL)
+        print(f"Trial #{trial.number} was interrupted after {len(episodes)} episodes, continuing it")
+
+    n_failed = len(study.get_trials(deepcopy=False, states=(optuna.trial.TrialState.FAIL,)))
+    pref_model = PreferenceModel(n_trials + n_failed, pair=pair_mode, similar_comparison=config['similar_comparison'])
+    if state:
+        pref_model.comparison_history = list(state.comparison_history)
+        pref_model.similar_pairs = list(state.similar_pairs)
+        if state.utilities is not None:
+            pref_model.utilities = np.array(state.utilities)
+    if pair_mode and config.get('preference_sampler'):
+        study.sampler = PreferenceGPSampler(pref_model, seed=sampler_seed)
+
+    def completed(phase):
+        return sum(1 for t in study.get_trials(deepcopy=False, states=(optuna.trial.TrialState.COMPLETE,))
+                   if t.user_attrs.get('phase') == phase)
 
     print("\n=== Initializing ===")
-    initial_params = []
-    for _ in range(n_initial_samples):
-        speed_factor = np.random.uniform(1.0, 10.0)
-        friction = np.random.uniform(0.93, 0.9999)
-        initial_params.append({
+    initial_params = [(params, episodes) for phase, params, episodes in interrupted if phase == 'initial']
+    while len(initial_params) < n_initial_samples - completed('initial'):
+        speed_factor = rng.uniform(*SEARCH_SPACE['speed_factor'])
+        friction = rng.uniform(*SEARCH_SPACE['friction'])
+        initial_params.append(({
             'speed_factor': speed_factor,
             'friction': friction
-        })
-
-    for i, params in enumerate(initial_params):
-        print(f"\nInitial Sample #{i+1}/{n_initial_samples}")
-        print(f"Speed Factor: {params['speed_factor']:.2f}")
-        print(f"Friction: {params['friction']:.3f}")
+        }, []))
 
+    # All initial samples run side by side; OCBA decides which one gets the next episode, with
+    # n_repeats episodes per sample on average (see allocation.py)
+    candidates = {}
+    for params, resumed in initial_params:
         trial = study.ask()
+        trial.set_user_attr('phase', 'initial')
         trial.suggest_float('speed_factor', params['speed_factor'], params['speed_factor'])
         trial.suggest_float('friction', params['friction'], params['friction'])
 
-        trial_history.append(params)
+        _set_trial_params(trial_history, trial.number, params, store)
+        for episode in resumed:
+            allocator.record(trial.number, episode['performance'])
+            if store is not None:
+                store.log_episode(trial.number, episode)
+        switcher = TaskSwitcher(scenario_bank, trial_seed_sequence(config.get('noise_entropy'), trial.number))
+        candidates[trial.number] = (trial, params, list(resumed), switcher)
+
+    perf_model = PerformanceModel()
+    total_episodes = n_repeats * len(candidates)
+    while True:
+        number = allocator.next_candidate(list(candidates), total_episodes)
+        if number is None:
+            break
+        trial, params, episodes, switcher = candidates[number]
+
+        print(f"\nInitial Sample Trial #{number}, Re: #{len(episodes)+1}")
+        print(f"Speed Factor: {params['speed_factor']:.2f}")
+        print(f"Friction: {params['friction']:.3f}")
+        task_params = {
+            "duration": 15,
+            "sampling_rate": 20,
+            "friction": params['friction'],
+            "speed_factor": params['speed_factor'],
+            "scenario_index": len(episodes),
+        }
 
-        sample_scores = []
-        accuracy_scores = []
-        time_scores = []
-        performance_scores = []
-        switcher = TaskSwitcher()
-        
-        for j in range(n_repeats):
-            print(f"\nRe:  #{j+1}/{n_repeats}")
-            task_params = {
-                "duration": 15,
-                "sampling_rate": 20,
-                "friction": params['friction'],
-                "speed_factor": params['speed_factor']
-            }
-            
-            results = switcher.run_task(task_type, task_params)
-            
-            error = error_calc(results["distances"])
-            moving_time = results['sampling_times'][-1]
-            jitter = results["jitter"]
-            
-            perf_model = PerformanceModel()
-            accuracy_score = perf_model.compute_accuracy(error)
-            time_score = perf_model.compute_time(moving_time)
-            performance_score = perf_model.compute_performance(error, moving_time, jitter)
-            
-            accuracy_scores.append(accuracy_score)
-            time_scores.append(time_score)
-            performance_scores.append(performance_score)
-            sample_scores.append(performance_score)
-            
-            print(f"Score{performance_score:.4f}")
-
-        avg_score = np.mean(sample_scores)
-        print(f"\nAVG SCORE: {avg_score:.4f}")
-        study.tell(trial, avg_score)
+        start = time.time()
+        results = switcher.run_task(task_type, task_params)
 
-        detailed_scores[trial.number] = {
-            'accuracy_scores': accuracy_scores,
-            'time_scores': time_scores,
-            'performance_scores': performance_scores,
-            'avg_accuracy': np.mean(accuracy_scores),
-            'avg_time': np.mean(time_scores),
-            'avg_performance': avg_score
-        }
+        episode = score_episode(results, perf_model)
+        episode['wall_time'] = time.time() - start
+        episode['scenario_index'] = len(episodes)
+        episodes.append(episode)
+        allocator.record(number, episode['performance'], episode['wall_time'])
+        if store is not None:
+            store.log_episode(number, episode)
+
+        print(f"Score{episode['performance']:.4f}")
+
+    for number, (trial, params, episodes, _) in candidates.items():
+        trial.set_user_attr('n_episodes', len(episodes))
+        if not episodes:
+            print(f"\nSession budget spent before Trial #{number} ran")
+            study.tell(trial, state=optuna.trial.TrialState.FAIL)
+            continue
+
+        detailed_scores[number] = summarize_episodes(episodes)
+        avg_score = detailed_scores[number]['avg_performance']
+        trial.set_user_attr('objective_score', avg_score)
+        trial.set_user_attr('noise_var', detailed_scores[number]['noise_var'])
+        print(f"\nTrial #{number} AVG SCORE: {avg_score:.4f} over {len(episodes)} episodes")
+
+        if store is not None:
+            store.log_detailed_scores(number, detailed_scores[number])
+        study.tell(trial, avg_score)
 
     print("\n=== INITIALIZING RESULTS ===")
-    for i, trial in enumerate(study.trials[:n_initial_samples]):
+    initial_trials = [t for t in study.trials if t.user_attrs.get('phase') == 'initial'
+                      and t.state == optuna.trial.TrialState.COMPLETE]
+    for i, trial in enumerate(initial_trials):
         print(f"SAMPLE #{i+1}: speed_factor={trial.params['speed_factor']:.2f}, "
               f"friction={trial.params['friction']:.3f}, score={trial.value:.4f}")
 
-    for i in range(n_trials - n_initial_samples):
+    monitor = None
+    if config.get('convergence_threshold') is not None:
+        threshold = config['convergence_threshold']
+        monitor = ConvergenceMonitor(ei_threshold=threshold, regret_threshold=5 * threshold, seed=seed,
+                                     history=state.convergence if state else None)
+        if not monitor.history:
+            _update_convergence(monitor, study, store)
+
+    query_selector = PreferenceQuerySelector(max_queries=config.get('max_preference_queries', n_trials), seed=seed)
+
+    resumed_trials = [(params, episodes) for phase, params, episodes in interrupted if phase == 'optimization']
+    while completed('optimization') < n_trials - n_initial_samples:
+        trials_left = n_trials - n_initial_samples - completed('optimization')
+        if not resumed_trials and monitor is not None and monitor.converged:
+            print(f"\nStudy converged with {trials_left} trials left")
+            break
+        if not resumed_trials and allocator.remaining_episodes() < allocator.min_episodes:
+            print(f"\nSession time budget spent with {trials_left} trials left")
+            break
+        if resumed_trials:
+            resumed_params, resumed = resumed_trials.pop(0)
+            study.enqueue_trial(resumed_params)
+        else:
+            resumed = []
         trial = study.ask()
+        trial.set_user_attr('phase', 'optimization')
         
-        speed_factor = trial.suggest_float('speed_factor', 1.0, 10.0)
-        friction = trial.suggest_float('friction', 0.93, 0.9999)
+        speed_factor = trial.suggest_float('speed_factor', *SEARCH_SPACE['speed_factor'])
+        friction = trial.suggest_float('friction', *SEARCH_SPACE['friction'])
         
         params = {
             'speed_factor': speed_factor,
             'friction': friction
         }
-        trial_history.append(params)
+        _set_trial_params(trial_history, trial.number, params, store)
         
-        value = tracking_objective(trial, pref_model, trial_history, task_type)
+        # The episodes run by the objective are the reported ones; nothing is re-run after tell
+        value = tracking_objective(trial, pref_model, trial_history, task_type, store=store,
+                                   resumed_episodes=resumed, detailed_scores=detailed_scores,
+                                   max_episodes=allocator.episode_cap(trials_left), allocator=allocator,
+                                   scenario_bank=scenario_bank, query_selector=query_selector,
+                                   seed_sequence=trial_seed_sequence(config.get('noise_entropy'), trial.number))
+        if store is not None:
+            store.log_detailed_scores(trial.number, detailed_scores[trial.number])
+            store.log_preferences(pref_model)
         study.tell(trial, value)
-
-        if value == 0.0:
-            continue
-
-        scores = []
-        accuracy_scores = []
-        time_scores = []
-        performance_scores = []
-        
-        for _ in range(20):
-            results = switcher.run_task(task_type, params)
-            error = error_calc(results["distances"])
-            moving_time = results['sampling_times'][-1]
-            jitter = results["jitter"]
-            
-            perf_model = PerformanceModel()
-            accuracy_score = perf_model.compute_accuracy(error)
-            time_score = perf_model.compute_time(moving_time)
-            performance_score = perf_model.compute_performance(error, moving_time, jitter)
-            
-            accuracy_scores.append(accuracy_score)
-            time_scores.append(time_score)
-            performance_scores.append(performance_score)
-        
-        detailed_scores[trial.number] = {
-            'accuracy_scores': accuracy_scores,
-            'time_scores': time_scores,
-            'performance_scores': performance_scores,
-            'avg_accuracy': np.mean(accuracy_scores),
-            'avg_time': np.mean(time_scores),
-            'avg_performance': np.mean(performance_scores[10:])
-        }
+        if monitor is not None:
+            _update_convergence(monitor, study, store)
 
     best_params = study.best_params
     best_score = study.best_value
@@ -383,42 +657,38 @@ def run_tracking_optimization(pair_mode=False, similar_comparison=False, physica
 
     save_results = input("\nSave? (y/n): ").lower() == 'y'
     if save_results:
-        timestamp = time.strftime("%Y%m%d-%H%M%S")
-        filename = f"optimization_{timestamp}.txt"
-        with open(filename, 'w') as f:
-            f.write("BO Results:\n")
-            f.write("Best Para:\n")
-            for param_name, param_value in study.best_params.items():
-                f.write(f"  {param_name}: {param_value}\n")
-            f.write(f"Best Score: {study.best_value}\n")
-            
-            f.write("\nAll Trial:\n")
-            for trial in study.trials:
-                f.write(f"Trial #{trial.number}:\n")
-                f.write("Parameters:\n")
-                for param_name, param_value in trial.params.items():
-                    f.write(f"  {param_name}: {param_value}\n")
-                trial_scores = detailed_scores[trial.number]
-                f.write("Scores:\n")
-                f.write(f"  Accuracy Score: {trial_scores['avg_accuracy']:.4f}\n")
-                f.write(f"  Time Score: {trial_scores['avg_time']:.4f}\n")
-                f.write(f"  Performance Score: {trial_scores['avg_performance']:.4f}\n")
-                
-                if pref_model.utilities is not None:
-                    pref_score = pref_model.utilities[trial.number]
-                    f.write(f"  Preference Score: {pref_score:.4f}\n")
-                
-                f.write(f"  Final Score: {trial.value:.4f}\n\n")
-            
-            f.write("\nPreference Data:\n")
-            if pair_mode:
-                f.write("Pairwise comparisons:\n")
-                for comp in pref_model.comparison_history:
-                    f.write(f"  Trial {comp[0]} {'>' if comp[1] else '<'} Trial {comp[1]}\n")
-            if pref_model.utilities is not None:
-                f.write(f"Final utilities: {pref_model.utilities.tolist()}\n")
-                
-        print(f"Result saved to {filename}")
+        session = store.study_name if store is not None else time.strftime("optimization-%Y%m%d-%H%M%S")
+        episodes_by_trial = store.load().episodes if store is not None else {}
+        trials, episodes = [], []
+        for trial in study.get_trials(states=(optuna.trial.TrialState.COMPLETE,)):
+            phase = trial.user_attrs.get('phase', 'optimization')
+            trial_scores = detailed_scores.get(trial.number, {})
+            trials.append({
+                'task_type': task_type.value,
+                'trial': trial.number,
+                'phase': phase,
+                'speed_factor': trial.params['speed_factor'],
+                'friction': trial.params['friction'],
+                'value': trial.value,
+                'avg_accuracy': trial_scores.get('avg_accuracy'),
+                'avg_time': trial_scores.get('avg_time'),
+                'avg_performance': trial_scores.get('avg_performance'),
+                'noise_var': trial_scores.get('noise_var'),
+                'stop_reason': trial.user_attrs.get('stop_reason'),
+                'preference': (float(pref_model.utilities[trial.number])
+                               if pref_model.utilities is not None else None),
+                'n_episodes': len(episodes_by_trial.get(trial.number, [])),
+            })
+            trial_episodes = episodes_by_trial.get(trial.number, [])
+            # Same warm-up cut as tracking_objective; initial samples are averaged without one
+            warmup = min(WARMUP_EPISODES, len(trial_episodes) // 2) if phase == 'optimization' else 0
+            for i, episode in enumerate(trial_episodes):
+                episodes.append({**episode, 'task_type': task_type.value, 'trial': trial.number, 'episode': i,
+                                 'warmup': i < warmup})
+
+        results = ResultsStore()
+        results.write_session(session, trials, episodes, pref_model.comparison_history)
+        print(f"Result saved to {results.directory} as session {session}")
 
 if __name__ == "__main__":
     run_tracking_optimization(pair_mode=True, similar_comparison=True, task_type=TaskType.AIMING)
\ No newline at end of file
@@ -9,7 +9,8 @@ This script:
 - Uses TaskSwitcher to run multiple aiming or tracking tasks with fixed parameters.
 - Computes error, moving time, and jitter for each task using the objective module.
 - Calculates a performance score for each trial and records the results.
-- Saves performance scores (excluding the first 10) to a timestamped results file.
+- Saves every task with its raw metrics to the results store as a session sim-<task>-<time>, marking the first
+  10 as warm-up (see results_store.py), so the run can be analyzed and re-scored later (see rescoring.py).
 - Plots performance scores across all trials for visual analysis.
 - Data can be used in analysis.py
 
@@ -17,7 +18,8 @@ Modules used:
 - task_switcher: For running and managing task trials.
 - objective: For error calculation and performance modeling.
 - matplotlib: For plotting performance scores.
-- time: For timestamping result files.
+- results_store: For saving the tasks.
+- time: For timestamping sessions.
 
 Run this script directly to execute a batch of aiming or tracking tasks and analyze performance.
 """
@@ -28,11 +30,15 @@ from objective import PerformanceModel
 import matplotlib
 matplotlib.use('TkAgg')
 import matplotlib.pyplot as plt
+import numpy as np
 import time
+from results_store import ResultsStore
 
 def main(task_num=30, task_type=TaskType.AIMING):
     scores = []
+    episodes = []
     switcher = TaskSwitcher()
+    perf_model = PerformanceModel()
     
     for t in range(task_num):
         params = {
@@ -44,24 +50,39 @@ def main(task_num=30, task_type=TaskType.AIMING):
         
         results = switcher.run_task(task_type, params)
 
-        error = ob.error_calc(results["distances"])
-        moving_time = results['sampling_times'][-1]
-        jitter = results["jitter"]
-        print(f"Task {t}: Moving Time = {moving_time:.4f}")
+        episode = ob.score_episode(results, perf_model)
+        episodes.append(episode)
+        print(f"Task {t}: Moving Time = {episode['moving_time']:.4f}")
 
-        perf_model = PerformanceModel()
-        perf_score = perf_model.compute_performance(error, moving_time, jitter)
+        perf_score = episode['performance']
         scores.append((t, perf_score))
 
         print(f"Task {t}: Performance Score = {perf_score:.4f}")
 
-    time_now = time.time()
     task_type_str = "aiming" if task_type == TaskType.AIMING else "tracking"
-
-    with open(f"results_{task_type_str}_{time_now}.txt", "w") as f:
-        for t, perf_score in scores[10:]:
-            f.write(f"{t}: {perf_score}\n")
-            print(f"{t}: {perf_score}")
+    session = f"sim-{task_type_str}-{time.strftime('%Y%m%d-%H%M%S')}"
+    warmup = 10
+    counted = [e['performance'] for e in episodes[warmup:]]
+    trial = {
+        'task_type': task_type.value,
+        'trial': 0,
+        'phase': 'simulation',
+        'speed_factor': params['speed_factor'],
+        'friction': params['friction'],
+        'value': float(np.mean(counted)) if counted else None,
+        'avg_accuracy': float(np.mean([e['accuracy'] for e in episodes[warmup:]])) if counted else None,
+        'avg_time': float(np.mean([e['time'] for e in episodes[warmup:]])) if counted else None,
+        'avg_performance': float(np.mean(counted)) if counted else None,
+        'n_episodes': len(episodes),
+    }
+    results_store = ResultsStore()
+    results_store.write_session(session, [trial], [
+        {**episode, 'task_type': task_type.value, 'trial': 0, 'episode': t, 'warmup': t < warmup}
+        for t, episode in enumerate(episodes)
+    ])
+    for t, perf_score in scores[warmup:]:
+        print(f"{t}: {perf_score}")
+    print(f"Saved to {results_store.directory} as session {session}")
 
     task_indices, perf_scores = zip(*scores)
     plt.figure()
@@ -0,0 +1,191 @@
+"""
+turbo_sampler.py
+
+Trust-region Bayesian optimization (TuRBO) as an Optuna sampler, for the inner virtual-parameter studies.
+A single global GP with expected improvement spends most of a small trial budget exploring the corners of a
+6-12 dimensional space. TurboSampler instead keeps one trust region, a box around the best trial of the current
+run, in which a local GP proposes the next trial by Thompson sampling:
+    - after success_tolerance consecutive improvements the box doubles (up to length_max),
+    - after failure_tolerance consecutive non-improvements it halves,
+    - when it shrinks below length_min the run has converged and a new run restarts from a fresh space-filling
+      design elsewhere.
+The region state is replayed from the completed trials of the study on every proposal, so a resumed study
+continues in the same region. Enqueued trials (e.g. warm starts) count towards the initial design.
+
+Main components:
+- TrustRegion: Length and success/failure counters of one run.
+- TurboSampler: Optuna sampler over the float/int parameters of a study.
+
+Dependencies: numpy, scipy, scikit-learn, optuna, custom modules (acquisition).
+"""
+
+import numpy as np
+import optuna
+from optuna.distributions import FloatDistribution, IntDistribution
+from optuna.samplers import BaseSampler, RandomSampler
+from optuna.search_space import IntersectionSearchSpace
+from scipy.stats import qmc
+from sklearn.gaussian_process import GaussianProcessRegressor
+from sklearn.gaussian_process.kernels import ConstantKernel, Matern, WhiteKernel
+
+from acquisition import sobol_candidates
+
+
+class TrustRegion:
+    def __init__(self, length, success_tolerance, failure_tolerance, length_min, length_max):
+        self.length = length
+        self.success_tolerance = success_tolerance
+        self.failure_tolerance = failure_tolerance
+        self.length_min = length_min
+        self.length_max = length_max
+        self.successes = 0
+        self.failures = 0
+        self.X = []
+        self.y = []
+
+    @property
+    def converged(self):
+        return self.length < self.length_min
+
+    def update(self, value, tolerance=1e-3):
+        """Counts value, the result of a proposal from this region, as a success or failure and resizes."""
+        best = max(self.y)
+        if value > best + tolerance * abs(best):
+            self.successes += 1
+            self.failures = 0
+        else:
+            self.successes = 0
+            self.failures += 1
+
+        if self.successes >= self.success_tolerance:
+            self.length = min(2.0 * self.length, self.length_max)
+            self.successes = 0
+        elif self.failures >= self.failure_tolerance:
+            self.length /= 2.0
+            self.failures = 0
+
+
+class TurboSampler(BaseSampler):
+    def __init__(self, search_space=None, n_init=None, length_init=0.8, length_min=0.5 ** 7, length_max=1.6,
+                 success_tolerance=3, failure_tolerance=None, n_candidates=1024, seed=None):
+        """
+        Args:
+            search_space (dict): Parameter name -> optuna distribution. Defaults to the float/int parameters
+                that every completed trial of the study has, so new virtual parameters are picked up as they
+                are added to the objective.
+            n_init (int): Space-filling trials at the start of every run; defaults to dimensions + 1.
+            length_init (float): Initial edge length of the trust region in the unit cube.
+            length_min (float): A run restarts once the length drops below this.
+            length_max (float): Upper limit of the length.
+            success_tolerance (int): Consecutive improvements that double the length.
+            failure_tolerance (int): Consecutive non-improvements that halve the length; defaults to
+                max(3, dimensions // 2), which lets a 12-dimensional run shrink within a human-scale budget.
+            n_candidates (int): Candidates in the trust region per Thompson sample.
+            seed (int): Seed for the designs, candidates and the random fallback.
+        """
+        self.search_space = search_space
+        self.n_init = n_init
+        self.length_init = length_init
+        self.length_min = length_min
+        self.length_max = length_max
+        self.success_tolerance = success_tolerance
+        self.failure_tolerance = failure_tolerance
+        self.n_candidates = n_candidates
+        self.seed = seed
+        self.rng = np.random.default_rng(seed)
+        # Drawn once, so that without a seed every point of a run's initial design still comes from one
+        # scrambled Sobol sequence
+        self._design_seed = seed if seed is not None else int(self.rng.integers(2 ** 31))
+        self._random_sampler = RandomSampler(seed=seed)
+        self._intersection = IntersectionSearchSpace()
+        self.n_restarts = 0
+
+    def infer_relative_search_space(self, study, trial):
+        space = self.search_space or self._intersection.calculate(study)
+        return {name: dist for name, dist in space.items()
+                if isinstance(dist, (FloatDistribution, IntDistribution)) and dist.low < dist.high}
+
+    @staticmethod
+    def _bounds(dist):
+        if dist.log:
+            return np.log(dist.low), np.log(dist.high)
+        return dist.low, dist.high
+
+    def _to_unit(self, params, space):
+        x = []
+        for name, dist in space.items():
+            low, high = self._bounds(dist)
+            value = np.log(params[name]) if dist.log else params[name]
+            x.append((value - low) / (high - low))
+        return np.clip(x, 0.0, 1.0)
+
+    def _from_unit(self, x, space):
+        params = {}
+        for u, (name, dist) in zip(x, space.items()):
+            low, high = self._bounds(dist)
+            value = low + u * (high - low)
+            value = float(np.exp(value)) if dist.log else float(value)
+            if isinstance(dist, IntDistribution):
+                value = int(np.clip(round(value), dist.low, dist.high))
+            params[name] = value
+        return params
+
+    def _replay(self, trials, space, n_init):
+        """Trust region of the current run and its index, from the completed trials in trial order."""
+        d = len(space)
+        failure_tolerance = self.failure_tolerance or max(3, d // 2)
+        run = 0
+        region = TrustRegion(self.length_init, self.success_tolerance, failure_tolerance,
+                             self.length_min, self.length_max)
+        for t in trials:
+            if len(region.y) >= n_init:
+                region.update(t.value)
+            region.X.append(self._to_unit(t.params, space))
+            region.y.append(t.value)
+            if region.converged:
+                run += 1
+                region = TrustRegion(self.length_init, self.success_tolerance, failure_tolerance,
+                                     self.length_min, self.length_max)
+        return region, run
+
+    def _fit(self, X, y):
+        d = X.shape[1]
+        kernel = (ConstantKernel(1.0) * Matern(length_scale=np.full(d, 0.5), length_scale_bounds=(5e-3, 2.0), nu=2.5)
+                  + WhiteKernel(1e-3, noise_level_bounds=(1e-6, 1e-1)))
+        gp = GaussianProcessRegressor(kernel=kernel, normalize_y=True, n_restarts_optimizer=2, random_state=42)
+        return gp.fit(X, y)
+
+    def sample_relative(self, study, trial, search_space):
+        if not search_space:
+            return {}
+        space = dict(sorted(search_space.items()))
+        d = len(space)
+        n_init = self.n_init or d + 1
+        trials = sorted((t for t in study.get_trials(deepcopy=False, states=(optuna.trial.TrialState.COMPLETE,))
+                         if all(name in t.params for name in space)), key=lambda t: t.number)
+        region, run = self._replay(trials, space, n_init)
+        self.n_restarts = run
+
+        if len(region.y) < n_init:
+            # Space-filling initial design of this run; the seed depends on the run, not on the process
+            design = qmc.Sobol(d=d, scramble=True, seed=self._design_seed + run).random(n_init)
+            return self._from_unit(design[len(region.y)], space)
+
+        X = np.array(region.X)
+        y = np.array(region.y, dtype=float)
+        gp = self._fit(X, y)
+
+        # Box around the incumbent, stretched along the dimensions the GP finds long, volume length ** d
+        center = X[np.argmax(y)]
+        weights = gp.kernel_.k1.k2.length_scale
+        weights = weights / np.prod(weights) ** (1.0 / d)
+        low = np.clip(center - weights * region.length / 2.0, 0.0, 1.0)
+        high = np.clip(center + weights * region.length / 2.0, 0.0, 1.0)
+
+        candidates = low + sobol_candidates(d, self.n_candidates, self.rng) * (high - low)
+        # Thompson sample: one joint draw of the posterior over the candidates
+        sample = gp.sample_y(candidates, random_state=int(self.rng.integers(2 ** 31))).ravel()
+        return self._from_unit(candidates[np.argmax(sample)], space)
+
+    def sample_independent(self, study, trial, param_name, param_distribution):
+        return self._random_sampler.sample_independent(study, trial, param_name, param_distribution)